@@ -0,0 +1,100 @@
+"""
+Idempotency-Key support for API actions that move money.
+
+A client that retries a request after a timeout sends the same
+`Idempotency-Key` header. The first request inserts an IdempotencyKey row
+in the same transaction as its work and stores the response; repeats
+replay that response without running the action again. A concurrent
+duplicate blocks on the unique (user, key) index until the first request
+commits and then replays its result. Responses with a 5xx status roll the
+whole transaction back, so the key stays free for a retry.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from backend.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+DEFAULT_TTL = timedelta(hours=24)
+MAX_KEY_LENGTH = 255
+
+
+def key_ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', DEFAULT_TTL)
+
+
+def _request_hash(request):
+    payload = json.dumps(request.data, sort_keys=True, cls=JSONEncoder, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _replay(record, scope, request_hash):
+    if record.scope != scope or record.request_hash != request_hash:
+        return Response(
+            {'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(record.response, status=record.status_code, headers={REPLAYED_HEADER: 'true'})
+
+
+def idempotent(view):
+    """
+    Decorator for viewset actions: requests carrying an Idempotency-Key
+    header run at most once per (user, key) within the key TTL. Requests
+    without the header are not affected.
+    """
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        scope = f"{request.method} {request.path}"[:255]
+        request_hash = _request_hash(request)
+        now = timezone.now()
+
+        with transaction.atomic():
+            IdempotencyKey.objects.filter(user=request.user, key=key, expires_at__lte=now).delete()
+            try:
+                # Blocks while another transaction holds the same key
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        user=request.user, key=key, scope=scope, request_hash=request_hash,
+                        created_at=now, expires_at=now + key_ttl(),
+                    )
+            except IntegrityError:
+                return _replay(IdempotencyKey.objects.get(user=request.user, key=key), scope, request_hash)
+
+            response = view(self, request, *args, **kwargs)
+            if response.status_code >= 500:
+                transaction.set_rollback(True)
+                return response
+
+            # Store exactly what the JSON renderer will send
+            record.status_code = response.status_code
+            record.response = json.loads(json.dumps(response.data, cls=JSONEncoder))
+            record.save(update_fields=['status_code', 'response'])
+            return response
+
+    return wrapper
+
+
+def purge_expired_keys(now=None):
+    """Delete expired idempotency keys. Returns the number deleted."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
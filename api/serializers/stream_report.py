@@ -0,0 +1,48 @@
+import hashlib
+
+from rest_framework import serializers
+from django.core.exceptions import ValidationError as DjangoValidationError
+from backend.models import StreamReportImport
+from api.validators import FileValidator
+from api.sanitizers import InputSanitizer
+
+
+class StreamReportImportSerializer(serializers.ModelSerializer):
+    uploaded_by_email = serializers.CharField(source='uploaded_by.email', read_only=True, default=None)
+
+    class Meta:
+        model = StreamReportImport
+        fields = [
+            'id', 'file', 'platform', 'checksum', 'uploaded_by', 'uploaded_by_email', 'status',
+            'rows_read', 'rows_imported', 'streams_imported', 'error_count', 'chunk_errors',
+            'created_at', 'finished_at',
+        ]
+        read_only_fields = [
+            'id', 'checksum', 'uploaded_by', 'uploaded_by_email', 'status', 'rows_read', 'rows_imported',
+            'streams_imported', 'error_count', 'chunk_errors', 'created_at', 'finished_at',
+        ]
+
+    def validate_file(self, value):
+        try:
+            FileValidator.validate_stream_report(value)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+    def validate(self, attrs):
+        """Refuse a report that was already imported: imports add to StreamData"""
+        checksum = hashlib.sha256()
+        for chunk in attrs['file'].chunks():
+            checksum.update(chunk)
+        attrs['checksum'] = checksum.hexdigest()
+        previous = (StreamReportImport.objects.filter(checksum=attrs['checksum'])
+                    .exclude(status=StreamReportImport.FAILED).first())
+        if previous is not None:
+            raise serializers.ValidationError({'file': f"This report was already uploaded (import {previous.id})"})
+        return attrs
+
+    def validate_platform(self, value):
+        """Sanitize platform"""
+        if value:
+            return InputSanitizer.sanitize_text(value, max_length=100)
+        return value
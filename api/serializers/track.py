@@ -1,7 +1,12 @@
+import re
+
 from rest_framework import serializers
 from django.utils import timezone
 from django.core.exceptions import ValidationError as DjangoValidationError
-from backend.models import Track, StreamData, Split, Royalty
+from backend.models import Track, StreamData, StreamDailyRollup, Split, SplitGroupMember, Royalty, UserAccount
+from backend.services.split_table import ancestor_group_ids
+from backend.services.stream_import import normalize_isrc
+from backend.services.stream_rollups import GROUP_BY_CHOICES, GROUP_BY_DAY
 from api.validators import FileValidator
 from api.sanitizers import InputSanitizer
 
@@ -11,6 +16,12 @@ class StreamDataSerializer(serializers.ModelSerializer):
         fields = ['id', 'platform', 'stream_count', 'date_recorded', 'fraud_flag']
         read_only_fields = ['id']
 
+class StreamDailyRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StreamDailyRollup
+        fields = ['platform', 'date', 'valid_streams', 'fraud_streams']
+        read_only_fields = fields
+
 class SplitSerializer(serializers.ModelSerializer):
     user_email = serializers.CharField(write_only=True, required=True)  # Accept email on input
 
@@ -53,6 +64,64 @@ class SplitSerializer(serializers.ModelSerializer):
         
         return super().create(validated_data)
 
+class SplitGroupMemberSerializer(serializers.ModelSerializer):
+    """
+    Member of a group collaborator. The group is the requesting user; staff
+    may manage any group through group_email.
+    """
+    group_email = serializers.EmailField(write_only=True, required=False)
+    member_email = serializers.EmailField(write_only=True, required=True)
+
+    class Meta:
+        model = SplitGroupMember
+        fields = ['id', 'group', 'group_email', 'member', 'member_email', 'percentage']
+        read_only_fields = ['id', 'group', 'member']
+        extra_kwargs = {
+            'percentage': {'required': True, 'min_value': 0, 'max_value': 100},
+        }
+
+    def to_representation(self, instance):
+        ret = super().to_representation(instance)
+        ret['group_email'] = instance.group.email
+        ret['member_email'] = instance.member.email
+        return ret
+
+    def _user_by_email(self, email, field):
+        try:
+            return UserAccount.objects.get(email=email)
+        except UserAccount.DoesNotExist:
+            raise serializers.ValidationError({field: f"User with email '{email}' not found"})
+
+    def validate(self, data):
+        request = self.context['request']
+        if self.instance is not None:
+            group = self.instance.group
+        elif 'group_email' in data:
+            if not request.user.is_staff and data['group_email'] != request.user.email:
+                raise serializers.ValidationError({'group_email': "You can only manage your own group"})
+            group = self._user_by_email(data['group_email'], 'group_email')
+        else:
+            group = request.user
+        member = (self._user_by_email(data['member_email'], 'member_email') if 'member_email' in data
+                  else self.instance.member)
+
+        # A member that contains the group (directly or further down) would make the tree circular
+        if member.id in ancestor_group_ids([group.id]):
+            raise serializers.ValidationError({'member_email': "A group cannot contain itself"})
+        others = SplitGroupMember.objects.filter(group=group).exclude(member=member)
+        if self.instance is None and SplitGroupMember.objects.filter(group=group, member=member).exists():
+            raise serializers.ValidationError({'member_email': "This user is already a member of the group"})
+        percentage = data.get('percentage', self.instance.percentage if self.instance else 0)
+        total = sum(others.values_list('percentage', flat=True)) + percentage
+        if total > 100:
+            raise serializers.ValidationError({'percentage': f"Group member percentages exceed 100 ({total})"})
+
+        data.pop('group_email', None)
+        data.pop('member_email', None)
+        data['group'], data['member'] = group, member
+        return data
+
+
 class RoyaltyDetailSerializer(serializers.ModelSerializer):
     track_title = serializers.CharField(source='track.title', read_only=True)
     user_shares = serializers.SerializerMethodField(read_only=True)
@@ -88,9 +157,56 @@ class RoyaltyDetailSerializer(serializers.ModelSerializer):
         validated_data['distribution_date'] = timezone.now().date()
         return super().create(validated_data)
 
+class PreviewSplitSerializer(serializers.Serializer):
+    track = serializers.IntegerField(required=False, allow_null=True)
+    user = serializers.IntegerField()
+    percentage = serializers.FloatField(min_value=0, max_value=100)
+
+
+class RoyaltyPreviewSerializer(serializers.Serializer):
+    """Input of POST /api/royalties/preview/"""
+    track_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    genre = serializers.CharField(required=False)
+    owner = serializers.IntegerField(required=False)
+    rate_per_stream = serializers.DecimalField(max_digits=8, decimal_places=6, min_value=0, required=False)
+    fee_percent = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=100,
+                                           required=False)
+    splits = PreviewSplitSerializer(many=True, required=False)
+    streams = serializers.ChoiceField(choices=['pending', 'total'], default='pending')
+    include_tracks = serializers.BooleanField(default=True)
+
+    def validate_splits(self, value):
+        # The preview returns the email of every user in the splits: non-staff
+        # callers may only name themselves and their existing collaborators
+        user = self.context['request'].user
+        if user.is_staff:
+            return value
+        allowed = {user.id}
+        allowed.update(Split.objects.filter(track__owner=user).values_list('user_id', flat=True))
+        allowed.update(SplitGroupMember.objects.filter(group=user).values_list('member_id', flat=True))
+        unknown = sorted({entry['user'] for entry in value} - allowed)
+        if unknown:
+            raise serializers.ValidationError(f"Users {unknown} are not collaborators on your tracks")
+        return value
+
+
+class StreamStatsQuerySerializer(serializers.Serializer):
+    """Query parameters of GET /api/tracks/stream_stats/ and /api/tracks/{id}/stream_stats/"""
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    group_by = serializers.ChoiceField(choices=GROUP_BY_CHOICES, default=GROUP_BY_DAY)
+
+    def validate(self, data):
+        if data.get('date_from') and data.get('date_to') and data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to")
+        return data
+
+
 class TrackSerializer(serializers.ModelSerializer):
     owner_email = serializers.CharField(source='owner.email', read_only=True)
     streams = StreamDataSerializer(many=True, read_only=True)
+    # Replaces `streams` when the context has daily_streams=True (?streams=daily)
+    daily_streams = serializers.SerializerMethodField()
     splits = SplitSerializer(many=True, required=False)  # Writable
     # Allow uploading an audio file
     file = serializers.FileField(required=False, allow_null=True)
@@ -99,10 +215,28 @@ class TrackSerializer(serializers.ModelSerializer):
     class Meta:
         model = Track
         fields = [
-            'id', 'title', 'duration', 'genre', 'release_date', 'nft_id',
-            'owner', 'owner_email', 'streams', 'splits', 'file', 'royalties', 'payout_amount', 'processed_streams', 'rate_per_stream'
+            'id', 'title', 'duration', 'genre', 'release_date', 'nft_id', 'isrc',
+            'owner', 'owner_email', 'streams', 'daily_streams', 'splits', 'file', 'royalties', 'payout_amount',
+            'processed_streams', 'rate_per_stream', 'total_valid_streams'
         ]
-        read_only_fields = ['id', 'owner_email', 'streams', 'royalties', 'release_date', 'processed_streams']
+        read_only_fields = ['id', 'owner_email', 'streams', 'daily_streams', 'royalties', 'release_date',
+                            'processed_streams', 'total_valid_streams']
+
+    def get_fields(self):
+        """Raw stream rows, or their daily rollup when the view asks for it"""
+        fields = super().get_fields()
+        fields.pop('streams' if self.context.get('daily_streams') else 'daily_streams')
+        return fields
+
+    def get_daily_streams(self, obj):
+        """The prefetched rollup rows, with the shard rows of a day summed"""
+        days = {}
+        for rollup in obj.daily_rollups.all():
+            day = days.setdefault((rollup.date, rollup.platform),
+                                  StreamDailyRollup(platform=rollup.platform, date=rollup.date))
+            day.valid_streams += rollup.valid_streams
+            day.fraud_streams += rollup.fraud_streams
+        return StreamDailyRollupSerializer(list(days.values()), many=True).data
 
     def validate_title(self, value):
         """Sanitize track title"""
@@ -116,6 +250,15 @@ class TrackSerializer(serializers.ModelSerializer):
             return InputSanitizer.sanitize_text(value, max_length=50)
         return value
 
+    def validate_isrc(self, value):
+        """Store ISRCs without separators so DSP report lines match them"""
+        if not value:
+            return None
+        isrc = normalize_isrc(value)
+        if not re.fullmatch(r'[A-Z]{2}[A-Z0-9]{3}\d{7}', isrc):
+            raise serializers.ValidationError("ISRC must look like CC-XXX-YY-NNNNN")
+        return isrc
+
     def validate(self, data):
         splits = data.get('splits', [])
         if splits:
@@ -37,15 +37,16 @@ class PayoutSerializer(serializers.ModelSerializer):
         
         if wallet and amount:
             from decimal import Decimal
-            if wallet.balance < Decimal(str(amount)):
+            if wallet.effective_balance < Decimal(str(amount)):
                 raise serializers.ValidationError(
-                    f"Insufficient balance. Wallet balance: {wallet.balance}, Payout amount: {amount}"
+                    f"Insufficient balance. Wallet balance: {wallet.effective_balance}, Payout amount: {amount}"
                 )
         return data
 
 
 class WalletSerializer(serializers.ModelSerializer):
     user_email = serializers.CharField(source='user.email', read_only=True)
+    balance = serializers.DecimalField(source='effective_balance', max_digits=14, decimal_places=2, read_only=True)
     payouts = PayoutSerializer(many=True, read_only=True)
 
     class Meta:
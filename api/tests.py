@@ -1,3 +1,245 @@
-from django.test import TestCase
+import json
+import tempfile
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from backend.models import (
+    IdempotencyKey, Job, Royalty, Split, SplitGroupMember, StreamData, StreamReportImport, Track, UserAccount,
+)
+from backend.royalty_service import distribute_royalty_for_track
+
+
+class RoyaltyPreviewTests(TestCase):
+    def setUp(self):
+        self.owner = UserAccount.objects.create_user(email='owner@example.com', name='owner', password='pw')
+        self.track = Track.objects.create(title='Track', owner=self.owner)
+        Split.objects.create(track=self.track, user=self.owner, percentage=100)
+        StreamData.objects.create(track=self.track, platform='spotify', stream_count=1000, date_recorded='2026-07-01')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def _preview(self, data):
+        return self.client.post('/api/royalties/preview/', data, format='json')
+
+    def test_preview_writes_nothing(self):
+        response = self._preview({'track_ids': [self.track.id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.json()['totals']['total_earning']), Decimal('3.00'))
+        self.assertFalse(Royalty.objects.exists())
+
+    def test_override_splits_only_name_collaborators(self):
+        stranger = UserAccount.objects.create_user(email='stranger@example.com', name='stranger', password='pw')
+        splits = [{'user': self.owner.id, 'percentage': 50}, {'user': stranger.id, 'percentage': 50}]
+
+        response = self._preview({'splits': splits})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('stranger@example.com', response.content.decode())
+
+        Split.objects.create(track=Track.objects.create(title='Other', owner=self.owner), user=stranger, percentage=100)
+        response = self._preview({'splits': splits})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('stranger@example.com', [user['email'] for user in response.json()['users']])
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.owner = UserAccount.objects.create_user(email='owner@example.com', name='owner', password='pw')
+        self.track = Track.objects.create(title='Track', owner=self.owner)
+        Split.objects.create(track=self.track, user=self.owner, percentage=100)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.url = f'/api/tracks/{self.track.id}/add_streams_and_distribute/'
+
+    def _post(self, data, key):
+        return self.client.post(self.url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    @override_settings(ROYALTY_COALESCE_INCREMENTS=False)
+    def test_retry_replays_the_stored_response(self):
+        first = self._post({'add_streams': 5000}, 'retry-1')
+        retry = self._post({'add_streams': 5000}, 'retry-1')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(Decimal(str(first.json()['total_earning'])), Decimal('15.00'))
+        self.assertEqual((retry.status_code, retry.json()), (200, first.json()))
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(Royalty.objects.filter(track=self.track).count(), 1)
+        self.assertEqual(sum(StreamData.objects.values_list('stream_count', flat=True)), 5000)
+
+    @override_settings(ROYALTY_COALESCE_INCREMENTS=False)
+    def test_key_reused_for_another_request_is_rejected(self):
+        self._post({'add_streams': 5000}, 'retry-2')
+        response = self._post({'add_streams': 7}, 'retry-2')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(sum(StreamData.objects.values_list('stream_count', flat=True)), 5000)
+
+    @override_settings(ROYALTY_COALESCE_INCREMENTS=False)
+    def test_requests_without_a_key_are_not_recorded(self):
+        for _ in range(2):
+            self.client.post(self.url, {'add_streams': 5000}, format='json')
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(Royalty.objects.filter(track=self.track).count(), 2)
+
+
+class CoalescedIncrementTests(TestCase):
+    @override_settings(ROYALTY_COALESCE_INCREMENTS=True)
+    def test_coalesced_increments_are_paid_once_by_the_flush(self):
+        owner = UserAccount.objects.create_user(email='owner@example.com', name='owner', password='pw')
+        track = Track.objects.create(title='Track', owner=owner)
+        Split.objects.create(track=track, user=owner, percentage=100)
+        client = APIClient()
+        client.force_authenticate(owner)
+
+        for _ in range(3):
+            response = client.post(f'/api/tracks/{track.id}/add_streams_and_distribute/', {'add_streams': 1000},
+                                   format='json')
+            self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['pending_streams'], 3000)
+        self.assertFalse(Royalty.objects.exists())
+
+        for _ in range(2):
+            call_command('flush_coalesced_distributions', '--once', '--window', '0', stdout=StringIO())
+        self.assertEqual(list(Royalty.objects.values_list('total_earning', flat=True)), [Decimal('9.00')])
+
+
+class RoyaltyListTests(TestCase):
+    def setUp(self):
+        self.owner = UserAccount.objects.create_user(email='owner@example.com', name='owner', password='pw')
+        self.collaborator = UserAccount.objects.create_user(email='collab@example.com', name='collab', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def _distribute(self, count):
+        for _ in range(count):
+            track = Track.objects.create(title='Track', owner=self.owner, payout_amount=Decimal('10.00'))
+            Split.objects.create(track=track, user=self.owner, percentage=50)
+            Split.objects.create(track=track, user=self.collaborator, percentage=50)
+            distribute_royalty_for_track(track)
+
+    def _list(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/royalties/')
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_query_count_does_not_grow_with_royalties(self):
+        self._distribute(2)
+        _, few = self._list()
+        self._distribute(4)
+        royalties, many = self._list()
+
+        self.assertEqual(many, few)
+        self.assertEqual(len(royalties), 6)
+        self.assertEqual(len(royalties[0]['user_shares']), 2)
+
+
+class SplitGroupTests(TestCase):
+    def setUp(self):
+        self.band = UserAccount.objects.create_user(email='band@example.com', name='band', password='pw')
+        self.label = UserAccount.objects.create_user(email='label@example.com', name='label', password='pw')
+        SplitGroupMember.objects.create(group=self.band, member=self.label, percentage=40)
+        self.client = APIClient()
+
+    def _add_member(self, group, member_email, percentage=10):
+        self.client.force_authenticate(group)
+        return self.client.post('/api/split-groups/', {'member_email': member_email, 'percentage': percentage},
+                                format='json')
+
+    def test_group_cannot_contain_itself(self):
+        response = self._add_member(self.label, 'band@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('member_email', response.json())
+
+        self.assertEqual(self._add_member(self.band, 'band@example.com').status_code, 400)
+        self.assertEqual(SplitGroupMember.objects.count(), 1)
+
+
+@override_settings(STREAM_COUNTER_SHARDS=4)
+class ShardedIncrementTests(TestCase):
+    def setUp(self):
+        owner = UserAccount.objects.create_user(email='owner@example.com', name='owner', password='pw')
+        self.track = Track.objects.create(title='Track', owner=owner)
+        Split.objects.create(track=self.track, user=owner, percentage=100)
+        self.client = APIClient()
+        self.client.force_authenticate(owner)
+        self.url = f'/api/tracks/{self.track.id}/add_streams_and_distribute/'
+
+    def test_increments_are_coalesced_by_default(self):
+        response = self.client.post(self.url, {'add_streams': 1000}, format='json')
+        self.assertEqual((response.status_code, response.json()['coalesced']), (202, True))
+        self.assertFalse(Royalty.objects.exists())
+
+        response = self.client.post(self.url, {'add_streams': 1000, 'coalesce': False}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(str(response.json()['total_earning'])), Decimal('6.00'))
+
+
+class StreamReportUploadTests(TestCase):
+    def setUp(self):
+        admin = UserAccount.objects.create_user(email='admin@example.com', name='admin', password='pw')
+        admin.is_staff = True
+        admin.save()
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def _upload(self, content, name='report.csv'):
+        return self.client.post('/api/stream-reports/',
+                                {'file': SimpleUploadedFile(name, content), 'platform': 'apple'}, format='multipart')
+
+    def test_same_report_is_refused_until_its_import_fails(self):
+        report = b'track_id,date,streams\n1,2026-10-01,10\n'
+        first = self._upload(report)
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(Job.objects.filter(kind='import_stream_report').count(), 1)
+
+        duplicate = self._upload(report, name='renamed.csv')
+        self.assertEqual(duplicate.status_code, 400)
+        self.assertIn('already uploaded', duplicate.json()['file'][0])
+
+        StreamReportImport.objects.filter(pk=first.json()['id']).update(status=StreamReportImport.FAILED)
+        self.assertEqual(self._upload(report).status_code, 202)
+
+
+class BulkStreamIngestTests(TestCase):
+    def setUp(self):
+        self.owner = UserAccount.objects.create_user(email='owner@example.com', name='owner', password='pw')
+        other = UserAccount.objects.create_user(email='other@example.com', name='other', password='pw')
+        self.track = Track.objects.create(title='Track', owner=self.owner, isrc='USS1Z9900001')
+        self.foreign = Track.objects.create(title='Other', owner=other)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def _post(self, lines):
+        return self.client.post('/api/streams/bulk/', '\n'.join(lines), content_type='application/x-ndjson')
+
+    def test_bad_lines_are_rejected_and_the_rest_stored(self):
+        response = self._post([
+            json.dumps({'track': self.track.id, 'platform': 'a', 'stream_count': 300, 'date_recorded': '2026-10-01'}),
+            '{"track": ',
+            json.dumps({'track': self.foreign.id, 'platform': 'a', 'stream_count': 5, 'date_recorded': '2026-10-01'}),
+            json.dumps({'isrc': 'USS1Z9900001', 'platform': 'a', 'stream_count': 20, 'date_recorded': '2026-10-01'}),
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        summary = response.json()
+        self.assertEqual((summary['lines'], summary['accepted'], summary['rejected'], summary['streams']),
+                         (4, 2, 2, 320))
+        self.assertEqual([line['line'] for line in summary['rejected_lines']], [2, 3])
+        self.assertEqual(list(StreamData.objects.values_list('track_id', 'stream_count')), [(self.track.id, 320)])
+
+    def test_nothing_accepted_is_a_bad_request(self):
+        response = self._post(['not json'])
+        self.assertEqual((response.status_code, response.json()['rejected']), (400, 1))
+        self.assertFalse(StreamData.objects.exists())
@@ -5,7 +5,9 @@ from api.viewsets.track import TrackViewSet
 from api.viewsets.wallet import WalletViewSet
 from api.viewsets.siem import SIEMEventViewSet, SeverityLevelViewSet
 from api.viewsets.royalty import RoyaltyViewSet
-from api.viewsets.split import SplitViewSet
+from api.viewsets.split import SplitGroupMemberViewSet, SplitViewSet
+from api.viewsets.stream import StreamViewSet
+from api.viewsets.stream_report import StreamReportImportViewSet
 from api.viewsets.payout import PayoutViewSet, PayoutStatusViewSet
 from api.auth_views import get_auth_token, register_user
 
@@ -19,6 +21,9 @@ router.register(r'wallets', WalletViewSet, basename='wallet')
 router.register(r'siem-events', SIEMEventViewSet, basename='siem-event')
 router.register(r'royalties', RoyaltyViewSet, basename='royalty')
 router.register(r'splits', SplitViewSet, basename='split')
+router.register(r'split-groups', SplitGroupMemberViewSet, basename='split-group')
+router.register(r'streams', StreamViewSet, basename='stream')
+router.register(r'stream-reports', StreamReportImportViewSet, basename='stream-report')
 router.register(r'payouts', PayoutViewSet, basename='payout')
 router.register(r'payout-status', PayoutStatusViewSet, basename='payout-status')
 router.register(r'severity-levels', SeverityLevelViewSet, basename='severity-level')
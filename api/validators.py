@@ -31,8 +31,13 @@ class FileValidator:
         '.mp3', '.m4a', '.wav', '.ogg', '.flac'
     }
     
+    ALLOWED_REPORT_EXTENSIONS = {
+        '.csv', '.tsv', '.txt', '.gz'
+    }
+
     MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB
     MAX_AUDIO_SIZE = 50 * 1024 * 1024  # 50MB
+    MAX_REPORT_SIZE = 1024 * 1024 * 1024  # 1GB
 
     @staticmethod
     def validate_image(file):
@@ -95,3 +100,25 @@ class FileValidator:
             raise ValidationError(f"Invalid file extension: {ext}")
         
         return True
+
+    @staticmethod
+    def validate_stream_report(file):
+        """Validate DSP stream report (CSV/TSV, optionally gzip-compressed)"""
+        if not file:
+            raise ValidationError("No file provided")
+
+        if file.size > FileValidator.MAX_REPORT_SIZE:
+            raise ValidationError(f"Report too large. Maximum size: 1GB, got {file.size / 1024 / 1024:.1f}MB")
+
+        import os
+        ext = os.path.splitext(file.name)[1].lower()
+        if ext not in FileValidator.ALLOWED_REPORT_EXTENSIONS:
+            raise ValidationError(f"Invalid file extension: {ext}. Allowed: CSV, TSV, TXT, GZ")
+
+        if ext == '.gz':
+            file.seek(0)
+            if file.read(2) != b'\x1f\x8b':  # gzip magic bytes
+                raise ValidationError("File is not a valid gzip archive")
+            file.seek(0)
+
+        return True
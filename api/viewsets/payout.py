@@ -63,7 +63,7 @@ class PayoutViewSet(viewsets.ModelViewSet):
             return Response({
                 "total_payouts": payouts.count(),
                 "total_amount": total_amount,
-                "wallet_balance": wallet.balance
+                "wallet_balance": wallet.effective_balance
             })
         except Wallet.DoesNotExist:
             return Response(
@@ -1,6 +1,9 @@
 from rest_framework import viewsets, permissions
-from backend.models import Royalty
-from api.serializers.track import RoyaltyDetailSerializer
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from backend.models import Royalty, Track
+from backend.services.royalty_preview import preview_distribution
+from api.serializers.track import RoyaltyDetailSerializer, RoyaltyPreviewSerializer
 
 
 class RoyaltyViewSet(viewsets.ReadOnlyModelViewSet):
@@ -8,6 +11,7 @@ class RoyaltyViewSet(viewsets.ReadOnlyModelViewSet):
     Read-only access to royalties (system-generated only)
     - GET /api/royalties/ - List all royalties for your tracks
     - GET /api/royalties/{id}/ - Get royalty details
+    - POST /api/royalties/preview/ - What-if distribution (writes nothing)
     
     Royalties are automatically generated by the system through the royalty service.
     Users cannot manually create or modify royalties.
@@ -18,6 +22,46 @@ class RoyaltyViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         """Users see royalties only for their tracks"""
         user = self.request.user
+        # user_shares reads the stored share rows: one prefetch for the whole page
         if user.is_staff:
-            return Royalty.objects.all()
-        return Royalty.objects.filter(track__owner=user)
+            return Royalty.objects.all().select_related('track').with_shares()
+        return Royalty.objects.filter(track__owner=user).select_related('track').with_shares()
+
+    @action(detail=False, methods=['post'])
+    def preview(self, request):
+        """
+        Compute what each collaborator would receive without creating any
+        royalty, payout or wallet change.
+
+        POST /api/royalties/preview/
+        Body (all optional):
+        - track_ids: list of track ids; genre / owner: extra filters
+        - rate_per_stream: flat rate instead of the rate cards and track rates
+        - fee_percent: overrides the platform fee
+        - splits: [{"track"?, "user", "percentage"}] replacement splits; non-staff
+          callers can only name themselves and their tracks' collaborators
+        - streams: "pending" (undistributed streams, default) or "total"
+        - include_tracks: include per-track rows (default true)
+        Response: {totals, users: [...], tracks: [...]}
+        """
+        serializer = RoyaltyPreviewSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        # Users preview only their own tracks; staff can preview the whole catalog
+        tracks = Track.objects.all() if request.user.is_staff else Track.objects.filter(owner=request.user)
+        if 'track_ids' in params:
+            tracks = tracks.filter(id__in=params['track_ids'])
+        if 'genre' in params:
+            tracks = tracks.filter(genre__iexact=params['genre'])
+        if 'owner' in params:
+            tracks = tracks.filter(owner_id=params['owner'])
+
+        return Response(preview_distribution(
+            tracks,
+            rate_per_stream=params.get('rate_per_stream'),
+            fee_percent=params.get('fee_percent'),
+            splits=params.get('splits'),
+            streams=params['streams'],
+            include_tracks=params['include_tracks'],
+        ))
@@ -1,7 +1,7 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
-from backend.models import Split, Track
-from api.serializers.track import SplitSerializer
+from backend.models import Split, SplitGroupMember, Track
+from api.serializers.track import SplitGroupMemberSerializer, SplitSerializer
 
 
 class SplitViewSet(viewsets.ModelViewSet):
@@ -52,3 +52,24 @@ class SplitViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         return super().destroy(request, *args, **kwargs)
+
+
+class SplitGroupMemberViewSet(viewsets.ModelViewSet):
+    """
+    Members of group collaborators (band, label or publisher accounts).
+    A split held by a group is paid out to its members by these percentages.
+    - GET /api/split-groups/ - List the members of your group
+    - POST /api/split-groups/ - Add a member (member_email, percentage)
+    - PUT/PATCH /api/split-groups/{id}/ - Change a member's percentage
+    - DELETE /api/split-groups/{id}/ - Remove a member
+    """
+    serializer_class = SplitGroupMemberSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        """Users see the members of their own group"""
+        user = self.request.user
+        queryset = SplitGroupMember.objects.select_related('group', 'member')
+        if user.is_staff:
+            return queryset
+        return queryset.filter(group=user)
@@ -0,0 +1,31 @@
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from backend.models import Track
+from backend.services.stream_ingest import ingest_stream_events, iter_lines
+
+
+class StreamViewSet(viewsets.GenericViewSet):
+    """
+    Bulk ingestion of stream events
+    - POST /api/streams/bulk/ - JSON Lines body (Content-Type: application/x-ndjson), one StreamData row per line:
+      {"track": 12, "platform": "spotify", "stream_count": 300, "date_recorded": "2026-10-01"}
+      ("isrc" may replace "track"; "fraud_flag" is optional)
+
+    The body is parsed incrementally and inserted in batches. Users may only
+    send streams of their own tracks; staff may send any. Bad lines are
+    rejected with their line number while the others are stored; the
+    response summarizes both (201 if anything was accepted, else 400).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    queryset = Track.objects.all()
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        # request.data is never touched: no DRF parser buffers the body
+        stream = request.stream
+        if stream is None:
+            return Response({'error': 'Request body is empty'}, status=status.HTTP_400_BAD_REQUEST)
+        tracks = Track.objects.all() if request.user.is_staff else Track.objects.filter(owner=request.user)
+        summary = ingest_stream_events(iter_lines(stream), tracks)
+        return Response(summary, status=status.HTTP_201_CREATED if summary['accepted'] else status.HTTP_400_BAD_REQUEST)
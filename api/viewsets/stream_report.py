@@ -0,0 +1,38 @@
+from django.db import IntegrityError, transaction
+from rest_framework import mixins, permissions, serializers, status, viewsets
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.response import Response
+from backend.models import StreamReportImport
+from backend.services.jobs import enqueue
+from backend.tasks import IMPORT_STREAM_REPORT
+from api.serializers.stream_report import StreamReportImportSerializer
+
+
+class StreamReportImportViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Bulk upload of DSP stream reports (admin only)
+    - POST /api/stream-reports/ - Upload a CSV/TSV report (multipart: file, optional platform)
+    - GET /api/stream-reports/ - List uploaded reports and their import status
+    - GET /api/stream-reports/{id}/ - Import status, totals and per-chunk errors
+
+    Columns: isrc or track_id, platform (or the platform field), date, streams.
+    The report is imported in the background by `manage.py run_workers`;
+    the response is 202 with the queued import. Imports add their streams,
+    so a file already queued or imported is refused (400).
+    """
+    queryset = StreamReportImport.objects.select_related('uploaded_by').order_by('-created_at')
+    serializer_class = StreamReportImportSerializer
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                report = serializer.save(uploaded_by=request.user)
+                enqueue(IMPORT_STREAM_REPORT, {'import_id': report.id})
+        except IntegrityError:
+            # The same file uploaded concurrently
+            raise serializers.ValidationError({'file': "This report was already uploaded"})
+        return Response(self.get_serializer(report).data, status=status.HTTP_202_ACCEPTED)
@@ -5,10 +5,16 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
-from backend.models import Track, StreamData
+from django.db import transaction
+from django.db.models import Prefetch
+from backend.models import Royalty, Track, StreamDailyRollup
 from backend.royalty_service import distribute_royalty_for_track, distribute_royalty_from_streams
 from django.utils import timezone
-from api.serializers.track import TrackSerializer
+from backend.services.coalescing import coalesce_window, coalescing_enabled, record_increment
+from backend.services.stream_dedup import add_streams as add_stream_rows
+from backend.services.stream_rollups import stream_series
+from api.idempotency import idempotent
+from api.serializers.track import StreamStatsQuerySerializer, TrackSerializer
 
 
 class TrackPagination(PageNumberPagination):
@@ -32,6 +38,13 @@ class TrackViewSet(viewsets.ModelViewSet):
     - PUT /api/tracks/{id}/ - Update track (owner only)
     - DELETE /api/tracks/{id}/ - Delete track (owner only)
     - POST /api/tracks/{id}/distribute_royalties/ - Manually trigger royalty distribution
+    - POST /api/tracks/{id}/add_streams_and_distribute/ - Add streams and distribute the new earnings
+    - GET /api/tracks/?streams=daily - Nest the daily stream rollup (daily_streams) instead of raw stream rows
+    - GET /api/tracks/{id}/stream_stats/ - Stream totals and chart series of a track (from the daily rollup)
+    - GET /api/tracks/stream_stats/ - The same over all your tracks
+
+    Both POST actions accept an Idempotency-Key header: a retry with the same
+    key returns the stored response instead of distributing again.
     """
     serializer_class = TrackSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -44,15 +57,28 @@ class TrackViewSet(viewsets.ModelViewSet):
     ordering_fields = ['release_date', 'title', 'duration']
     ordering = ['-release_date']
 
+    def _daily_streams(self):
+        return self.request.query_params.get('streams') == 'daily'
+
     def get_queryset(self):
         """
         Users see only their own tracks by default.
         Staff can see all tracks.
         """
+        # ?streams=daily: one rollup row per day and platform instead of every raw StreamData row
+        if self._daily_streams():
+            streams = Prefetch('daily_rollups', queryset=StreamDailyRollup.objects.order_by('date', 'platform'))
+        else:
+            streams = 'streams'
         if self.request.user.is_staff:
-            return Track.objects.all().select_related('owner').prefetch_related('splits', 'streams', 'royalties')
+            return Track.objects.all().select_related('owner').prefetch_related('splits', streams, Prefetch('royalties', queryset=Royalty.objects.with_shares()))
         else:
-            return Track.objects.filter(owner=self.request.user).select_related('owner').prefetch_related('splits', 'streams', 'royalties')
+            return Track.objects.filter(owner=self.request.user).select_related('owner').prefetch_related('splits', streams, Prefetch('royalties', queryset=Royalty.objects.with_shares()))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['daily_streams'] = self._daily_streams()
+        return context
 
     def perform_create(self, serializer):
         # Set owner to the currently authenticated user
@@ -76,6 +102,7 @@ class TrackViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @idempotent
     def distribute_royalties(self, request, pk=None):
         """
         Manually trigger royalty distribution for this track.
@@ -147,13 +174,20 @@ class TrackViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @idempotent
     def add_streams_and_distribute(self, request, pk=None):
         """
         Increment streams for a track and distribute earnings for the new streams.
 
         Request body options:
-        - add_streams: integer (number of streams to add). If provided, a StreamData row will be created.
+        - add_streams: integer (number of streams to add). If provided, they are added to today's StreamData row.
         - platform: optional string (platform name)
+        - coalesce: optional boolean (default settings.ROYALTY_COALESCE_INCREMENTS, always true with
+          settings.STREAM_COUNTER_SHARDS > 1). When true the increment is only recorded and the
+          response (202) carries the pending delta; distribution happens in
+          `manage.py flush_coalesced_distributions`, merged with other increments. An explicit
+          `coalesce: false` distributes in the request, which locks the Track row: on a hot track
+          such requests queue behind each other even with counter shards.
 
         Only the track owner or staff may call this.
         """
@@ -173,11 +207,59 @@ class TrackViewSet(viewsets.ModelViewSet):
             except Exception:
                 return Response({'error': 'Invalid add_streams value'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Create a StreamData record for the increment
-            StreamData.objects.create(track=track, platform=platform, stream_count=add_streams, date_recorded=timezone.now().date())
+            coalesce = request.data.get('coalesce', coalescing_enabled())
+            if isinstance(coalesce, str):
+                coalesce = coalesce.lower() in ('1', 'true', 'yes')
+            if coalesce:
+                pending_streams, pending_since = record_increment(track, add_streams, platform)
+                return Response({
+                    'track_id': track.id,
+                    'coalesced': True,
+                    'pending_streams': pending_streams,
+                    'pending_since': pending_since,
+                    'flush_after': pending_since + coalesce_window(),
+                }, status=status.HTTP_202_ACCEPTED)
+
+            # Add the increment to today's StreamData row of the platform
+            with transaction.atomic():
+                add_stream_rows([(track.id, platform, timezone.now().date(), add_streams, False)], sharded=True)
 
         try:
             result = distribute_royalty_from_streams(track)
             return Response(result)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def _stream_stats(self, request, track_ids):
+        query = StreamStatsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        return Response({
+            'date_from': params.get('date_from'),
+            'date_to': params.get('date_to'),
+            'group_by': params['group_by'],
+            **stream_series(track_ids, params.get('date_from'), params.get('date_to'), params['group_by']),
+        })
+
+    @action(detail=True, methods=['get'])
+    def stream_stats(self, request, pk=None):
+        """
+        Valid and fraud stream totals of this track and their series for charts,
+        read from the daily rollup (cost grows with days, not raw stream rows).
+
+        GET /api/tracks/{id}/stream_stats/?date_from=2026-01-01&date_to=2026-03-31&group_by=day
+        - group_by: day (default), month or platform
+        Response: {date_from, date_to, group_by, valid_streams, fraud_streams, series: [...]}
+        """
+        track = self.get_object()
+        return self._stream_stats(request, [track.id])
+
+    @action(detail=False, methods=['get'], url_path='stream_stats')
+    def catalog_stream_stats(self, request):
+        """
+        The same as stream_stats, summed over every track you can see.
+
+        GET /api/tracks/stream_stats/?group_by=month
+        """
+        tracks = Track.objects.all() if request.user.is_staff else Track.objects.filter(owner=request.user)
+        return self._stream_stats(request, tracks.values_list('id', flat=True))
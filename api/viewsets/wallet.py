@@ -5,9 +5,12 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 from decimal import Decimal
+from django.db import transaction
 from django.utils import timezone
-from backend.models import Payout, PayoutStatus
+from backend.models import LedgerEntry, Payout, PayoutStatus
 from backend.services.blockchain import send_payout
+from backend.services.ledger import post_ledger_entries
+from backend.services.wallets import with_shard_balance
 
 
 class WalletViewSet(viewsets.ModelViewSet):
@@ -22,14 +25,14 @@ class WalletViewSet(viewsets.ModelViewSet):
         # Normal user yalnız öz wallet-ini görsün
         user = self.request.user
         if user.is_staff:  # admin bütün wallet-ləri görə bilir
-            return Wallet.objects.all()
-        return Wallet.objects.filter(user=user)
+            return with_shard_balance(Wallet.objects.all())
+        return with_shard_balance(Wallet.objects.filter(user=user))
 
     @action(detail=False, methods=['get'])
     def me(self, request):
         """Return the current user's primary wallet (or first wallet)."""
         user = request.user
-        wallets = Wallet.objects.filter(user=user)
+        wallets = with_shard_balance(Wallet.objects.filter(user=user))
         if not wallets.exists():
             return Response({'detail': 'Wallet not found.'}, status=status.HTTP_404_NOT_FOUND)
         serializer = self.get_serializer(wallets.first())
@@ -51,50 +54,57 @@ class WalletViewSet(viewsets.ModelViewSet):
         if amount <= 0:
             return Response({'error': 'amount must be > 0'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if amount > wallet.balance:
-            return Response({'error': 'amount exceeds wallet balance'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Pending payouts
-        pending_payouts = Payout.objects.filter(wallet=wallet, status__status_name='Pending')
-        total_pending = sum((p.amount for p in pending_payouts), Decimal('0'))
-
-        if amount > total_pending:
-            return Response({'error': 'amount exceeds total pending payouts'}, status=status.HTTP_400_BAD_REQUEST)
-
-        completed_status, _ = PayoutStatus.objects.get_or_create(status_name='Completed')
-
-        remaining = amount
-
-        for payout in pending_payouts:
-            if remaining <= 0:
-                break
-
-            if payout.amount <= remaining:
-                remaining -= payout.amount
-                payout.status = completed_status
-                payout.save()
-            else:
-                # Partial payout: create completed payout and reduce existing
-                Payout.objects.create(
-                    wallet=wallet,
-                    amount=remaining,
-                    status=completed_status,
-                    txn_date=timezone.now()
-                )
-                payout.amount -= remaining
-                payout.save()
-                remaining = Decimal('0')
-
-        # Wallet balance update
-        wallet.balance -= amount
-        wallet.last_updated = timezone.now()
-        wallet.save()
+        with transaction.atomic():
+            # Lock the wallet so concurrent withdrawals can't both pass the balance check
+            wallet = Wallet.objects.select_for_update().get(pk=wallet.pk)
+
+            if amount > wallet.effective_balance:
+                return Response({'error': 'amount exceeds wallet balance'}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Pending payouts
+            pending_payouts = Payout.objects.filter(wallet=wallet, status__status_name='Pending')
+            total_pending = sum((p.amount for p in pending_payouts), Decimal('0'))
+
+            if amount > total_pending:
+                return Response({'error': 'amount exceeds total pending payouts'}, status=status.HTTP_400_BAD_REQUEST)
+
+            completed_status, _ = PayoutStatus.objects.get_or_create(status_name='Completed')
+
+            remaining = amount
+            ledger_entries = []
+
+            for payout in pending_payouts:
+                if remaining <= 0:
+                    break
+
+                if payout.amount <= remaining:
+                    remaining -= payout.amount
+                    payout.status = completed_status
+                    payout.save()
+                    ledger_entries.append(LedgerEntry(wallet=wallet, entry_type=LedgerEntry.WITHDRAWAL,
+                                                      amount=-payout.amount, payout=payout))
+                else:
+                    # Partial payout: create completed payout and reduce existing
+                    completed = Payout.objects.create(
+                        wallet=wallet,
+                        amount=remaining,
+                        status=completed_status,
+                        txn_date=timezone.now()
+                    )
+                    ledger_entries.append(LedgerEntry(wallet=wallet, entry_type=LedgerEntry.WITHDRAWAL,
+                                                      amount=-remaining, payout=completed))
+                    payout.amount -= remaining
+                    payout.save()
+                    remaining = Decimal('0')
+
+            # Wallet balance update
+            new_balance = post_ledger_entries(ledger_entries)[wallet.id]
 
         # Blockchain transfer
         blockchain_result = send_payout(wallet.blockchain_address, float(amount))
 
         return Response({
             'message': f'Withdrawn {amount} successfully',
-            'new_balance': wallet.balance,
+            'new_balance': new_balance,
             'blockchain': blockchain_result
         }, status=status.HTTP_200_OK)
@@ -0,0 +1,80 @@
+import os
+import time
+from datetime import date, timedelta
+from multiprocessing import Pool
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def _init_worker():
+    # Needed under the "spawn" start method; a no-op for already configured forks
+    django.setup()
+    connections.close_all()
+
+
+def _rebuild_range(date_from, date_to):
+    """Rebuild one date range in a worker process with its own database connection."""
+    from backend.services.stream_rollups import rebuild_rollups
+
+    rows = rebuild_rollups(date_from, date_to)
+    connections.close_all()
+    return date_from, date_to, rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Build StreamDailyRollup from StreamData. The date range is split into chunks of "
+        "--days days, rebuilt in parallel by a pool of worker processes; each chunk is "
+        "replaced in its own transaction, so the command can be re-run at any time. "
+        "Days being written while they are rebuilt may need a second run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, default=None,
+                            help="First day (YYYY-MM-DD, default: oldest StreamData day)")
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, default=None,
+                            help="Last day (YYYY-MM-DD, default: newest StreamData day)")
+        parser.add_argument('--days', type=int, default=7,
+                            help="Days per chunk / transaction")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Number of worker processes (default: CPU count)")
+
+    def handle(self, *args, **options):
+        from backend.services.stream_rollups import stream_date_bounds
+
+        if options['days'] < 1 or options['workers'] < 1:
+            raise CommandError("--days and --workers must be >= 1")
+        first, last = stream_date_bounds()
+        date_from = options['date_from'] or first
+        date_to = options['date_to'] or last
+        if date_from is None or date_to is None:
+            self.stdout.write("No stream data to roll up.")
+            return
+        if date_from > date_to:
+            raise CommandError("--from must not be after --to")
+
+        step = timedelta(days=options['days'])
+        ranges = []
+        start = date_from
+        while start <= date_to:
+            ranges.append((start, min(start + step - timedelta(days=1), date_to)))
+            start += step
+
+        started = time.monotonic()
+        workers = min(options['workers'], len(ranges))
+        if workers == 1:
+            results = [_rebuild_range(*chunk) for chunk in ranges]
+        else:
+            # Children must not share the parent's socket to the database
+            connections.close_all()
+            with Pool(processes=workers, initializer=_init_worker) as pool:
+                results = pool.starmap(_rebuild_range, ranges)
+        elapsed = max(time.monotonic() - started, 1e-9)
+
+        rows = sum(result[2] for result in results)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {rows} rollup rows for {date_from}..{date_to} ({len(ranges)} chunks) "
+            f"in {elapsed:.2f}s with {workers} worker(s)"
+        ))
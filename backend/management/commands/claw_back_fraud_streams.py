@@ -0,0 +1,31 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.royalty_service import claw_back_fraud_streams
+
+
+class Command(BaseCommand):
+    help = (
+        "Reverse the earnings of already-paid streams that have since been flagged as fraud. "
+        "Incremental: only rows flagged since the previous run are processed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Tracks per transaction")
+        parser.add_argument('--rate-per-stream', type=Decimal, default=None,
+                            help="Price clawed-back streams at this USD rate instead of reversing the amounts paid")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be >= 1")
+        started = time.monotonic()
+        result = claw_back_fraud_streams(options['rate_per_stream'], options['batch_size'])
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f"Clawed back {result['total_clawed_back']} USD for {result['streams_clawed_back']} streams "
+            f"({result['rows_clawed_back']} rows, {result['tracks_processed']} tracks) in {elapsed:.2f}s: "
+            f"{result['rows_clawed_back'] / elapsed:.1f} rows/sec"
+        ))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.services.stream_counters import FOLD_BATCH_SIZE, fold_stream_counter_shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold the stream counter shards of every track (settings.STREAM_COUNTER_SHARDS) "
+        "into Track.total_valid_streams: once, or every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Keep running, compacting every N seconds")
+        parser.add_argument('--batch-size', type=int, default=FOLD_BATCH_SIZE,
+                            help="Tracks per transaction")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or (options['interval'] is not None and options['interval'] <= 0):
+            raise CommandError("--batch-size must be >= 1 and --interval > 0")
+
+        while True:
+            started = time.monotonic()
+            folded = fold_stream_counter_shards(options['batch_size'])
+            if folded or options['interval'] is None:
+                self.stdout.write(f"Folded counter shards of {folded} tracks in {time.monotonic() - started:.2f}s")
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
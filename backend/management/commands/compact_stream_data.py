@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.services.stream_dedup import COMPACT_BATCH_SIZE, compact_stream_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge StreamData rows of the same track, platform, day and fraud flag into one row: "
+        "once before migration 0026 adds the unique key, then periodically to fold the shard "
+        "rows of past days written with STREAM_COUNTER_SHARDS. Each batch is merged in its own "
+        "transaction; tracks locked by a running distribution are skipped, so re-run until "
+        "nothing is merged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=COMPACT_BATCH_SIZE,
+                            help="Duplicate rows merged per transaction")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be >= 1")
+
+        started = time.monotonic()
+        merged = compact_stream_data(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Merged {merged} duplicate stream rows in {time.monotonic() - started:.2f}s"
+        ))
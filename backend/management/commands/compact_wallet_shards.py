@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.services.wallets import COMPACT_BATCH_SIZE, compact_balance_shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold the balance shards of sharded wallets (settings.WALLET_BALANCE_SHARDS) "
+        "back into Wallet.balance: once, or every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Keep running, compacting every N seconds")
+        parser.add_argument('--batch-size', type=int, default=COMPACT_BATCH_SIZE,
+                            help="Wallets per transaction")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or (options['interval'] is not None and options['interval'] <= 0):
+            raise CommandError("--batch-size must be >= 1 and --interval > 0")
+
+        while True:
+            started = time.monotonic()
+            compacted = compact_balance_shards(options['batch_size'])
+            if compacted or options['interval'] is None:
+                self.stdout.write(f"Compacted {compacted} wallets in {time.monotonic() - started:.2f}s")
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,54 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.royalty_service import BULK_BATCH_SIZE, iter_distribution_batches, pending_tracks
+
+
+class Command(BaseCommand):
+    help = (
+        "Distribute the new streams of the whole catalog in keyset-paginated batches. "
+        "Memory use is independent of the catalog size; each batch commits on its own, "
+        "so an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE,
+                            help="Tracks per batch / transaction")
+        parser.add_argument('--rate-per-stream', type=Decimal, default=None,
+                            help="Override the rate card / default USD rate per stream")
+        parser.add_argument('--progress-every', type=int, default=10,
+                            help="Report progress every N batches (0 = only the final summary)")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be >= 1")
+        progress_every = options['progress_every']
+
+        pending = pending_tracks().count()
+        self.stdout.write(f"{pending} tracks with undistributed streams")
+
+        started = time.monotonic()
+        totals = {"tracks_processed": 0, "royalties_created": 0, "payouts_count": 0,
+                  "total_earning": Decimal("0.00")}
+        for number, batch in enumerate(
+            iter_distribution_batches(rate_per_stream=options['rate_per_stream'], batch_size=batch_size), 1
+        ):
+            for key in totals:
+                totals[key] += batch[key]
+            if progress_every and number % progress_every == 0:
+                elapsed = max(time.monotonic() - started, 1e-9)
+                done = totals['tracks_processed']
+                self.stdout.write(
+                    f"[batch {number}] {done}/{pending} tracks ({100 * done / max(pending, 1):.1f}%), "
+                    f"{done / elapsed:.1f} tracks/sec, {totals['payouts_count'] / elapsed:.1f} payouts/sec"
+                )
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f"Distributed {totals['total_earning']} USD across {totals['royalties_created']} tracks and "
+            f"{totals['payouts_count']} payouts in {elapsed:.2f}s: "
+            f"{totals['tracks_processed'] / elapsed:.1f} tracks/sec, {totals['payouts_count'] / elapsed:.1f} payouts/sec"
+        ))
@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.services.coalescing import coalesce_min_streams, coalesce_window, flush_due_tracks
+
+
+class Command(BaseCommand):
+    help = (
+        "Background loop that distributes coalesced stream increments: every "
+        "--interval seconds each track whose oldest pending increment is older "
+        "than the window, or whose pending streams reached the threshold, is "
+        "distributed once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds between flushes")
+        parser.add_argument('--window', type=float, default=None,
+                            help="Seconds an increment may wait (default: settings.ROYALTY_COALESCE_WINDOW)")
+        parser.add_argument('--min-streams', type=int, default=None,
+                            help="Pending streams that force a flush "
+                                 "(default: settings.ROYALTY_COALESCE_MIN_STREAMS)")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Tracks per transaction")
+        parser.add_argument('--rate-per-stream', type=Decimal, default=None,
+                            help="Override the rate card / default USD rate per stream")
+        parser.add_argument('--once', action='store_true',
+                            help="Flush once and exit")
+
+    def handle(self, *args, **options):
+        if options['interval'] <= 0 or options['batch_size'] < 1:
+            raise CommandError("--interval must be > 0 and --batch-size >= 1")
+        window = timedelta(seconds=options['window']) if options['window'] is not None else coalesce_window()
+        min_streams = options['min_streams'] if options['min_streams'] is not None else coalesce_min_streams()
+
+        while True:
+            started = time.monotonic()
+            result = flush_due_tracks(window, min_streams, options['rate_per_stream'], options['batch_size'])
+            if result['royalties_created'] or options['once']:
+                self.stdout.write(
+                    f"Flushed {result['royalties_created']} tracks, {result['payouts_count']} payouts, "
+                    f"{result['total_earning']} USD in {time.monotonic() - started:.2f}s"
+                )
+            if options['once']:
+                return
+            time.sleep(options['interval'])
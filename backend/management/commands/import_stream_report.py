@@ -0,0 +1,66 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.services.stream_import import DEFAULT_CHUNK_SIZE, ReportError, iter_stream_report_import, open_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a DSP stream report (CSV/TSV, optionally .gz; '-' for stdin) into StreamData. "
+        "Columns: isrc or track_id, platform, date, streams. The file is parsed in chunks; "
+        "each chunk is COPYed into a staging table and merged in its own transaction, and "
+        "its bad lines are reported. Imports are additive: importing a report twice counts its "
+        "streams twice. Distribute the imported streams with distribute_catalog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Report file, or '-' to read stdin")
+        parser.add_argument('--platform', default=None,
+                            help="Platform of lines without one (required if the report has no platform column)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Report lines per chunk / transaction")
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--show-errors', type=int, default=10,
+                            help="Bad lines printed per chunk")
+
+    def _open(self, path, encoding):
+        if path == '-':
+            return open_report(sys.stdin.buffer, path, encoding)
+        return open_report(open(path, 'rb'), path, encoding)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be >= 1")
+        try:
+            report = self._open(options['path'], options['encoding'])
+        except OSError as exc:
+            raise CommandError(f"Cannot open {options['path']}: {exc}")
+
+        started = time.monotonic()
+        rows = imported = streams = errors = 0
+        try:
+            with report:
+                for chunk in iter_stream_report_import(report, options['platform'], options['chunk_size']):
+                    rows += chunk.rows
+                    imported += chunk.imported
+                    streams += chunk.streams
+                    errors += chunk.error_count
+                    elapsed = max(time.monotonic() - started, 1e-9)
+                    self.stdout.write(
+                        f"[chunk {chunk.chunk}] lines {chunk.first_line}-{chunk.first_line + chunk.rows - 1}: "
+                        f"{chunk.imported} imported, {chunk.error_count} errors ({rows / elapsed:.0f} lines/sec)"
+                    )
+                    for line, message in chunk.errors[:options['show_errors']]:
+                        self.stderr.write(f"  line {line}: {message}")
+        except (ReportError, UnicodeDecodeError, csv.Error) as exc:
+            raise CommandError(f"Import stopped: {exc}")
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        message = (
+            f"Imported {imported}/{rows} lines ({streams} streams) in {elapsed:.2f}s: "
+            f"{rows / elapsed:.0f} lines/sec, {errors} bad lines"
+        )
+        self.stdout.write(self.style.WARNING(message) if errors else self.style.SUCCESS(message))
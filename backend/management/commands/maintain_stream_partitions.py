@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.services.stream_partitions import (
+    DEFAULT_ARCHIVE_SCHEMA, create_future_partitions, detach_old_partitions, is_partitioned, list_partitions,
+    months_ahead, retain_months,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain the monthly partitions of StreamData (PostgreSQL): create the partitions of "
+        "the current and next --ahead months, and detach partitions older than --retain-months "
+        "into --archive-schema (or drop them with --drop). Partitions with undistributed "
+        "streams or pending fraud clawbacks are kept. Run it daily or at least monthly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=None,
+                            help="Months to create ahead (default: settings.STREAM_PARTITION_MONTHS_AHEAD or 3)")
+        parser.add_argument('--retain-months', type=int, default=None,
+                            help="Months kept attached, current month included "
+                                 "(default: settings.STREAM_PARTITION_RETAIN_MONTHS; unset keeps everything)")
+        parser.add_argument('--archive-schema', default=DEFAULT_ARCHIVE_SCHEMA,
+                            help="Schema detached partitions are moved to")
+        parser.add_argument('--drop', action='store_true',
+                            help="Drop detached partitions instead of archiving them")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only print what would be done")
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError("StreamData is not partitioned (needs PostgreSQL and migration 0025)")
+        ahead = months_ahead() if options['ahead'] is None else options['ahead']
+        retain = retain_months() if options['retain_months'] is None else options['retain_months']
+        if ahead < 0 or (retain is not None and retain < 1):
+            raise CommandError("--ahead must be >= 0 and --retain-months >= 1")
+        prefix = "[dry run] " if options['dry_run'] else ""
+
+        for name, moved in create_future_partitions(ahead, dry_run=options['dry_run']):
+            self.stdout.write(f"{prefix}Created {name}" + (f" ({moved} rows moved from DEFAULT)" if moved else ""))
+
+        detached, kept = detach_old_partitions(
+            retain, archive_schema=options['archive_schema'], drop=options['drop'], dry_run=options['dry_run'],
+        )
+        action = "Dropped" if options['drop'] else f"Detached to {options['archive_schema']}:"
+        for name in detached:
+            self.stdout.write(f"{prefix}{action} {name}")
+        for name, reason in kept:
+            self.stderr.write(f"Kept {name}: {reason}")
+
+        partitions = list_partitions()
+        ranges = [p for p in partitions if not p.is_default]
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(partitions)} partitions attached, covering "
+            f"{ranges[0].start or 'MINVALUE'}..{ranges[-1].end} plus DEFAULT" if ranges else
+            f"{len(partitions)} partitions attached"
+        ))
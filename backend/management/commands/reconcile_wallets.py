@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.services.ledger import unreconciled_wallets
+
+
+class Command(BaseCommand):
+    help = "Compare every Wallet.balance with its ledger balance in one query and list mismatches."
+
+    def handle(self, *args, **options):
+        mismatches = unreconciled_wallets().select_related('user').order_by('id')
+        count = 0
+        for wallet in mismatches.iterator():
+            count += 1
+            self.stdout.write(
+                f"wallet {wallet.id} ({wallet.user.email}): balance={wallet.total_balance} "
+                f"ledger={wallet.ledger_balance} diff={wallet.total_balance - wallet.ledger_balance}"
+            )
+        if count:
+            raise CommandError(f"{count} wallet(s) do not match their ledger")
+        self.stdout.write(self.style.SUCCESS("All wallets match their ledger"))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+
+from backend.models import Track
+from backend.services.stream_counters import recount_stream_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Track.total_valid_streams from StreamData for every track. "
+        "Each id range is rebuilt with one set-based UPDATE in its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help="Track ids per UPDATE statement")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be >= 1")
+
+        bounds = Track.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write("No tracks to recount.")
+            return
+
+        started = time.monotonic()
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+            with transaction.atomic():
+                updated += recount_stream_totals(Track.objects.filter(id__gte=start, id__lt=start + batch_size))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Recounted stream totals for {updated} tracks in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,77 @@
+import os
+import time
+from decimal import Decimal
+from multiprocessing import Pool
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models.functions import Mod
+
+
+def _init_worker():
+    # Needed under the "spawn" start method; a no-op for already configured forks
+    django.setup()
+    connections.close_all()
+
+
+def _run_shard(shard, shards, batch_size, rate_per_stream):
+    """
+    Distribute every pending track whose id falls into `shard` (id % shards).
+    Runs in a worker process with its own database connection.
+    """
+    from backend.royalty_service import distribute_pending_tracks, pending_tracks
+
+    # Keyset-paginated: memory stays flat whatever the size of the shard
+    result = distribute_pending_tracks(
+        rate_per_stream=rate_per_stream,
+        batch_size=batch_size,
+        tracks=pending_tracks().annotate(shard=Mod('id', shards)).filter(shard=shard),
+    )
+    connections.close_all()
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Distribute earnings for every track with undistributed streams, sharded by "
+        "track id across a pool of worker processes. Each batch commits its payouts "
+        "together with processed_streams, so re-running after a crash resumes where "
+        "the previous run stopped without paying any stream twice."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Number of worker processes (default: CPU count)")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Tracks per transaction inside each worker")
+        parser.add_argument('--rate-per-stream', type=Decimal, default=None,
+                            help="Override the default USD rate per stream")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        batch_size = options['batch_size']
+        if workers < 1 or batch_size < 1:
+            raise CommandError("--workers and --batch-size must be >= 1")
+
+        jobs = [(shard, workers, batch_size, options['rate_per_stream']) for shard in range(workers)]
+
+        started = time.monotonic()
+        if workers == 1:
+            results = [_run_shard(*jobs[0])]
+        else:
+            # Children must not share the parent's socket to the database
+            connections.close_all()
+            with Pool(processes=workers, initializer=_init_worker) as pool:
+                results = pool.starmap(_run_shard, jobs)
+        elapsed = max(time.monotonic() - started, 1e-9)
+
+        tracks = sum(r['royalties_created'] for r in results)
+        payouts = sum(r['payouts_count'] for r in results)
+        total_earning = sum((r['total_earning'] for r in results), Decimal("0.00"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Distributed {total_earning} USD across {tracks} tracks and {payouts} payouts "
+            f"in {elapsed:.2f}s with {workers} worker(s): "
+            f"{tracks / elapsed:.1f} tracks/sec, {payouts / elapsed:.1f} payouts/sec"
+        ))
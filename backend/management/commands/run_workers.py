@@ -0,0 +1,70 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from backend.services.jobs import run_pending_jobs, worker_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background job workers. Each worker thread claims due jobs with "
+        "SELECT ... FOR UPDATE SKIP LOCKED, runs them and re-queues failures "
+        "with exponential backoff. Several processes may run this at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Worker threads in this process")
+        parser.add_argument('--batch-size', type=int, default=10,
+                            help="Jobs claimed per poll")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to sleep when no job is due")
+        parser.add_argument('--visibility-timeout', type=float, default=None,
+                            help="Seconds before a claimed but unfinished job is claimed again "
+                                 "(default: settings.JOB_VISIBILITY_TIMEOUT)")
+        parser.add_argument('--kind', action='append', dest='kinds',
+                            help="Only run jobs of this kind (repeatable)")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once no job is due")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--workers and --batch-size must be >= 1")
+        visibility_timeout = (
+            timedelta(seconds=options['visibility_timeout']) if options['visibility_timeout'] else None
+        )
+        totals = {'claimed': 0, 'succeeded': 0}
+        lock = threading.Lock()
+
+        def work():
+            worker = worker_name()
+            try:
+                while True:
+                    claimed, succeeded = run_pending_jobs(
+                        worker, options['batch_size'], visibility_timeout, options['kinds']
+                    )
+                    with lock:
+                        totals['claimed'] += claimed
+                        totals['succeeded'] += succeeded
+                    if not claimed:
+                        if options['once']:
+                            return
+                        time.sleep(options['poll_interval'])
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, daemon=True) for _ in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping workers")
+        self.stdout.write(self.style.SUCCESS(
+            f"Ran {totals['claimed']} jobs: {totals['succeeded']} succeeded, "
+            f"{totals['claimed'] - totals['succeeded']} failed or re-queued"
+        ))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.services.ledger import take_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a balance snapshot for every wallet with new ledger entries, so "
+        "balance reads only need to sum the entries written after it. Run periodically."
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = take_snapshots()
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} wallet snapshots in {time.monotonic() - started:.2f}s"
+        ))
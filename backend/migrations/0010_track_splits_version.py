@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0009_track_processed_streams_track_rate_per_stream'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='splits_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:31
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_total_valid_streams(apps, schema_editor):
+    Track = apps.get_model('backend', 'Track')
+    StreamData = apps.get_model('backend', 'StreamData')
+    valid_total = (
+        StreamData.objects.filter(track=OuterRef('pk'), fraud_flag=False)
+        .order_by()
+        .values('track')
+        .annotate(total=Sum('stream_count'))
+        .values('total')
+    )
+    Track.objects.update(total_valid_streams=Coalesce(Subquery(valid_total), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0010_track_splits_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='total_valid_streams',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_total_valid_streams, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(condition=models.Q(('total_valid_streams__gt', models.F('processed_streams'))), fields=['id'], name='track_pending_streams_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_ledgers(apps, schema_editor):
+    """Record every existing balance as an opening entry so ledger and wallets agree."""
+    Wallet = apps.get_model('backend', 'Wallet')
+    LedgerEntry = apps.get_model('backend', 'LedgerEntry')
+    LedgerEntry.objects.bulk_create(
+        [
+            LedgerEntry(wallet_id=wallet_id, entry_type='opening', amount=balance)
+            for wallet_id, balance in Wallet.objects.exclude(balance=0).values_list('id', 'balance').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0011_track_total_valid_streams'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('opening', 'Opening balance'), ('credit', 'Royalty credit'), ('fee', 'Platform fee'), ('withdrawal', 'Withdrawal'), ('reversal', 'Reversal')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('payout', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='backend.payout')),
+                ('royalty', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='backend.royalty')),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='backend.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', 'id'], name='backend_led_wallet__89a544_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WalletSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('last_entry_id', models.BigIntegerField()),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='backend.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', '-last_entry_id'], name='backend_wal_wallet__e1e882_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
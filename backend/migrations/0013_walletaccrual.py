@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0012_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletAccrual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('wallet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='accrual', to='backend.wallet')),
+            ],
+        ),
+    ]
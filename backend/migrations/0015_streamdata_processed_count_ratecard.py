@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_processed_count(apps, schema_editor):
+    """
+    Attribute each track's processed_streams to its non-fraud rows in id
+    order, so only streams that were never paid are priced again.
+    """
+    Track = apps.get_model('backend', 'Track')
+    StreamData = apps.get_model('backend', 'StreamData')
+    # Fully distributed tracks: every row is processed
+    StreamData.objects.filter(
+        fraud_flag=False, track__processed_streams__gte=F('track__total_valid_streams'), track__processed_streams__gt=0,
+    ).update(processed_count=F('stream_count'))
+
+    partial = Track.objects.filter(processed_streams__gt=0, processed_streams__lt=F('total_valid_streams'))
+    for track_id, remaining in partial.values_list('id', 'processed_streams').iterator():
+        rows = []
+        for row in StreamData.objects.filter(track_id=track_id, fraud_flag=False).order_by('id').only('id', 'stream_count'):
+            if remaining <= 0:
+                break
+            row.processed_count = min(row.stream_count, remaining)
+            remaining -= row.processed_count
+            rows.append(row)
+        StreamData.objects.bulk_update(rows, ['processed_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0014_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='streamdata',
+            name='processed_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_processed_count, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='RateCard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('platform', models.CharField(blank=True, default='', max_length=100)),
+                ('effective_from', models.DateField()),
+                ('effective_to', models.DateField(blank=True, null=True)),
+                ('genre', models.CharField(blank=True, max_length=50, null=True)),
+                ('rate_per_stream', models.DecimalField(decimal_places=6, max_digits=8)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('track', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rate_cards', to='backend.track')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['platform', 'effective_from'], name='backend_rat_platfor_8812e7_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('effective_to__isnull', True), ('effective_to__gte', models.F('effective_from')), _connector='OR'), name='rate_card_valid_period'), models.CheckConstraint(condition=models.Q(('rate_per_stream__gte', 0)), name='rate_card_rate_non_negative')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0015_streamdata_processed_count_ratecard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='distribution_pending_since',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
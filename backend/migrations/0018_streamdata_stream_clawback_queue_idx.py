@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0017_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='streamdata',
+            index=models.Index(condition=models.Q(('fraud_flag', True), ('processed_count__gt', 0)), fields=['track'], name='stream_clawback_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def backfill_shares(apps, schema_editor):
+    """
+    Rebuild the shares of existing royalties from their ledger entries:
+    credit/reversal entries carry the gross share, fee entries the negated
+    platform fee. Royalties distributed before the ledger keep no rows and
+    fall back to the split table.
+    """
+    LedgerEntry = apps.get_model('backend', 'LedgerEntry')
+    RoyaltyShare = apps.get_model('backend', 'RoyaltyShare')
+    totals = (
+        LedgerEntry.objects.filter(royalty__isnull=False, entry_type__in=['credit', 'reversal', 'fee'])
+        .values('royalty_id', 'wallet__user_id')
+        .annotate(gross=Sum('amount', filter=Q(entry_type__in=['credit', 'reversal'])),
+                  fee=Sum('amount', filter=Q(entry_type='fee')))
+        .order_by('royalty_id', 'wallet__user_id')
+    )
+    batch = []
+    for row in totals.iterator():
+        gross, fee = row['gross'] or 0, -(row['fee'] or 0)
+        batch.append(RoyaltyShare(royalty_id=row['royalty_id'], user_id=row['wallet__user_id'],
+                                  gross=gross, fee=fee, net=gross - fee))
+        if len(batch) >= 1000:
+            RoyaltyShare.objects.bulk_create(batch)
+            batch = []
+    RoyaltyShare.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0018_streamdata_stream_clawback_queue_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoyaltyShare',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gross', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('fee', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('net', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('royalty', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shares', to='backend.royalty')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='royalty_shares', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('royalty', 'user'), name='royalty_share_unique_user')],
+            },
+        ),
+        migrations.RunPython(backfill_shares, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0019_royaltyshare'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SplitGroupMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('percentage', models.FloatField()),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='split_members', to=settings.AUTH_USER_MODEL)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='split_groups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(('percentage__gte', 0), ('percentage__lte', 100)), name='group_member_percentage_between_0_100'), models.CheckConstraint(condition=models.Q(('group', models.F('member')), _negated=True), name='group_member_not_self')],
+                'unique_together': {('group', 'member')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0021_walletbalanceshard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackStreamCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('streams', models.BigIntegerField(default=0)),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stream_counter_shards', to='backend.track')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('track', 'shard'), name='track_stream_counter_shard_unique')],
+            },
+        ),
+    ]
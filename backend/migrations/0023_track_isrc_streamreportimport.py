@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0022_trackstreamcountershard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='isrc',
+            field=models.CharField(blank=True, max_length=12, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='StreamReportImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='stream_reports/')),
+                ('platform', models.CharField(blank=True, default='', max_length=100)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('rows_read', models.BigIntegerField(default=0)),
+                ('rows_imported', models.BigIntegerField(default=0)),
+                ('streams_imported', models.BigIntegerField(default=0)),
+                ('error_count', models.BigIntegerField(default=0)),
+                ('chunk_errors', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('uploaded_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stream_report_imports', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
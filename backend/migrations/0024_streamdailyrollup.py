@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0023_track_isrc_streamreportimport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StreamDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('platform', models.CharField(blank=True, default='', max_length=100)),
+                ('date', models.DateField()),
+                ('valid_streams', models.BigIntegerField(default=0)),
+                ('fraud_streams', models.BigIntegerField(default=0)),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='backend.track')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['track', 'date'], name='backend_str_track_i_57d6bd_idx'), models.Index(fields=['date'], name='backend_str_date_93b69d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('track', 'platform', 'date'), name='stream_daily_rollup_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,120 @@
+import re
+from datetime import date
+
+from django.db import migrations
+
+TABLE = 'backend_streamdata'
+LEGACY = 'backend_streamdata_legacy'
+MONTHS_AHEAD = 3
+
+
+def _month_after(day, months=1):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_stream_data(apps, schema_editor):
+    """
+    Turn backend_streamdata into a table partitioned by range of
+    date_recorded (PostgreSQL only; other databases keep the plain table).
+
+    The existing table is not rewritten: it is renamed to
+    backend_streamdata_legacy and attached as the partition of every day up
+    to the end of the current month (or of its newest row). Monthly
+    partitions follow for the next MONTHS_AHEAD months, and a DEFAULT
+    partition takes rows outside every range. From then on
+    `manage.py maintain_stream_partitions` creates and detaches partitions.
+
+    A partitioned table's primary key must contain the partition key, so it
+    becomes (id, date_recorded); ids keep coming from one sequence and stay
+    unique.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+        if cursor.fetchone():
+            return
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+
+        # Next id: past both the sequence and the highest row
+        cursor.execute(f"SELECT pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0), MAX(date_recorded) FROM {TABLE}",
+                       [TABLE])
+        sequence, max_id, newest = cursor.fetchone()
+        next_id = max_id + 1
+        if sequence:
+            cursor.execute(f"SELECT last_value, is_called FROM {sequence}")
+            last_value, is_called = cursor.fetchone()
+            next_id = max(next_id, last_value + 1 if is_called else last_value)
+        legacy_upper = _month_after(max(date.today(), newest or date.today()))
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY}")
+        cursor.execute(
+            "SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid), i.indisprimary "
+            "FROM pg_index i WHERE i.indrelid = %s::regclass", [LEGACY]
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'", [LEGACY]
+        )
+        foreign_keys = cursor.fetchall()
+
+        # The partitions get their rows' ids from the parent's sequence
+        cursor.execute("SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+                       [LEGACY])
+        if cursor.fetchone()[0]:
+            cursor.execute(f"ALTER TABLE {LEGACY} ALTER COLUMN id DROP IDENTITY")
+        else:
+            cursor.execute(f"ALTER TABLE {LEGACY} ALTER COLUMN id DROP DEFAULT")
+            if sequence:
+                cursor.execute(f"DROP SEQUENCE {sequence}")
+
+        # Index names are global: the parent takes over the originals
+        for name, _, primary in indexes:
+            if primary:
+                cursor.execute(f"ALTER TABLE {LEGACY} DROP CONSTRAINT {name}")
+            else:
+                cursor.execute(f"ALTER INDEX {name} RENAME TO {name[:56]}_legacy")
+
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {LEGACY} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            "PARTITION BY RANGE (date_recorded)"
+        )
+        cursor.execute(f"CREATE SEQUENCE {TABLE}_id_seq START WITH {next_id} OWNED BY NONE")
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+        cursor.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, date_recorded)")
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+        for _, definition, primary in indexes:
+            if not primary:
+                cursor.execute(re.sub(r' ON (ONLY )?\S+ USING ', f' ON {TABLE} USING ', definition, count=1))
+
+        # Matching indexes and foreign keys of the old table are attached, not rebuilt
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {LEGACY} FOR VALUES FROM (MINVALUE) TO (%s)", [legacy_upper]
+        )
+        start = legacy_upper
+        for _ in range(MONTHS_AHEAD):
+            end = _month_after(start)
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_p{start:%Y%m} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+            start = end
+        cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0024_streamdailyrollup'),
+    ]
+
+    operations = [
+        # The partitioned table behaves like the plain one for Django, so
+        # unapplying leaves it partitioned
+        migrations.RunPython(partition_stream_data, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:12
+
+from django.db import migrations, models
+
+
+def check_no_duplicates(apps, schema_editor):
+    """The constraint can't be added over duplicate rows: they are merged by a command first."""
+    StreamData = apps.get_model('backend', 'StreamData')
+    duplicates = (
+        StreamData.objects.order_by()
+        .values('track', 'platform', 'date_recorded', 'fraud_flag')
+        .annotate(rows=models.Count('id'))
+        .filter(rows__gt=1)
+    )
+    if duplicates.exists():
+        raise RuntimeError(
+            "StreamData has several rows per (track, platform, date_recorded, fraud_flag); "
+            "run `python manage.py compact_stream_data` before this migration."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0025_partition_streamdata'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_no_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='streamdata',
+            constraint=models.UniqueConstraint(fields=('track', 'platform', 'date_recorded', 'fraud_flag'), name='stream_data_unique_day', nulls_distinct=False),
+        ),
+    ]
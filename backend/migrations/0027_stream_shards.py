@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0026_streamdata_unique_day'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='streamdailyrollup',
+            name='stream_daily_rollup_unique',
+        ),
+        migrations.RemoveConstraint(
+            model_name='streamdata',
+            name='stream_data_unique_day',
+        ),
+        migrations.AddField(
+            model_name='streamdailyrollup',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='streamdata',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='streamdailyrollup',
+            constraint=models.UniqueConstraint(fields=('track', 'platform', 'date', 'shard'), name='stream_daily_rollup_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='streamdata',
+            constraint=models.UniqueConstraint(fields=('track', 'platform', 'date_recorded', 'fraud_flag', 'shard'), name='stream_data_unique_day', nulls_distinct=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0027_stream_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='earning_remainder_microcents',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0028_track_earning_remainder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='streamreportimport',
+            name='checksum',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='streamreportimport',
+            constraint=models.UniqueConstraint(condition=models.Q(models.Q(('checksum', ''), _negated=True), models.Q(('status', 'failed'), _negated=True)), fields=('checksum',), name='stream_report_import_unique_checksum'),
+        ),
+    ]
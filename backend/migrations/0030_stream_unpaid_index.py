@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0029_stream_report_checksum'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='track',
+            name='track_pending_streams_idx',
+        ),
+        migrations.AddIndex(
+            model_name='streamdata',
+            index=models.Index(condition=models.Q(('fraud_flag', False), ('stream_count__gt', models.F('processed_count'))), fields=['track'], name='stream_unpaid_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0030_stream_unpaid_index'),
+    ]
+
+    operations = [
+        # Rows paid so far have no recorded amount: leave them null
+        migrations.AddField(
+            model_name='streamdata',
+            name='paid_microcents',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='streamdata',
+            name='paid_microcents',
+            field=models.BigIntegerField(default=0, editable=False, null=True),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 from rest_framework import serializers
@@ -85,6 +85,8 @@ class Track(models.Model):
     genre = models.CharField(max_length=50, blank=True, null=True)
     release_date = models.DateField(auto_now_add=True)
     nft_id = models.CharField(max_length=255, blank=True, null=True)
+    # International Standard Recording Code, normalized (12 characters, no hyphens); matches DSP report lines
+    isrc = models.CharField(max_length=12, unique=True, blank=True, null=True)
     # Uploaded audio file for the track
     file = models.FileField(upload_to='tracks/', blank=True, null=True)
     owner = models.ForeignKey(UserAccount, on_delete=models.SET_NULL, null=True, related_name="tracks")
@@ -92,51 +94,276 @@ class Track(models.Model):
     payout_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Total amount to distribute to collaborators")
     # Total streams already processed (paid out) -> used to compute delta payouts
     processed_streams = models.BigIntegerField(default=0)
+    # Micro-cents priced but not paid when the processed streams were rounded to cents;
+    # carried into the next distribution (see backend/services/rate_cards.py)
+    earning_remainder_microcents = models.BigIntegerField(default=0, editable=False)
     # Optional per-track rate (USD per stream). If null, use global default.
     rate_per_stream = models.DecimalField(max_digits=8, decimal_places=6, null=True, blank=True)
+    # Running sum of non-fraud StreamData.stream_count, plus any TrackStreamCounterShard rows
+    # not folded in yet (see backend/services/stream_counters.py)
+    total_valid_streams = models.BigIntegerField(default=0, editable=False)
+    # Bumped whenever a split of this track changes -> keys the compiled split-table cache
+    splits_version = models.PositiveIntegerField(default=0, editable=False)
+    # First undistributed increment recorded in coalescing mode (see backend/services/coalescing.py)
+    distribution_pending_since = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.title
 
 class StreamData(models.Model):
+    """
+    On PostgreSQL the table is partitioned by month of date_recorded
+    (migration 0025, `manage.py maintain_stream_partitions`): filter on
+    date_recorded where possible so queries skip partitions, and include
+    date_recorded in any unique constraint. Each (track, platform, day,
+    fraud_flag) has one row that increments are added to, or up to
+    STREAM_COUNTER_SHARDS rows (`shard`) for hot per-request increments (see
+    backend/services/stream_dedup.py).
+    """
     track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name="streams")
     platform = models.CharField(max_length=100, blank=True, null=True)
     stream_count = models.IntegerField(default=0)
     date_recorded = models.DateField()
     fraud_flag = models.BooleanField(default=False)
+    # Streams of this row already priced and paid (see backend/services/rate_cards.py)
+    processed_count = models.IntegerField(default=0, editable=False)
+    # Micro-cents paid for those streams, what a fraud clawback reverses; null
+    # for rows paid before it was recorded (the clawback re-prices those)
+    paid_microcents = models.BigIntegerField(default=0, null=True, editable=False)
+    # Row of the day's key that sharded increments picked; 0 for everything else
+    shard = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
+        constraints = [
+            # A null platform is one platform: increments without one merge too
+            models.UniqueConstraint(
+                fields=['track', 'platform', 'date_recorded', 'fraud_flag', 'shard'],
+                name='stream_data_unique_day',
+                nulls_distinct=False,
+            ),
+        ]
         indexes = [
             models.Index(fields=['track']),
             models.Index(fields=['date_recorded']),
             models.Index(fields=['platform']),
             models.Index(fields=['fraud_flag']),
+            # Fraud clawback queue: flagged rows whose streams were already paid
+            models.Index(
+                fields=['track'],
+                condition=models.Q(fraud_flag=True, processed_count__gt=0),
+                name='stream_clawback_queue_idx',
+            ),
+            # Distribution queue: non-fraud rows with streams not paid yet
+            models.Index(
+                fields=['track'],
+                condition=models.Q(fraud_flag=False, stream_count__gt=models.F('processed_count')),
+                name='stream_unpaid_idx',
+            ),
         ]
 
+    def save(self, *args, **kwargs):
+        # A row given the key of another row (e.g. flagged as fraud on a day that already has
+        # a fraud row) is merged into that row (see backend/services/stream_dedup.py)
+        from backend.services.stream_dedup import KEY_FIELDS, merge_into_existing_row
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not KEY_FIELDS & set(update_fields):
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not merge_into_existing_row(self):
+                super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.track.title} - {self.platform} ({self.stream_count})"
 
+class TrackStreamCounterShard(models.Model):
+    """
+    One of STREAM_COUNTER_SHARDS sub-counters of Track.total_valid_streams.
+    In sharded mode stream deltas are added to a random shard instead of
+    the Track row, so concurrent ingest for one viral track doesn't queue on
+    the track's row lock. Distribution folds a track's shards into
+    total_valid_streams before reading it (see
+    backend/services/stream_counters.py).
+    """
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name="stream_counter_shards")
+    shard = models.PositiveSmallIntegerField()
+    streams = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['track', 'shard'], name='track_stream_counter_shard_unique'),
+        ]
+
+    def __str__(self):
+        return f"Track {self.track_id} shard {self.shard}: {self.streams}"
+
+class StreamDailyRollup(models.Model):
+    """
+    StreamData summed per (track, platform, day). Every StreamData write
+    upserts its delta here, so stream totals and charts read one row per
+    day instead of every raw row (see backend/services/stream_rollups.py).
+    A null StreamData platform is stored as ''. Sharded increments spread a
+    day over several `shard` rows, so readers sum the rows of a day.
+    """
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name="daily_rollups")
+    platform = models.CharField(max_length=100, blank=True, default='')
+    date = models.DateField()
+    valid_streams = models.BigIntegerField(default=0)
+    fraud_streams = models.BigIntegerField(default=0)
+    shard = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['track', 'platform', 'date', 'shard'], name='stream_daily_rollup_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['track', 'date']),
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"Track {self.track_id} {self.platform or '-'} {self.date}: {self.valid_streams}"
+
+class StreamReportImport(models.Model):
+    """
+    A DSP stream report uploaded through the API and imported into StreamData
+    by a background job (see backend/services/stream_import.py). Imports add
+    to StreamData, so a report whose checksum matches a queued or done import
+    is refused.
+    """
+    QUEUED = 'queued'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    file = models.FileField(upload_to='stream_reports/')
+    # Used for reports without a platform column
+    platform = models.CharField(max_length=100, blank=True, default='')
+    # SHA-256 of the uploaded file
+    checksum = models.CharField(max_length=64, blank=True, default='', editable=False)
+    uploaded_by = models.ForeignKey(UserAccount, on_delete=models.SET_NULL, null=True,
+                                    related_name="stream_report_imports")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    rows_read = models.BigIntegerField(default=0)
+    rows_imported = models.BigIntegerField(default=0)
+    streams_imported = models.BigIntegerField(default=0)
+    error_count = models.BigIntegerField(default=0)
+    # [{"chunk", "first_line", "rows", "errors": [[line, message], ...]}] for chunks with errors
+    chunk_errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            # A failed import can be uploaded again
+            models.UniqueConstraint(
+                fields=['checksum'],
+                condition=~models.Q(checksum='') & ~models.Q(status='failed'),
+                name='stream_report_import_unique_checksum',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Stream report {self.id} ({self.status})"
+
+class RateCard(models.Model):
+    """
+    USD paid per stream by a platform between effective_from and effective_to
+    (inclusive; open-ended when null). A blank platform applies to every
+    platform; a track or genre narrows the card to that track or genre.
+    The most specific matching card wins (track, then genre, then
+    catalogue-wide; a named platform before a blank one), and among cards
+    of the same scope the latest effective_from wins.
+    """
+    platform = models.CharField(max_length=100, blank=True, default='')
+    effective_from = models.DateField()
+    effective_to = models.DateField(blank=True, null=True)
+    genre = models.CharField(max_length=50, blank=True, null=True)
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, null=True, blank=True, related_name="rate_cards")
+    rate_per_stream = models.DecimalField(max_digits=8, decimal_places=6)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['platform', 'effective_from']),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(effective_to__isnull=True) | models.Q(effective_to__gte=models.F('effective_from')),
+                name='rate_card_valid_period'
+            ),
+            models.CheckConstraint(check=models.Q(rate_per_stream__gte=0), name='rate_card_rate_non_negative'),
+        ]
+
+    def __str__(self):
+        scope = f"track {self.track_id}" if self.track_id else (self.genre or "all")
+        return f"{self.platform or '*'} {scope} {self.effective_from}..{self.effective_to or ''}: {self.rate_per_stream}"
+
 # =====================================================
 # Royalty & Split
 # =====================================================
+class RoyaltyQuerySet(models.QuerySet):
+    def with_shares(self):
+        """Load every royalty's RoyaltyShare rows (and their users) in one extra query."""
+        return self.prefetch_related(
+            models.Prefetch('shares', queryset=RoyaltyShare.objects.select_related('user').order_by('id'))
+        )
+
+
 class Royalty(models.Model):
     track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name="royalties")
     total_earning = models.DecimalField(max_digits=12, decimal_places=2)
     distribution_date = models.DateField(blank=True, null=True)
 
+    objects = RoyaltyQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.track.title} - {self.total_earning}"
 
     def get_user_shares(self):
-        """Return a dict mapping user email to their royalty share amount.
-        The share is calculated as total_earning * (split.percentage / 100).
+        """Return a dict mapping user email to their gross royalty share amount.
+        Read from the RoyaltyShare rows written with the distribution (use
+        Royalty.objects.with_shares() to load them for many royalties at once).
+        Royalties without share rows fall back to
+        total_earning * (basis_points / 10000) of the track's cached split table.
         """
+        from .services.split_table import get_split_table
+
+        stored = self.shares.all()
+        if stored:
+            return {share.user.email: float(share.gross) for share in stored}
+
         shares = {}
-        for split in self.track.splits.all():
-            share_amount = float(self.total_earning) * (split.percentage / 100.0)
-            shares[split.user.email] = round(share_amount, 2)
+        for entry in get_split_table(self.track):
+            share_amount = float(self.total_earning) * (entry.basis_points / 10000.0)
+            shares[entry.user_email] = round(share_amount, 2)
         return shares
 
+class RoyaltyShare(models.Model):
+    """
+    One collaborator's part of a Royalty as it was distributed (negative for
+    clawbacks): the gross share, the platform fee taken from it and the net
+    amount credited. Written together with the ledger entries, so the split
+    shown for a royalty never changes when the track's splits do.
+    """
+    royalty = models.ForeignKey(Royalty, on_delete=models.CASCADE, related_name="shares")
+    user = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name="royalty_shares")
+    gross = models.DecimalField(max_digits=12, decimal_places=2)
+    fee = models.DecimalField(max_digits=12, decimal_places=2)
+    net = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['royalty', 'user'], name='royalty_share_unique_user'),
+        ]
+
+    def __str__(self):
+        return f"Royalty {self.royalty_id} - user {self.user_id}: {self.gross}"
+
 class Split(models.Model):
     track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name="splits")
     user = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name="splits")
@@ -152,6 +379,28 @@ class Split(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.track.title} ({self.percentage}%)"
 
+class SplitGroupMember(models.Model):
+    """
+    Member of a group collaborator (a band, label or publisher account).
+    A split held by a group is divided further between its members by
+    these percentages (members can be groups themselves); whatever the
+    members' percentages leave uncovered stays with the group.
+    """
+    group = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name="split_members")
+    member = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name="split_groups")
+    percentage = models.FloatField()
+
+    class Meta:
+        unique_together = ("group", "member")
+        constraints = [
+            models.CheckConstraint(check=models.Q(percentage__gte=0) & models.Q(percentage__lte=100),
+                                   name="group_member_percentage_between_0_100"),
+            models.CheckConstraint(check=~models.Q(group=models.F('member')), name="group_member_not_self"),
+        ]
+
+    def __str__(self):
+        return f"{self.member.email} in {self.group.email} ({self.percentage}%)"
+
 # =====================================================
 # Wallet & Payout
 # =====================================================
@@ -164,6 +413,39 @@ class Wallet(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.balance}"
 
+    @property
+    def effective_balance(self):
+        """
+        balance plus the credits still held in balance shards (see
+        WalletBalanceShard). Uses the `shard_balance` annotation of
+        backend.services.wallets.with_shard_balance() when present.
+        """
+        shards = getattr(self, 'shard_balance', None)
+        if shards is None:
+            shards = self.balance_shards.aggregate(total=models.Sum('amount'))['total'] or 0
+        return self.balance + shards
+
+class WalletBalanceShard(models.Model):
+    """
+    One of WALLET_BALANCE_SHARDS sub-counters of a wallet's balance. In
+    sharded mode credits are added to a random shard instead of the Wallet
+    row, so concurrent distributions to one hot wallet don't queue on its
+    row lock; `manage.py compact_wallet_shards` folds the shards back into
+    Wallet.balance.
+    """
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="balance_shards")
+    shard = models.PositiveSmallIntegerField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'shard'], name='wallet_balance_shard_unique'),
+        ]
+
+    def __str__(self):
+        return f"Wallet {self.wallet_id} shard {self.shard}: {self.amount}"
+
 class Payout(models.Model):
     MIN_PAYOUT_AMOUNT = Decimal('1.0')
     MAX_PAYOUT_AMOUNT = Decimal('999999.99')
@@ -185,6 +467,144 @@ class Payout(models.Model):
     def __str__(self):
         return f"Payout {self.id} - {self.amount} ({self.status})"
 
+class WalletAccrual(models.Model):
+    """
+    Net royalty shares credited to a wallet that have not been turned into a
+    Payout yet. One row per wallet; a Payout is emitted once the buffer
+    reaches Payout.MIN_PAYOUT_AMOUNT (see backend/services/accruals.py).
+    """
+    wallet = models.OneToOneField(Wallet, on_delete=models.CASCADE, related_name="accrual")
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Wallet {self.wallet_id} accrued {self.amount}"
+
+# =====================================================
+# Ledger (append-only wallet history)
+# =====================================================
+class LedgerEntry(models.Model):
+    """
+    One signed movement of a wallet's money. Rows are only ever inserted:
+    a wallet's balance is the sum of its entries (see WalletSnapshot).
+    """
+    OPENING = 'opening'
+    CREDIT = 'credit'
+    FEE = 'fee'
+    WITHDRAWAL = 'withdrawal'
+    REVERSAL = 'reversal'
+    ENTRY_TYPES = [
+        (OPENING, 'Opening balance'),
+        (CREDIT, 'Royalty credit'),
+        (FEE, 'Platform fee'),
+        (WITHDRAWAL, 'Withdrawal'),
+        (REVERSAL, 'Reversal'),
+    ]
+
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="ledger_entries")
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    # Credits are positive; fees, withdrawals and reversals are negative
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    royalty = models.ForeignKey(Royalty, on_delete=models.SET_NULL, null=True, blank=True, related_name="ledger_entries")
+    payout = models.ForeignKey(Payout, on_delete=models.SET_NULL, null=True, blank=True, related_name="ledger_entries")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'id']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.entry_type} {self.amount} (wallet {self.wallet_id})"
+
+
+class WalletSnapshot(models.Model):
+    """Balance of a wallet covering every ledger entry up to last_entry_id."""
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name="snapshots")
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    last_entry_id = models.BigIntegerField()
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', '-last_entry_id']),
+        ]
+
+    def __str__(self):
+        return f"Snapshot {self.wallet_id} @ {self.last_entry_id}: {self.balance}"
+
+# =====================================================
+# Idempotency keys
+# =====================================================
+class IdempotencyKey(models.Model):
+    """
+    Stored result of a request sent with an Idempotency-Key header, replayed
+    for repeats of the same key until expires_at (see api/idempotency.py).
+    """
+    user = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_unique_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.scope})"
+
+# =====================================================
+# Background jobs (see backend/services/jobs.py)
+# =====================================================
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    # At most one queued/running job per dedupe key
+    dedupe_key = models.CharField(max_length=255, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    # Visibility timeout: a running job whose worker did not finish by then is claimed again
+    locked_until = models.DateTimeField(blank=True, null=True)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupe_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='job_active_dedupe_key_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status}, attempt {self.attempts})"
+
 # =====================================================
 # SIEM Event
 # =====================================================
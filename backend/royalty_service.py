@@ -2,111 +2,239 @@ from decimal import Decimal
 from django.utils import timezone
 
 from django.db import transaction
-from django.db.models import Sum
+from django.db.models import BigIntegerField, Case, Exists, F, OuterRef, Value, When
+from django.db.models.functions import Greatest
 
-from .models import Royalty, Split, Wallet, Payout, PayoutStatus, StreamData, Track
+from .models import LedgerEntry, Royalty, RoyaltyShare, PayoutStatus, StreamData, Track
+from .services.accruals import accrue_payouts
+from .services.ledger import post_ledger_entries
+from .services.rate_cards import mark_streams_processed, price_new_streams, price_paid_rows, unpaid_stream_rows
+from .services.royalty_math import cents_to_dollars, dollars_to_cents, split_amount, split_amount_batch
+from .services.split_table import get_split_table, get_split_tables, invalidate_track
+from .services.stream_counters import fold_locked_stream_shards
+from .services.wallets import wallet_ids_for_users
 
 ROYALTY_RATE_PER_MINUTE = Decimal("10.0")      # legacy: $10 per minute (unused for streams)
 # Default rate per stream (USD)
 RATE_PER_STREAM = Decimal("0.003")
 PLATFORM_FEE_PERCENT = Decimal("2.0")          # 2% platform fee
+PLATFORM_FEE_BPS = int(PLATFORM_FEE_PERCENT * 100)
+# Number of tracks written per transaction by distribute_royalties_bulk
+BULK_BATCH_SIZE = 500
 
 
-def distribute_royalty_for_track(track):
+def _shares(total_earning, split_table):
     """
-    Uses track.payout_amount as the total earning to distribute.
-    Split-lərə görə user-lərə bölür,
-    Wallet balanslarını artırır,
-    hər user üçün Payout (status=Pending) yaradır,
-    eyni zamanda Royalty qeydini yaradır.
+    (gross, fee, net) share of every split-table entry, in USD.
+    Largest-remainder rounding keeps the shares summing to the distributed amount.
     """
-    # Use uploader-defined payout amount
-    total_earning = Decimal(str(track.payout_amount or 0))
-    
-    if total_earning <= 0:
-        raise ValueError(f"Track payout_amount must be > 0, got {total_earning}")
-
-    # Royalty qeydini yaradaq (audit üçün)
-    royalty = Royalty.objects.create(
-        track=track,
-        total_earning=total_earning,
-        distribution_date=timezone.now().date()
+    gross, fee, net = split_amount(
+        dollars_to_cents(total_earning), [entry.basis_points for entry in split_table], PLATFORM_FEE_BPS
     )
+    return [tuple(cents_to_dollars(cents) for cents in share) for share in zip(gross, fee, net)]
 
-    # Status
-    pending_status, _ = PayoutStatus.objects.get_or_create(status_name="Pending")
 
-    payouts_created = []
+def _share_ledger_entries(wallet_id, gross, fee, royalty_id, payout_id):
+    """Credit of the gross share and debit of the platform fee for one share."""
+    return [
+        LedgerEntry(wallet_id=wallet_id, entry_type=LedgerEntry.CREDIT, amount=gross,
+                    royalty_id=royalty_id, payout_id=payout_id),
+        LedgerEntry(wallet_id=wallet_id, entry_type=LedgerEntry.FEE, amount=-fee,
+                    royalty_id=royalty_id, payout_id=payout_id),
+    ]
 
-    for split in track.splits.all():
-        # Brüt pay
-        gross_share = (total_earning * Decimal(str(split.percentage))) / Decimal("100")
 
-        # Platform fee çıxıldıqdan sonra
-        net_share = gross_share * (Decimal("100") - PLATFORM_FEE_PERCENT) / Decimal("100")
+def _reversal_ledger_entries(wallet_id, gross, fee, royalty_id, payout_id):
+    """Reversal of a clawed-back gross share and refund of its platform fee (gross, fee <= 0)."""
+    return [
+        LedgerEntry(wallet_id=wallet_id, entry_type=LedgerEntry.REVERSAL, amount=gross,
+                    royalty_id=royalty_id, payout_id=payout_id),
+        LedgerEntry(wallet_id=wallet_id, entry_type=LedgerEntry.FEE, amount=-fee,
+                    royalty_id=royalty_id, payout_id=payout_id),
+    ]
 
-        # Wallet tap / yarat
-        wallet, _ = Wallet.objects.get_or_create(user=split.user)
-        wallet.balance += net_share
-        wallet.last_updated = timezone.now()
-        wallet.save()
-
-        # Pending payout yarat
-        payout = Payout.objects.create(
-            wallet=wallet,
-            amount=net_share,
-            status=pending_status,
-            txn_date=timezone.now()
+
+def _post_shares(shares, status, ledger_entries_for=_share_ledger_entries):
+    """
+    Credit (user_id, wallet_id, royalty_id, gross, fee, net) shares. Net
+    amounts go into the wallets' accrual buffers, which emit a payout once
+    they reach the payout minimum (negative shares reduce the buffer); gross
+    and fee are posted to the ledger, which also credits the wallets. The
+    shares themselves are stored as RoyaltyShare rows for the royalty API.
+    Returns the emitted payouts.
+    """
+    payouts = accrue_payouts([(wallet_id, net) for _, wallet_id, _, _, _, net in shares], status)
+    ledger_entries = []
+    for _, wallet_id, royalty_id, gross, fee, _ in shares:
+        payout = payouts.get(wallet_id)
+        ledger_entries += ledger_entries_for(wallet_id, gross, fee, royalty_id, payout.id if payout else None)
+    post_ledger_entries(ledger_entries)
+    RoyaltyShare.objects.bulk_create([
+        RoyaltyShare(royalty_id=royalty_id, user_id=user_id, gross=gross, fee=fee, net=net)
+        for user_id, _, royalty_id, gross, fee, net in shares
+    ])
+    return list(payouts.values())
+
+
+def _batch_royalty_shares(amounts):
+    """
+    Create one Royalty per (track, earning_cents) pair (negative for
+    clawbacks) with one INSERT and split every amount over its track's
+    split table with one kernel call. Returns (royalties, shares) with
+    shares as (user_id, wallet_id, royalty_id, gross, fee, net).
+    """
+    split_tables = get_split_tables([track for track, _ in amounts])
+    wallet_ids = _wallet_ids_for_tables(split_tables)
+
+    entries = [
+        (index, entry)
+        for index, (track, _) in enumerate(amounts)
+        for entry in split_tables[track.id]
+    ]
+    gross_cents, fee_cents, net_cents = split_amount_batch(
+        [cents for _, cents in amounts],
+        [index for index, _ in entries],
+        [entry.basis_points for _, entry in entries],
+        PLATFORM_FEE_BPS,
+    )
+
+    today = timezone.now().date()
+    royalties = Royalty.objects.bulk_create([
+        Royalty(track_id=track.id, total_earning=cents_to_dollars(cents), distribution_date=today)
+        for track, cents in amounts
+    ])
+    shares = [
+        (entry.user_id, wallet_ids[entry.user_id], royalties[index].id,
+         cents_to_dollars(gross), cents_to_dollars(fee), cents_to_dollars(net))
+        for (index, entry), gross, fee, net in zip(
+            entries, gross_cents.tolist(), fee_cents.tolist(), net_cents.tolist()
         )
-        payouts_created.append(payout)
+    ]
+    return royalties, shares
 
-    return {
-        "royalty_id": royalty.id,
-        "track_id": track.id,
-        "total_earning": total_earning,
-        "payouts_count": len(payouts_created),
-    }
 
+def _track_shares(royalty, split_table, wallet_ids):
+    """(user_id, wallet_id, royalty_id, gross, fee, net) of every split-table entry for one royalty."""
+    # Platform fee çıxıldıqdan sonra net pay
+    return [
+        (entry.user_id, wallet_ids[entry.user_id], royalty.id, gross, fee, net)
+        for entry, (gross, fee, net) in zip(split_table, _shares(royalty.total_earning, split_table))
+    ]
 
-def distribute_royalty_from_streams(track, rate_per_stream: Decimal = None):
+
+def _wallet_ids_for_tables(tables):
     """
-    Distribute royalties for the new (unprocessed) streams of a track.
+    Map user id -> wallet id for every entry of the given split tables
+    ({track_id: table}). Users that had no wallet when their table was
+    compiled get one here, and that track's table is rebuilt on next use.
+    """
+    wallet_ids = {}
+    missing = set()
+    for track_id, table in tables.items():
+        for entry in table:
+            if entry.wallet_id is None:
+                missing.add(entry.user_id)
+                invalidate_track(track_id)
+            else:
+                wallet_ids[entry.user_id] = entry.wallet_id
+    if missing:
+        wallet_ids.update(wallet_ids_for_users(missing))
+    return wallet_ids
 
-    This function computes the delta between total stream_count (sum of StreamData)
-    and `track.processed_streams`, converts the delta to USD using `rate_per_stream`
-    (or default RATE_PER_STREAM), then distributes the earnings across splits.
 
-    The function updates `track.processed_streams` to avoid double-paying streams.
+def distribute_royalty_for_track(track):
+    """
+    Uses track.payout_amount as the total earning to distribute.
+    Split-lərə görə user-lərə bölür,
+    Wallet balanslarını artırır,
+    net payları accrual buffer-ə yığır (buffer minimuma çatanda Pending Payout yaranır),
+    eyni zamanda Royalty qeydini yaradır.
     """
-    rate = rate_per_stream or RATE_PER_STREAM
+    # The Royalty and its shares are written together or not at all
+    with transaction.atomic():
+        # Use uploader-defined payout amount
+        total_earning = Decimal(str(track.payout_amount or 0))
 
-    # Sum total streams (exclude fraud flagged rows)
-    agg = StreamData.objects.filter(track=track, fraud_flag=False).aggregate(total=Sum('stream_count'))
-    total_streams = int(agg.get('total') or 0)
+        if total_earning <= 0:
+            raise ValueError(f"Track payout_amount must be > 0, got {total_earning}")
 
-    processed = int(track.processed_streams or 0)
-    delta_streams = total_streams - processed
-    if delta_streams <= 0:
-        return {
-            "royalty_id": None,
-            "track_id": track.id,
-            "total_earning": Decimal("0.00"),
-            "payouts_count": 0,
-            "message": "No new streams to distribute",
-        }
+        # Royalty qeydini yaradaq (audit üçün)
+        royalty = Royalty.objects.create(
+            track=track,
+            total_earning=total_earning,
+            distribution_date=timezone.now().date()
+        )
+
+        # Status
+        pending_status, _ = PayoutStatus.objects.get_or_create(status_name="Pending")
+
+        split_table = get_split_table(track)
+        # Wallet tap / yarat
+        wallet_ids = _wallet_ids_for_tables({track.id: split_table})
 
-    total_earning = (Decimal(delta_streams) * Decimal(str(rate))).quantize(Decimal('0.01'))
+        payouts_created = _post_shares(_track_shares(royalty, split_table, wallet_ids), pending_status)
 
-    if total_earning <= Decimal("0.00"):
         return {
-            "royalty_id": None,
+            "royalty_id": royalty.id,
             "track_id": track.id,
-            "total_earning": Decimal("0.00"),
-            "payouts_count": 0,
-            "message": "No earnings computed from streams",
+            "total_earning": total_earning,
+            "payouts_count": len(payouts_created),
         }
 
+
+def distribute_royalty_from_streams(track, rate_per_stream: Decimal = None):
+    """
+    Distribute royalties for the new (unprocessed) streams of a track.
+
+    This function prices the unpaid streams of the track's non-fraud
+    StreamData rows (stream_count - processed_count, see
+    unpaid_stream_rows() in backend/services/rate_cards.py: the
+    matching rate card for the row's platform and date, else the track's
+    rate_per_stream, else RATE_PER_STREAM; a `rate_per_stream` argument
+    overrides all of them), then distributes the earnings across splits.
+
+    The function updates `track.processed_streams` and the rows'
+    processed_count to avoid double-paying streams, also when the new
+    streams are worth less than a cent: their value is carried to the next
+    distribution in `earning_remainder_microcents`.
+    The track row is locked (SELECT ... FOR UPDATE) while the rows are read and
+    paid, so concurrent calls for the same track pay every stream exactly once:
+    the second caller waits and then sees no new streams.
+    """
     with transaction.atomic():
+        locked = (
+            Track.objects.select_for_update()
+            .only('id', 'processed_streams', 'genre', 'rate_per_stream', 'earning_remainder_microcents')
+            .get(pk=track.pk)
+        )
+        # Streams counted in sharded mode are folded into total_valid_streams under the lock
+        fold_locked_stream_shards([locked.id])
+        track.processed_streams = locked.processed_streams
+
+        # Unpaid rows decide, not total_valid_streams vs processed_streams: a paid row
+        # flagged as fraud lowers the total until the clawback runs
+        priced = price_new_streams([locked], RATE_PER_STREAM, rate_per_stream).get(track.id)
+        if priced is None:
+            return {
+                "royalty_id": None,
+                "track_id": track.id,
+                "total_earning": Decimal("0.00"),
+                "payouts_count": 0,
+                "message": "No new streams to distribute",
+            }
+        total_earning = cents_to_dollars(priced.earning_cents)
+
+        if total_earning <= Decimal("0.00"):
+            _mark_priced_streams([(locked, priced)])
+            track.processed_streams = locked.processed_streams + priced.streams
+            return {
+                "royalty_id": None,
+                "track_id": track.id,
+                "total_earning": Decimal("0.00"),
+                "payouts_count": 0,
+                "message": "No earnings computed from streams",
+            }
+
         royalty = Royalty.objects.create(
             track=track,
             total_earning=total_earning,
@@ -115,29 +243,15 @@ def distribute_royalty_from_streams(track, rate_per_stream: Decimal = None):
 
         pending_status, _ = PayoutStatus.objects.get_or_create(status_name="Pending")
 
-        payouts_created = []
+        split_table = get_split_table(track)
+        wallet_ids = _wallet_ids_for_tables({track.id: split_table})
 
-        for split in track.splits.all():
-            gross_share = (total_earning * Decimal(str(split.percentage))) / Decimal("100")
-            net_share = (gross_share * (Decimal("100") - PLATFORM_FEE_PERCENT) / Decimal("100")).quantize(Decimal('0.01'))
-
-            wallet, _ = Wallet.objects.get_or_create(user=split.user)
-            # Ensure wallet.balance is Decimal
-            wallet.balance = (wallet.balance or Decimal('0.00')) + net_share
-            wallet.last_updated = timezone.now()
-            wallet.save()
-
-            payout = Payout.objects.create(
-                wallet=wallet,
-                amount=net_share,
-                status=pending_status,
-                txn_date=timezone.now()
-            )
-            payouts_created.append(payout)
+        payouts_created = _post_shares(_track_shares(royalty, split_table, wallet_ids), pending_status)
 
         # Mark processed streams to avoid double-pay
-        track.processed_streams = total_streams
-        track.save(update_fields=['processed_streams'])
+        _mark_priced_streams([(locked, priced)])
+        track.processed_streams = locked.processed_streams + priced.streams
+        track.distribution_pending_since = None
 
     return {
         "royalty_id": royalty.id,
@@ -145,3 +259,258 @@ def distribute_royalty_from_streams(track, rate_per_stream: Decimal = None):
         "total_earning": total_earning,
         "payouts_count": len(payouts_created),
     }
+
+
+def pending_tracks():
+    """
+    Tracks with earnings that have not been distributed yet: tracks with
+    unpaid_stream_rows() (served by a partial index).
+    """
+    return Track.objects.filter(Exists(unpaid_stream_rows().filter(track=OuterRef('pk'))))
+
+
+def distribute_royalties_bulk(track_ids, rate_per_stream: Decimal = None, batch_size: int = BULK_BATCH_SIZE):
+    """
+    Distribute royalties for the new streams of many tracks at once.
+
+    Same money rules as `distribute_royalty_from_streams`, but every batch of
+    `batch_size` tracks is handled in one transaction with a fixed number of
+    queries: one for the tracks and their stream totals, one for their splits, bulk
+    INSERTs for Royalty and Payout rows and set-based UPDATEs for wallet
+    balances, accrual buffers and `processed_streams`.
+
+    Tracks are locked with SELECT ... FOR UPDATE SKIP LOCKED: a track that is
+    being distributed by another transaction is skipped (not waited for) and
+    stays in `pending_tracks()` if it still has new streams afterwards.
+    """
+    track_ids = sorted(set(track_ids))
+
+    summary = {
+        "tracks_processed": 0,
+        "royalties_created": 0,
+        "payouts_count": 0,
+        "total_earning": Decimal("0.00"),
+    }
+    for start in range(0, len(track_ids), batch_size):
+        batch = _distribute_stream_batch(
+            Track.objects.filter(id__in=track_ids[start:start + batch_size]).order_by('id'), rate_per_stream
+        )
+        for key in summary:
+            summary[key] += batch[key]
+    return summary
+
+
+def distribute_pending_tracks(rate_per_stream: Decimal = None, batch_size: int = BULK_BATCH_SIZE, tracks=None):
+    """
+    Drain `tracks` (default `pending_tracks()`) in id order, claiming
+    `batch_size` tracks per transaction with SELECT ... FOR UPDATE SKIP LOCKED.
+
+    Any number of workers or API processes can call this at the same time:
+    each one skips the tracks another has claimed instead of blocking on
+    them, and every claimed track is re-read under its lock, so no stream is
+    paid twice. Returns the same summary as `distribute_royalties_bulk`.
+    """
+    summary = {
+        "tracks_processed": 0,
+        "royalties_created": 0,
+        "payouts_count": 0,
+        "total_earning": Decimal("0.00"),
+    }
+    for batch in iter_distribution_batches(tracks, rate_per_stream, batch_size):
+        for key in summary:
+            summary[key] += batch[key]
+    return summary
+
+
+def iter_distribution_batches(tracks=None, rate_per_stream: Decimal = None, batch_size: int = BULK_BATCH_SIZE):
+    """
+    Constant-memory distribution pipeline over `tracks` (a Track queryset,
+    default `pending_tracks()`), yielding each batch summary once committed.
+
+    keyset page (id > last id, LIMIT batch_size) -> lock the page, load its
+    splits and new stream rows with one query each -> integer kernel ->
+    bulk writes. Only one page is held in memory at a time, whatever the
+    size of the catalog.
+    """
+    tracks = pending_tracks() if tracks is None else tracks
+    last_id = 0
+    while True:
+        batch = _distribute_stream_batch(
+            tracks.filter(id__gt=last_id).order_by('id')[:batch_size], rate_per_stream
+        )
+        if not batch["tracks_processed"]:
+            return
+        last_id = batch["last_track_id"]
+        yield batch
+
+
+def _distribute_stream_batch(tracks, rate_per_stream):
+    """
+    Lock (skipping rows locked elsewhere) and distribute the tracks of the
+    `tracks` queryset in one transaction.
+    """
+    result = {
+        "tracks_processed": 0,
+        "royalties_created": 0,
+        "payouts_count": 0,
+        "total_earning": Decimal("0.00"),
+        "last_track_id": None,
+    }
+
+    with transaction.atomic():
+        tracks = list(
+            tracks.select_for_update(skip_locked=True)
+            .only('id', 'processed_streams', 'splits_version', 'genre', 'rate_per_stream',
+                  'earning_remainder_microcents')
+        )
+        if not tracks:
+            return result
+        result["tracks_processed"] = len(tracks)
+        result["last_track_id"] = tracks[-1].id
+        fold_locked_stream_shards([track.id for track in tracks])
+
+        # (track, priced streams, earning_cents) for every track with new earnings
+        priced = price_new_streams(tracks, RATE_PER_STREAM, rate_per_stream)
+        earning_tracks = [
+            (track, priced[track.id], priced[track.id].earning_cents)
+            for track in tracks
+            if track.id in priced and priced[track.id].earning_cents > 0
+        ]
+
+        # Every priced track is marked, including those whose streams are worth less than a cent
+        _mark_priced_streams([(track, priced[track.id]) for track in tracks if track.id in priced])
+        if not earning_tracks:
+            return result
+
+        pending_status, _ = PayoutStatus.objects.get_or_create(status_name="Pending")
+        royalties, shares = _batch_royalty_shares(
+            [(track, earning_cents) for track, _, earning_cents in earning_tracks]
+        )
+        result["total_earning"] = sum((royalty.total_earning for royalty in royalties), Decimal("0.00"))
+        payouts = _post_shares(shares, pending_status)
+
+    result["royalties_created"] = len(royalties)
+    result["payouts_count"] = len(payouts)
+    return result
+
+
+def _mark_priced_streams(priced_tracks):
+    """
+    Mark the streams of [(track, PricedStreams)] processed (to avoid
+    double-pay) and store each track's sub-cent remainder, with one UPDATE
+    for the stream rows and one for the tracks.
+    """
+    if not priced_tracks:
+        return
+    mark_streams_processed(row for _, streams in priced_tracks for row in streams.rows)
+    Track.objects.filter(id__in=[track.id for track, _ in priced_tracks]).update(
+        processed_streams=Case(
+            *[When(id=track.id, then=Value(track.processed_streams + streams.streams))
+              for track, streams in priced_tracks],
+            output_field=BigIntegerField(),
+        ),
+        earning_remainder_microcents=Case(
+            *[When(id=track.id, then=Value(streams.remainder_microcents)) for track, streams in priced_tracks],
+            output_field=BigIntegerField(),
+        ),
+        distribution_pending_since=None,
+    )
+
+
+# =====================================================
+# Fraud clawback
+# =====================================================
+def clawback_queue():
+    """
+    StreamData rows flagged as fraud after their streams were paid. Clawing a
+    row back resets its processed_count, so it leaves this set: reruns only
+    see rows flagged since the previous run (served by a partial index).
+    """
+    return StreamData.objects.filter(fraud_flag=True, processed_count__gt=0)
+
+
+def claw_back_fraud_streams(rate_per_stream: Decimal = None, batch_size: int = BULK_BATCH_SIZE):
+    """
+    Reverse the earnings of every paid stream that has since been flagged as
+    fraud. The amount reversed is what each row was paid (paid_microcents),
+    whatever the rate cards say now; `rate_per_stream` re-prices the
+    streams at that rate instead. The negative amount is split over the
+    track's collaborators: a negative Royalty per track, REVERSAL/fee-refund
+    ledger entries that debit the wallets, and negative amounts in the
+    accrual buffers (so the debt is netted against future payouts). processed_streams and the rows'
+    processed_count drop by the clawed-back streams, paid_microcents to 0.
+
+    Works through `batch_size` tracks per transaction with set-based writes;
+    tracks locked by a running distribution are left for the next run.
+    """
+    summary = {
+        "tracks_processed": 0,
+        "rows_clawed_back": 0,
+        "streams_clawed_back": 0,
+        "royalties_created": 0,
+        "total_clawed_back": Decimal("0.00"),
+    }
+    last_id = 0
+    while True:
+        track_ids = list(
+            clawback_queue().filter(track_id__gt=last_id).order_by('track_id')
+            .values_list('track_id', flat=True).distinct()[:batch_size]
+        )
+        if not track_ids:
+            return summary
+        last_id = track_ids[-1]
+        batch = _claw_back_batch(track_ids, rate_per_stream)
+        for key in summary:
+            summary[key] += batch[key]
+
+
+def _claw_back_batch(track_ids, rate_per_stream):
+    result = {
+        "tracks_processed": 0,
+        "rows_clawed_back": 0,
+        "streams_clawed_back": 0,
+        "royalties_created": 0,
+        "total_clawed_back": Decimal("0.00"),
+    }
+
+    with transaction.atomic():
+        tracks = {
+            track.id: track
+            for track in Track.objects.filter(id__in=track_ids).order_by('id')
+            .select_for_update(skip_locked=True)
+            .only('id', 'processed_streams', 'splits_version', 'genre', 'rate_per_stream')
+        }
+        if not tracks:
+            return result
+        rows = list(
+            clawback_queue().filter(track_id__in=tracks.keys()).order_by('track_id', 'id')
+            .values_list('id', 'track_id', 'platform', 'date_recorded', 'processed_count', 'paid_microcents')
+        )
+        priced = price_paid_rows(rows, tracks, RATE_PER_STREAM, rate_per_stream)
+
+        amounts = [(tracks[track_id], -cents) for track_id, (_, cents) in priced.items() if cents > 0]
+        if amounts:
+            pending_status, _ = PayoutStatus.objects.get_or_create(status_name="Pending")
+            royalties, shares = _batch_royalty_shares(amounts)
+            _post_shares(shares, pending_status, _reversal_ledger_entries)
+            result["royalties_created"] = len(royalties)
+            result["total_clawed_back"] = -sum((royalty.total_earning for royalty in royalties), Decimal("0.00"))
+
+        if rows:
+            days = [row[3] for row in rows]
+            # The date range prunes the partitions of a partitioned StreamData
+            StreamData.objects.filter(id__in=[row[0] for row in rows],
+                                      date_recorded__range=(min(days), max(days))).update(
+                processed_count=0, paid_microcents=0)
+        Track.objects.filter(id__in=priced.keys()).update(
+            processed_streams=Case(
+                *[When(id=track_id, then=Greatest(F('processed_streams') - Value(streams), Value(0)))
+                  for track_id, (streams, _) in priced.items()],
+                output_field=BigIntegerField(),
+            )
+        )
+
+    result["tracks_processed"] = len(priced)
+    result["rows_clawed_back"] = len(rows)
+    result["streams_clawed_back"] = sum(streams for streams, _ in priced.values())
+    return result
@@ -179,6 +179,7 @@ class PayoutSerializer(serializers.ModelSerializer):
 
 class WalletSerializer(serializers.ModelSerializer):
     user_email = serializers.CharField(source='user.email', read_only=True)
+    balance = serializers.DecimalField(source='effective_balance', max_digits=14, decimal_places=2, read_only=True)
     payouts = PayoutSerializer(many=True, read_only=True)
 
     class Meta:
@@ -0,0 +1,68 @@
+"""
+Per-wallet accrual buffer for net royalty shares.
+
+Distributions add each wallet's net share to its WalletAccrual row instead
+of creating one Payout per share. A single Payout is emitted for a wallet
+only when its buffer reaches Payout.MIN_PAYOUT_AMOUNT, and the emitted
+amount is subtracted from the buffer. Sub-minimum shares therefore never hit
+the `payout_amount_valid_range` constraint, and frequent small distributions
+create one Payout per wallet per dollar instead of one per split.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from backend.models import Payout, WalletAccrual
+
+_AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _add_to_accruals(totals, now):
+    """UPDATE amount = amount + CASE wallet_id WHEN ... END for {wallet_id: delta}."""
+    WalletAccrual.objects.filter(wallet_id__in=totals.keys()).update(
+        amount=Case(
+            *[When(wallet_id=wallet_id, then=F('amount') + Value(delta)) for wallet_id, delta in totals.items()],
+            default=F('amount'),
+            output_field=_AMOUNT_FIELD,
+        ),
+        updated_at=now,
+    )
+
+
+def accrue_payouts(amounts, status):
+    """
+    Add (wallet_id, net_amount) pairs to the wallets' accrual buffers and
+    emit one Payout with `status` for every wallet whose buffer reached the
+    payout minimum. Repeated wallet ids are summed.
+
+    Uses a fixed number of statements regardless of the number of shares.
+    Returns {wallet_id: Payout} for the emitted payouts.
+    """
+    totals = defaultdict(Decimal)
+    for wallet_id, amount in amounts:
+        totals[wallet_id] += Decimal(amount)
+    totals = {wallet_id: amount for wallet_id, amount in totals.items() if amount}
+    if not totals:
+        return {}
+
+    now = timezone.now()
+    with transaction.atomic():
+        WalletAccrual.objects.bulk_create(
+            [WalletAccrual(wallet_id=wallet_id) for wallet_id in totals], ignore_conflicts=True
+        )
+        _add_to_accruals(totals, now)
+
+        # The UPDATE holds the row locks, so this reads our own writes
+        ready = WalletAccrual.objects.filter(
+            wallet_id__in=totals.keys(), amount__gte=Payout.MIN_PAYOUT_AMOUNT
+        ).values_list('wallet_id', 'amount')
+        payouts = Payout.objects.bulk_create([
+            Payout(wallet_id=wallet_id, amount=min(amount, Payout.MAX_PAYOUT_AMOUNT), status=status, txn_date=now)
+            for wallet_id, amount in ready
+        ])
+        if payouts:
+            _add_to_accruals({payout.wallet_id: -payout.amount for payout in payouts}, now)
+    return {payout.wallet_id: payout for payout in payouts}
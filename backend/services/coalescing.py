@@ -0,0 +1,105 @@
+"""
+Coalesced distribution of high-frequency stream increments.
+
+In coalescing mode an increment is recorded right away (added to the
+day's StreamData row and to Track.total_valid_streams) but not
+distributed. The track is marked with distribution_pending_since, and
+`manage.py flush_coalesced_distributions` distributes every track whose oldest pending increment is older than the
+window, or whose pending streams reached the threshold, once per flush.
+Many small increments therefore produce one Royalty instead of one each.
+Coalescing is the default with ROYALTY_COALESCE_INCREMENTS, and whenever
+STREAM_COUNTER_SHARDS > 1.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from backend.models import Track
+from backend.services.rate_cards import unpaid_stream_rows
+from backend.services.stream_counters import stream_counter_shard_count
+from backend.services.stream_dedup import add_streams
+
+DEFAULT_WINDOW = timedelta(seconds=60)
+DEFAULT_MIN_STREAMS = 100_000
+
+
+def coalescing_enabled():
+    """
+    Whether increments are coalesced by default: ROYALTY_COALESCE_INCREMENTS,
+    or STREAM_COUNTER_SHARDS > 1, since distributing every increment would
+    queue the requests on the Track row lock the counter shards avoid.
+    """
+    return getattr(settings, 'ROYALTY_COALESCE_INCREMENTS', False) or stream_counter_shard_count() > 1
+
+
+def coalesce_window():
+    return getattr(settings, 'ROYALTY_COALESCE_WINDOW', DEFAULT_WINDOW)
+
+
+def coalesce_min_streams():
+    return getattr(settings, 'ROYALTY_COALESCE_MIN_STREAMS', DEFAULT_MIN_STREAMS)
+
+
+def pending_stream_count():
+    """
+    Expression for a track's pending streams: the unpaid streams of its
+    StreamData rows. Unlike Track.total_valid_streams it includes the
+    increments still held in counter shards (STREAM_COUNTER_SHARDS).
+    """
+    unpaid = (
+        unpaid_stream_rows().filter(track=OuterRef('pk'))
+        .order_by()
+        .values('track')
+        .annotate(total=Sum(F('stream_count') - F('processed_count')))
+        .values('total')
+    )
+    return Coalesce(Subquery(unpaid), Value(0))
+
+
+def record_increment(track, stream_count, platform=None, date_recorded=None):
+    """
+    Record `stream_count` new streams for `track` without distributing them.
+    Returns (pending_streams, pending_since) after the increment.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        add_streams([(track.pk, platform, date_recorded or now.date(), stream_count, False)], sharded=True)
+        Track.objects.filter(pk=track.pk, distribution_pending_since__isnull=True).update(
+            distribution_pending_since=now
+        )
+        return Track.objects.filter(pk=track.pk).annotate(pending_streams=pending_stream_count()).values_list(
+            'pending_streams', 'distribution_pending_since'
+        ).get()
+
+
+def due_tracks(window=None, min_streams=None, now=None):
+    """
+    Pending tracks that should be distributed now: their oldest coalesced
+    increment is older than `window`, they have at least `min_streams`
+    pending streams, or they were not recorded in coalescing mode at all.
+    """
+    from backend.royalty_service import pending_tracks
+
+    window = coalesce_window() if window is None else window
+    min_streams = coalesce_min_streams() if min_streams is None else min_streams
+    now = now or timezone.now()
+    return pending_tracks().alias(pending_streams=pending_stream_count()).filter(
+        Q(distribution_pending_since__isnull=True)
+        | Q(distribution_pending_since__lte=now - window)
+        | Q(pending_streams__gte=min_streams)
+    )
+
+
+def flush_due_tracks(window=None, min_streams=None, rate_per_stream=None, batch_size=None):
+    """Distribute every due track once. Returns the distribution summary."""
+    from backend.royalty_service import BULK_BATCH_SIZE, distribute_pending_tracks
+
+    return distribute_pending_tracks(
+        rate_per_stream=rate_per_stream,
+        batch_size=batch_size or BULK_BATCH_SIZE,
+        tracks=due_tracks(window, min_streams),
+    )
@@ -0,0 +1,147 @@
+"""
+Durable, database-backed job queue.
+
+enqueue() inserts a Job row, normally inside the caller's transaction, so
+the job exists exactly when the change that caused it is committed.
+Workers (`manage.py run_workers`) claim due jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of them can poll the same
+table without blocking each other. A claimed job is invisible to other
+workers until its visibility timeout; if the worker dies, the job is
+claimed again after that.
+
+Each job runs in its own transaction together with the deletion of its
+row, so its effects commit exactly when the job is marked done. A failing
+job is re-queued with exponential backoff and kept as FAILED (with the
+error) after max_attempts.
+
+Handlers are registered with @job_handler(kind) in backend/tasks.py.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from backend.models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VISIBILITY_TIMEOUT = timedelta(minutes=5)
+DEFAULT_RETRY_BASE_DELAY = timedelta(seconds=5)
+DEFAULT_RETRY_MAX_DELAY = timedelta(hours=1)
+
+_handlers = {}
+
+
+def job_handler(kind):
+    """Register `fn(payload)` as the handler of jobs of `kind`."""
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def _load_handlers():
+    import backend.tasks  # noqa: F401  (registers the handlers)
+
+
+def enqueue(kind, payload=None, dedupe_key=None, run_at=None, max_attempts=None):
+    """
+    Queue a job. With a dedupe_key, nothing is queued while a queued or
+    running job with the same key exists.
+    """
+    job = Job(kind=kind, payload=payload or {}, dedupe_key=dedupe_key, run_at=run_at or timezone.now())
+    if max_attempts is not None:
+        job.max_attempts = max_attempts
+    if dedupe_key is None:
+        job.save()
+    else:
+        # A conflict with the partial unique index on active dedupe keys means
+        # the same work is already queued or running
+        Job.objects.bulk_create([job], ignore_conflicts=True)
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter for the given number of failed attempts."""
+    base = getattr(settings, 'JOB_RETRY_BASE_DELAY', DEFAULT_RETRY_BASE_DELAY)
+    cap = getattr(settings, 'JOB_RETRY_MAX_DELAY', DEFAULT_RETRY_MAX_DELAY)
+    delay = min(cap, base * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def claim_jobs(worker, limit=10, visibility_timeout=None, kinds=None):
+    """
+    Claim up to `limit` due jobs for `worker`: queued jobs whose run_at has
+    passed and running jobs whose visibility timeout expired.
+    """
+    visibility_timeout = visibility_timeout or getattr(
+        settings, 'JOB_VISIBILITY_TIMEOUT', DEFAULT_VISIBILITY_TIMEOUT
+    )
+    now = timezone.now()
+    due = Job.objects.filter(
+        Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+    )
+    if kinds:
+        due = due.filter(kind__in=kinds)
+    with transaction.atomic():
+        jobs = list(due.order_by('run_at', 'id').select_for_update(skip_locked=True)[:limit])
+        if jobs:
+            Job.objects.filter(id__in=[job.id for job in jobs]).update(
+                status=Job.RUNNING,
+                attempts=F('attempts') + 1,
+                locked_by=worker,
+                locked_until=now + visibility_timeout,
+            )
+    for job in jobs:
+        job.status, job.attempts, job.locked_by = Job.RUNNING, job.attempts + 1, worker
+    return jobs
+
+
+def run_job(job, worker):
+    """
+    Run one claimed job. Returns True if it completed. A job whose claim was
+    taken over by another worker (visibility timeout expired) is rolled back.
+    """
+    _load_handlers()
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind {job.kind!r}")
+        with transaction.atomic():
+            handler(job.payload)
+            deleted, _ = Job.objects.filter(id=job.id, locked_by=worker, status=Job.RUNNING).delete()
+            if not deleted:
+                transaction.set_rollback(True)
+                logger.warning("Job %s was reclaimed by another worker; rolled back", job.id)
+                return False
+        return True
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Job %s (%s) failed on attempt %s", job.id, job.kind, job.attempts)
+        retry = job.attempts < job.max_attempts
+        Job.objects.filter(id=job.id, locked_by=worker).update(
+            status=Job.QUEUED if retry else Job.FAILED,
+            run_at=timezone.now() + retry_delay(job.attempts) if retry else F('run_at'),
+            locked_until=None,
+            last_error=error[-10000:],
+        )
+        return False
+
+
+def run_pending_jobs(worker=None, limit=10, visibility_timeout=None, kinds=None):
+    """Claim and run one batch of jobs. Returns (claimed, succeeded)."""
+    worker = worker or worker_name()
+    jobs = claim_jobs(worker, limit, visibility_timeout, kinds)
+    succeeded = sum(run_job(job, worker) for job in jobs)
+    return len(jobs), succeeded
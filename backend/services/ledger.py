@@ -0,0 +1,111 @@
+"""
+Append-only wallet ledger.
+
+Every change of a wallet's money is written as LedgerEntry rows through
+post_ledger_entries(), which also applies the entries' sum to
+Wallet.balance (or its balance shards, see backend/services/wallets.py) in
+the same transaction. The balance therefore stays a cached projection of
+the ledger that existing readers keep using, while the ledger is the audit
+trail: a wallet's true balance is its latest WalletSnapshot plus the
+(small) sum of the entries written after it.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from backend.models import LedgerEntry, Wallet, WalletSnapshot
+from backend.services.wallets import credit_wallets, with_shard_balance
+
+# Entries younger than this are left out of new snapshots, so a transaction
+# that took an entry id but had not committed yet is never skipped.
+SNAPSHOT_SAFETY_LAG = timedelta(minutes=5)
+
+_ZERO = Value(Decimal('0.00'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def post_ledger_entries(entries):
+    """
+    Insert unsaved LedgerEntry objects with one bulk INSERT and apply each
+    wallet's net amount to Wallet.balance. Returns {wallet_id: new_balance}.
+    """
+    entries = [entry for entry in entries if entry.amount]
+    if not entries:
+        return {}
+    with transaction.atomic():
+        LedgerEntry.objects.bulk_create(entries)
+        return credit_wallets((entry.wallet_id, entry.amount) for entry in entries)
+
+
+def with_ledger_balance(wallets=None):
+    """
+    Annotate wallets with `ledger_balance` = latest snapshot balance + the
+    sum of ledger entries written after that snapshot, in one query.
+    """
+    wallets = Wallet.objects.all() if wallets is None else wallets
+    latest = WalletSnapshot.objects.filter(wallet=OuterRef('pk')).order_by('-last_entry_id')
+    wallets = wallets.annotate(
+        snapshot_balance=Coalesce(Subquery(latest.values('balance')[:1]), _ZERO),
+        snapshot_entry_id=Coalesce(Subquery(latest.values('last_entry_id')[:1]), Value(0)),
+    )
+    recent = (
+        LedgerEntry.objects.filter(wallet=OuterRef('pk'), id__gt=OuterRef('snapshot_entry_id'))
+        .order_by()
+        .values('wallet')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return wallets.annotate(ledger_balance=F('snapshot_balance') + Coalesce(Subquery(recent), _ZERO))
+
+
+def ledger_balance(wallet):
+    return with_ledger_balance(Wallet.objects.filter(pk=wallet.pk)).values_list('ledger_balance', flat=True).get()
+
+
+def take_snapshots(wallets=None):
+    """
+    Write a new snapshot for every wallet that has ledger entries older than
+    SNAPSHOT_SAFETY_LAG and newer than its latest snapshot. Returns the
+    number of snapshots written.
+    """
+    cutoff = LedgerEntry.objects.filter(created_at__lte=timezone.now() - SNAPSHOT_SAFETY_LAG).aggregate(
+        last=Max('id'))['last']
+    if cutoff is None:
+        return 0
+
+    latest = WalletSnapshot.objects.filter(wallet=OuterRef('pk')).order_by('-last_entry_id')
+    wallets = Wallet.objects.all() if wallets is None else wallets
+    rows = (
+        wallets.annotate(
+            snapshot_balance=Coalesce(Subquery(latest.values('balance')[:1]), _ZERO),
+            snapshot_entry_id=Coalesce(Subquery(latest.values('last_entry_id')[:1]), Value(0)),
+        )
+        .annotate(
+            delta=Sum(
+                'ledger_entries__amount',
+                filter=Q(ledger_entries__id__gt=F('snapshot_entry_id'), ledger_entries__id__lte=cutoff),
+            ),
+        )
+        .filter(delta__isnull=False)
+        .values_list('id', 'snapshot_balance', 'delta')
+    )
+    now = timezone.now()
+    snapshots = [
+        WalletSnapshot(wallet_id=wallet_id, balance=balance + delta, last_entry_id=cutoff, taken_at=now)
+        for wallet_id, balance, delta in rows.iterator()
+    ]
+    WalletSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+    return len(snapshots)
+
+
+def unreconciled_wallets(wallets=None):
+    """Wallets whose cached balance (Wallet.balance plus balance shards) differs from their ledger balance."""
+    # Round: backends without an exact decimal type (SQLite) sum in floating point
+    return (
+        with_ledger_balance(with_shard_balance(wallets))
+        .annotate(total_balance=F('balance') + F('shard_balance'))
+        .exclude(total_balance=Round(F('ledger_balance'), 2))
+    )
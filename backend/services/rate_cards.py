@@ -0,0 +1,305 @@
+"""
+Per-platform, per-period stream pricing.
+
+Every RateCard is compiled into an in-memory interval index: for each
+(platform, scope) key a sorted array of day boundaries with the rate that
+applies from each boundary on. Rating a batch of StreamData rows is then a
+np.searchsorted over those arrays instead of a query per row.
+
+The index is cached per process. Signals on RateCard call
+invalidate_rate_index(); a cheap signature query (count, latest update,
+highest id) also catches changes made by other processes.
+"""
+import threading
+from collections import defaultdict, namedtuple
+
+import numpy as np
+from django.db.models import BigIntegerField, Case, Count, F, IntegerField, Max, Value, When
+
+from backend.models import RateCard, StreamData
+from backend.services.royalty_math import MICROCENTS_PER_CENT, dollars_to_microcents, microcents_to_cents_batch
+
+NO_RATE = -1
+
+SCOPE_TRACK = 'track'
+SCOPE_GENRE = 'genre'
+SCOPE_ALL = 'all'
+
+# New streams of a track: the row updates to apply once they are paid
+# ((row_id, stream_count, date_recorded, micro-cents) each), and the
+# micro-cents left over by rounding to cents, carried to the next distribution
+PricedStreams = namedtuple('PricedStreams', ['streams', 'earning_cents', 'rows', 'remainder_microcents'])
+
+
+def _normalize(value):
+    return (value or '').strip().lower()
+
+
+def _segments(cards):
+    """
+    Compile [(start_day, end_day or None, card_id, rate)] of one key into
+    (boundaries, rates): rates[i] applies from boundaries[i] up to the next
+    boundary. Overlapping cards resolve to the latest effective_from.
+    """
+    bounds = sorted(
+        {start for start, _, _, _ in cards} | {end + 1 for _, end, _, _ in cards if end is not None}
+    )
+    rates = []
+    for day in bounds:
+        active = [(start, card_id, rate) for start, end, card_id, rate in cards
+                  if start <= day and (end is None or day <= end)]
+        rates.append(max(active)[2] if active else NO_RATE)
+    return np.asarray(bounds, dtype=np.int64), np.asarray(rates, dtype=np.int64)
+
+
+class RateIndex:
+    """Interval index over rate cards, queried with day ordinals."""
+
+    def __init__(self, cards):
+        grouped = defaultdict(list)
+        for card_id, platform, genre, track_id, effective_from, effective_to, rate in cards:
+            if track_id is not None:
+                key = (_normalize(platform), SCOPE_TRACK, track_id)
+            elif genre:
+                key = (_normalize(platform), SCOPE_GENRE, _normalize(genre))
+            else:
+                key = (_normalize(platform), SCOPE_ALL, None)
+            grouped[key].append((
+                effective_from.toordinal(),
+                effective_to.toordinal() if effective_to else None,
+                card_id,
+                dollars_to_microcents(rate),
+            ))
+        self._segments = {key: _segments(cards) for key, cards in grouped.items()}
+
+    def __len__(self):
+        return len(self._segments)
+
+    @staticmethod
+    def _candidate_keys(platform, track_id, genre):
+        """Keys to try, most specific first."""
+        for scope, value in ((SCOPE_TRACK, track_id), (SCOPE_GENRE, genre), (SCOPE_ALL, None)):
+            if scope != SCOPE_ALL and not value:
+                continue
+            yield (platform, scope, value)
+            if platform:
+                yield ('', scope, value)
+
+    def lookup(self, platforms, days, track_id=None, genre=None):
+        """
+        Rate in micro-cents per stream for every (platform, day ordinal) of
+        one track's rows; NO_RATE where no card applies.
+        """
+        platforms = np.asarray([_normalize(platform) for platform in platforms], dtype=object)
+        days = np.asarray(days, dtype=np.int64)
+        rates = np.full(len(days), NO_RATE, dtype=np.int64)
+        if not self._segments:
+            return rates
+        genre = _normalize(genre)
+        for platform in set(platforms.tolist()):
+            rows = np.flatnonzero(platforms == platform)
+            for key in self._candidate_keys(platform, track_id, genre):
+                segments = self._segments.get(key)
+                if segments is None:
+                    continue
+                rows = rows[rates[rows] == NO_RATE]
+                if not len(rows):
+                    break
+                bounds, segment_rates = segments
+                index = np.searchsorted(bounds, days[rows], side='right') - 1
+                found = index >= 0
+                rates[rows[found]] = segment_rates[index[found]]
+        return rates
+
+
+_lock = threading.Lock()
+_cached = None  # (signature, RateIndex)
+
+
+def _signature():
+    stats = RateCard.objects.aggregate(count=Count('id'), updated=Max('updated_at'), last_id=Max('id'))
+    return stats['count'], stats['updated'], stats['last_id']
+
+
+def get_rate_index():
+    """The compiled RateIndex, rebuilt when rate cards have changed."""
+    global _cached
+    signature = _signature()
+    with _lock:
+        if _cached is not None and _cached[0] == signature:
+            return _cached[1]
+    index = RateIndex(RateCard.objects.values_list(
+        'id', 'platform', 'genre', 'track_id', 'effective_from', 'effective_to', 'rate_per_stream'
+    ))
+    with _lock:
+        _cached = (signature, index)
+    return index
+
+
+def invalidate_rate_index():
+    global _cached
+    with _lock:
+        _cached = None
+
+
+def price_stream_rows(rows, tracks, default_rate, rate_per_stream=None):
+    """
+    Price [(row_id, track_id, platform, date_recorded, streams)] rows,
+    ordered by track_id. Each row is rated by `rate_per_stream` when given
+    (a flat override), otherwise by the rate card matching its platform and
+    date_recorded, then the track's own rate_per_stream, then
+    `default_rate`. `tracks` is {track_id: track} with id, genre and
+    rate_per_stream.
+
+    Returns {track_id: (streams, earning_cents)}; earnings are summed per
+    track in micro-cents and rounded to cents once.
+    """
+    if not rows:
+        return {}
+    track_ids, stream_totals, microcents, _ = _price_rows(rows, tracks, default_rate, rate_per_stream)
+    earning_cents = microcents_to_cents_batch(microcents)
+    return {
+        track_id: (stream_total, cents)
+        for track_id, stream_total, cents in zip(track_ids.tolist(), stream_totals.tolist(), earning_cents.tolist())
+    }
+
+
+def _price_rows(rows, tracks, default_rate, rate_per_stream):
+    """
+    (track ids, streams, micro-cents) arrays per track of price_stream_rows()
+    rows, and the micro-cents of every row.
+    """
+    _, track_ids, platforms, dates, streams = zip(*rows)
+    track_ids = np.asarray(track_ids, dtype=np.int64)
+    streams = np.asarray(streams, dtype=np.int64)
+
+    if rate_per_stream is not None:
+        rates = np.full(len(rows), dollars_to_microcents(rate_per_stream), dtype=np.int64)
+    else:
+        index = get_rate_index()
+        days = np.asarray([day.toordinal() for day in dates], dtype=np.int64)
+        platforms = np.asarray(platforms, dtype=object)
+        rates = np.empty(len(rows), dtype=np.int64)
+        default_microcents = dollars_to_microcents(default_rate)
+        # Rows are ordered by track: rate each track's slice in one lookup
+        starts = np.flatnonzero(np.r_[True, track_ids[1:] != track_ids[:-1]])
+        for start, end in zip(starts, np.r_[starts[1:], len(rows)]):
+            track = tracks[int(track_ids[start])]
+            track_rates = index.lookup(platforms[start:end], days[start:end], track.id, track.genre)
+            fallback = (dollars_to_microcents(track.rate_per_stream) if track.rate_per_stream is not None
+                        else default_microcents)
+            rates[start:end] = np.where(track_rates == NO_RATE, fallback, track_rates)
+
+    unique_tracks, groups = np.unique(track_ids, return_inverse=True)
+    microcents = np.zeros(len(unique_tracks), dtype=np.int64)
+    stream_totals = np.zeros(len(unique_tracks), dtype=np.int64)
+    row_microcents = streams * rates
+    np.add.at(microcents, groups, row_microcents)
+    np.add.at(stream_totals, groups, streams)
+    return unique_tracks, stream_totals, microcents, row_microcents
+
+
+def price_paid_rows(rows, tracks, default_rate, rate_per_stream=None):
+    """
+    What was paid for [(row_id, track_id, platform, date_recorded,
+    processed_count, paid_microcents)] rows, ordered by track_id: the
+    rows' recorded paid_microcents, so rate card changes since don't alter
+    it. Rows paid before amounts were recorded (a null paid_microcents), or
+    all rows when `rate_per_stream` is given, are priced as in
+    price_stream_rows().
+
+    Returns {track_id: (streams, earning_cents)}.
+    """
+    if not rows:
+        return {}
+    streams, microcents = defaultdict(int), defaultdict(int)
+    unrecorded = []
+    for row_id, track_id, platform, day, processed, paid in rows:
+        streams[track_id] += processed
+        if paid is None or rate_per_stream is not None:
+            unrecorded.append((row_id, track_id, platform, day, processed))
+        else:
+            microcents[track_id] += paid
+    if unrecorded:
+        track_ids, _, priced, _ = _price_rows(unrecorded, tracks, default_rate, rate_per_stream)
+        for track_id, amount in zip(track_ids.tolist(), priced.tolist()):
+            microcents[track_id] += amount
+    track_ids = list(streams)
+    earning_cents = microcents_to_cents_batch(np.asarray([microcents[track_id] for track_id in track_ids],
+                                                         dtype=np.int64))
+    return {
+        track_id: (streams[track_id], cents) for track_id, cents in zip(track_ids, earning_cents.tolist())
+    }
+
+
+def unpaid_stream_rows():
+    """
+    Non-fraud StreamData rows with streams that have not been paid yet
+    (stream_count > processed_count), served by a partial index.
+    """
+    return StreamData.objects.filter(fraud_flag=False, stream_count__gt=F('processed_count'))
+
+
+def price_new_streams(tracks, default_rate, rate_per_stream=None):
+    """
+    Price the streams of `tracks` that have not been paid yet: for every
+    non-fraud StreamData row, stream_count - processed_count (see
+    price_stream_rows for the rate rules). The track's
+    earning_remainder_microcents is added before rounding to cents, so
+    streams worth less than a cent are paid once enough of them add up.
+    `tracks` need id, genre, rate_per_stream and earning_remainder_microcents.
+
+    Returns {track_id: PricedStreams} for tracks with new streams.
+    """
+    tracks = {track.id: track for track in tracks}
+    rows = list(
+        unpaid_stream_rows().filter(track_id__in=tracks.keys())
+        .order_by('track_id', 'id')
+        .values_list('id', 'track_id', 'platform', 'date_recorded', 'stream_count', 'processed_count')
+    )
+    if not rows:
+        return {}
+    track_ids, stream_totals, microcents, row_microcents = _price_rows(
+        [(row_id, track_id, platform, day, count - processed)
+         for row_id, track_id, platform, day, count, processed in rows],
+        tracks, default_rate, rate_per_stream,
+    )
+    microcents += np.asarray([tracks[track_id].earning_remainder_microcents for track_id in track_ids.tolist()],
+                             dtype=np.int64)
+    earning_cents = microcents_to_cents_batch(microcents)
+    remainders = microcents - earning_cents * MICROCENTS_PER_CENT
+    row_updates = defaultdict(list)
+    for (row_id, track_id, _, day, count, _), paid in zip(rows, row_microcents.tolist()):
+        row_updates[track_id].append((row_id, count, day, paid))
+    return {
+        track_id: PricedStreams(streams, cents, row_updates[track_id], remainder)
+        for track_id, streams, cents, remainder in zip(
+            track_ids.tolist(), stream_totals.tolist(), earning_cents.tolist(), remainders.tolist()
+        )
+    }
+
+
+def mark_streams_processed(rows):
+    """
+    Set processed_count and add to paid_microcents for
+    [(stream_row_id, stream_count, date_recorded, microcents)] with one
+    UPDATE. The date range lets a partitioned StreamData skip the
+    partitions that hold none of the rows.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    days = [day for _, _, day, _ in rows]
+    StreamData.objects.filter(id__in=[row_id for row_id, _, _, _ in rows],
+                              date_recorded__range=(min(days), max(days))).update(
+        processed_count=Case(
+            *[When(id=row_id, then=Value(count)) for row_id, count, _, _ in rows],
+            default=F('processed_count'),
+            output_field=IntegerField(),
+        ),
+        paid_microcents=F('paid_microcents') + Case(
+            *[When(id=row_id, then=Value(paid)) for row_id, _, _, paid in rows],
+            default=Value(0),
+            output_field=BigIntegerField(),
+        ),
+    )
@@ -0,0 +1,178 @@
+"""
+Exact integer arithmetic for royalty distribution.
+
+Money is handled as integers: rates and earnings in micro-cents
+(1 USD = 10^8 micro-cents), credited shares in cents, split percentages in
+basis points (1% = 100 bp). Amounts are split across collaborators with the
+largest-remainder method, so the shares of one distribution always add up
+to exactly the distributed amount.
+
+Every operation has a scalar form for one track and a NumPy form that
+processes a whole batch of tracks with array operations.
+"""
+from decimal import Decimal
+
+import numpy as np
+
+MICROCENTS_PER_CENT = 1_000_000
+CENTS_PER_DOLLAR = 100
+MICROCENTS_PER_DOLLAR = MICROCENTS_PER_CENT * CENTS_PER_DOLLAR
+BASIS_POINTS_TOTAL = 10_000
+
+
+def div_round_half_even(numerator, denominator):
+    """Integer division rounded half-to-even, like Decimal.quantize's default."""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    doubled = remainder * 2
+    if doubled > denominator or (doubled == denominator and quotient % 2):
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def dollars_to_microcents(amount):
+    """Convert a USD amount (Decimal/str/int) to integer micro-cents."""
+    return int(Decimal(str(amount)) * MICROCENTS_PER_DOLLAR)
+
+
+def dollars_to_cents(amount):
+    return div_round_half_even(dollars_to_microcents(amount), MICROCENTS_PER_CENT)
+
+
+def cents_to_dollars(cents):
+    """Convert integer cents to a 2-decimal USD Decimal."""
+    return (Decimal(int(cents)) / CENTS_PER_DOLLAR).quantize(Decimal('0.01'))
+
+
+def stream_earnings_cents(streams, rate_microcents):
+    """Earnings in cents for `streams` plays at `rate_microcents` per play."""
+    return div_round_half_even(int(streams) * int(rate_microcents), MICROCENTS_PER_CENT)
+
+
+def allocate(total, weights, denominator=None):
+    """
+    Split the integer `total` proportionally to integer `weights` using the
+    largest-remainder method.
+
+    With the default denominator (sum of weights) the result sums to exactly
+    `total`. With an explicit denominator (e.g. BASIS_POINTS_TOTAL for
+    splits that don't add up to 100%) it sums to
+    floor(total * sum(weights) / denominator), the rest stays unallocated.
+    Negative totals are allocated by magnitude and negated.
+    """
+    weights = [int(w) for w in weights]
+    if denominator is None:
+        denominator = sum(weights)
+    if total < 0:
+        return [-share for share in allocate(-total, weights, denominator)]
+    if total == 0 or denominator == 0:
+        return [0] * len(weights)
+
+    products = [total * weight for weight in weights]
+    shares = [product // denominator for product in products]
+    leftover = total * sum(weights) // denominator - sum(shares)
+    if leftover:
+        by_remainder = sorted(range(len(weights)), key=lambda i: (-(products[i] % denominator), i))
+        for i in by_remainder[:leftover]:
+            shares[i] += 1
+    return shares
+
+
+def split_amount(total_cents, basis_points, fee_bps):
+    """
+    Split `total_cents` across collaborators holding `basis_points` and take
+    the platform fee of `fee_bps` from the collaborators' gross shares.
+
+    Returns (gross, fee, net) lists of cents, where gross = fee + net for
+    every collaborator and sum(fee) is the fee on the whole allocated amount.
+    """
+    gross = allocate(total_cents, basis_points, BASIS_POINTS_TOTAL)
+    fee_total = div_round_half_even(sum(gross) * fee_bps, BASIS_POINTS_TOTAL)
+    fee = allocate(fee_total, [abs(g) for g in gross])
+    net = [g - f for g, f in zip(gross, fee)]
+    return gross, fee, net
+
+
+# =====================================================
+# Batch (NumPy) kernel
+# =====================================================
+def _round_half_even_array(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=np.int64)
+    sign = np.where(numerator < 0, -1, 1)
+    quotient, remainder = np.divmod(np.abs(numerator), denominator)
+    doubled = remainder * 2
+    quotient += (doubled > denominator) | ((doubled == denominator) & (quotient % 2 == 1))
+    return sign * quotient
+
+
+def microcents_to_cents_batch(microcents):
+    """Round an array of micro-cent amounts to cents (half-to-even)."""
+    return _round_half_even_array(microcents, MICROCENTS_PER_CENT)
+
+
+def stream_earnings_cents_batch(streams, rate_microcents):
+    """Vectorized stream_earnings_cents over arrays of streams and rates."""
+    products = np.asarray(streams, dtype=np.int64) * np.asarray(rate_microcents, dtype=np.int64)
+    return _round_half_even_array(products, MICROCENTS_PER_CENT)
+
+
+def allocate_batch(totals, groups, weights, denominators=None):
+    """
+    Vectorized `allocate` over many independent allocations at once.
+
+    `totals[g]` is split across the entries i with `groups[i] == g`,
+    proportionally to `weights[i]`. `denominators` is a scalar, a per-group
+    array, or None for the per-group sum of weights. Returns an int64 array
+    aligned with `weights`.
+    """
+    totals = np.asarray(totals, dtype=np.int64)
+    groups = np.asarray(groups, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.int64)
+    if weights.size == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    negative = totals < 0
+    magnitudes = np.abs(totals)
+
+    weight_sums = np.zeros(len(totals), dtype=np.int64)
+    np.add.at(weight_sums, groups, weights)
+    if denominators is None:
+        denominators = weight_sums
+    denominators = np.broadcast_to(np.asarray(denominators, dtype=np.int64), totals.shape)
+    safe_denominators = np.where(denominators == 0, 1, denominators)
+    active = (magnitudes > 0) & (denominators > 0)
+
+    products = magnitudes[groups] * weights
+    entry_denominators = safe_denominators[groups]
+    shares = products // entry_denominators
+    remainders = products % entry_denominators
+
+    allocated = np.zeros(len(totals), dtype=np.int64)
+    np.add.at(allocated, groups, shares)
+    leftover = np.where(active, magnitudes * weight_sums // safe_denominators - allocated, 0)
+
+    # Within each group, hand out the leftover units by descending remainder
+    order = np.lexsort((np.arange(weights.size), -remainders, groups))
+    sorted_groups = groups[order]
+    group_starts = np.searchsorted(sorted_groups, np.arange(len(totals)))
+    rank = np.arange(weights.size) - group_starts[sorted_groups]
+    shares[order] += rank < leftover[sorted_groups]
+
+    shares = np.where(active[groups], shares, 0)
+    return np.where(negative[groups], -shares, shares)
+
+
+def split_amount_batch(total_cents, groups, basis_points, fee_bps):
+    """
+    Vectorized `split_amount`: `total_cents[g]` is the amount of track g and
+    (groups, basis_points) lists every collaborator entry of every track.
+    Returns (gross, fee, net) int64 arrays aligned with `basis_points`.
+    """
+    total_cents = np.asarray(total_cents, dtype=np.int64)
+    groups = np.asarray(groups, dtype=np.int64)
+    gross = allocate_batch(total_cents, groups, basis_points, BASIS_POINTS_TOTAL)
+
+    gross_sums = np.zeros(len(total_cents), dtype=np.int64)
+    np.add.at(gross_sums, groups, gross)
+    fee_totals = _round_half_even_array(gross_sums * fee_bps, BASIS_POINTS_TOTAL)
+    fee = allocate_batch(fee_totals, groups, np.abs(gross))
+    return gross, fee, gross - fee
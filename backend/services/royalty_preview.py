@@ -0,0 +1,180 @@
+"""
+Read-only "what if" distribution over many tracks.
+
+Streams are priced like distribution prices them (price_new_streams() /
+price_stream_rows() in backend/services/rate_cards.py: rate cards, then the
+track's rate, then RATE_PER_STREAM), in batches of PRICE_BATCH_SIZE tracks.
+The splits are loaded with two queries (plus one per level of group
+collaborators) into NumPy arrays and every collaborator's share is computed
+with the batch kernel in backend/services/royalty_math.py. Nothing is
+written: no Royalty, Payout or Wallet rows are touched.
+"""
+from decimal import Decimal
+
+import numpy as np
+
+from backend.models import Split, StreamData, UserAccount
+from backend.services.rate_cards import price_new_streams, price_stream_rows
+from backend.services.royalty_math import cents_to_dollars, split_amount_batch
+from backend.services.split_table import flatten_basis_points, load_group_members, percentage_to_basis_points
+
+STREAMS_PENDING = 'pending'
+STREAMS_TOTAL = 'total'
+
+# Tracks priced per batch of StreamData rows
+PRICE_BATCH_SIZE = 2000
+
+
+def preview_distribution(tracks, rate_per_stream=None, fee_percent=None, splits=None,
+                         streams=STREAMS_PENDING, include_tracks=True):
+    """
+    Compute what distributing `tracks` (a Track queryset) would pay.
+
+    - rate_per_stream prices every stream at that flat rate instead of the
+      rate cards and track rates; fee_percent overrides PLATFORM_FEE_PERCENT.
+    - splits replaces the stored splits: a list of {"user", "percentage"} and
+      optional "track" keys. Entries with a track replace that track's splits,
+      entries without one replace the splits of every other selected track.
+    - streams is "pending" (streams not yet distributed, plus the sub-cent
+      remainder carried from earlier distributions) or "total" (every
+      non-fraud stream).
+
+    Returns per-track rows (if include_tracks), per-user totals and grand
+    totals; its rate_per_stream is the override, or None for rate-card pricing.
+    """
+    from backend.royalty_service import PLATFORM_FEE_PERCENT, RATE_PER_STREAM
+
+    rate = Decimal(str(rate_per_stream)) if rate_per_stream is not None else None
+    fee_percent = Decimal(str(fee_percent if fee_percent is not None else PLATFORM_FEE_PERCENT))
+    fee_bps = percentage_to_basis_points(fee_percent)
+
+    selected = list(tracks.order_by('id').only('id', 'genre', 'rate_per_stream', 'earning_remainder_microcents'))
+    track_ids = np.array([track.id for track in selected], dtype=np.int64)
+    positions = {track.id: position for position, track in enumerate(selected)}
+    stream_counts = np.zeros(len(selected), dtype=np.int64)
+    earnings = np.zeros(len(selected), dtype=np.int64)
+    for start in range(0, len(selected), PRICE_BATCH_SIZE):
+        batch = selected[start:start + PRICE_BATCH_SIZE]
+        for track_id, (count, cents) in _price_streams(batch, streams, RATE_PER_STREAM, rate).items():
+            stream_counts[positions[track_id]] = count
+            earnings[positions[track_id]] = cents
+
+    split_tracks, split_users, split_bps = _split_arrays(tracks, track_ids, splits or [])
+    groups = np.searchsorted(track_ids, split_tracks)
+    gross, fee, net = split_amount_batch(earnings, groups, split_bps, fee_bps)
+
+    track_fee = np.zeros(len(track_ids), dtype=np.int64)
+    track_net = np.zeros(len(track_ids), dtype=np.int64)
+    np.add.at(track_fee, groups, fee)
+    np.add.at(track_net, groups, net)
+
+    user_ids, user_index = np.unique(split_users, return_inverse=True)
+    user_totals = np.zeros((len(user_ids), 3), dtype=np.int64)
+    np.add.at(user_totals, user_index, np.stack([gross, fee, net], axis=1))
+    emails = dict(UserAccount.objects.filter(id__in=user_ids.tolist()).values_list('id', 'email'))
+
+    result = {
+        "rate_per_stream": rate,
+        "fee_percent": fee_percent,
+        "streams": streams,
+        "totals": {
+            "tracks": len(track_ids),
+            "streams": int(stream_counts.sum()),
+            "total_earning": cents_to_dollars(int(earnings.sum())),
+            "fee": cents_to_dollars(int(track_fee.sum())),
+            "net": cents_to_dollars(int(track_net.sum())),
+        },
+        "users": [
+            {
+                "user_id": user_id,
+                "email": emails.get(user_id),
+                "gross": cents_to_dollars(totals[0]),
+                "fee": cents_to_dollars(totals[1]),
+                "net": cents_to_dollars(totals[2]),
+            }
+            for user_id, totals in zip(user_ids.tolist(), user_totals.tolist())
+        ],
+    }
+    if include_tracks:
+        result["tracks"] = [
+            {
+                "track_id": track_id,
+                "streams": count,
+                "total_earning": cents_to_dollars(earning),
+                "fee": cents_to_dollars(track_fee_cents),
+                "net": cents_to_dollars(track_net_cents),
+            }
+            for track_id, count, earning, track_fee_cents, track_net_cents in zip(
+                track_ids.tolist(), stream_counts.tolist(), earnings.tolist(), track_fee.tolist(), track_net.tolist()
+            )
+        ]
+    return result
+
+
+def _price_streams(tracks, streams, default_rate, rate_per_stream):
+    """{track_id: (streams, earning_cents)} for the tracks that have streams to price."""
+    if streams != STREAMS_TOTAL:
+        return {
+            track_id: (priced.streams, priced.earning_cents)
+            for track_id, priced in price_new_streams(tracks, default_rate, rate_per_stream).items()
+        }
+    rows = list(
+        StreamData.objects.filter(track_id__in=[track.id for track in tracks], fraud_flag=False)
+        .order_by('track_id', 'id')
+        .values_list('id', 'track_id', 'platform', 'date_recorded', 'stream_count')
+    )
+    return price_stream_rows(rows, {track.id: track for track in tracks}, default_rate, rate_per_stream)
+
+
+def _split_arrays(tracks, track_ids, overrides):
+    """
+    (track_id, user_id, basis_points) arrays for the selected tracks: stored
+    splits, with overridden tracks replaced by their override entries, and
+    group collaborators resolved into their members.
+    """
+    per_track = {}
+    default = []
+    for entry in overrides:
+        row = (int(entry['user']), percentage_to_basis_points(entry['percentage']))
+        if entry.get('track') is None:
+            default.append(row)
+        else:
+            per_track.setdefault(int(entry['track']), []).append(row)
+
+    parts = []
+    if default:
+        # Every selected track without its own override gets the default splits
+        covered = track_ids[~np.isin(track_ids, list(per_track))]
+        for user_id, bps in default:
+            parts.append(np.stack([
+                covered, np.full_like(covered, user_id), np.full_like(covered, bps),
+            ], axis=1))
+    else:
+        stored = np.array([
+            (track_id, user_id, percentage_to_basis_points(percentage))
+            for track_id, user_id, percentage in Split.objects.filter(track__in=tracks.values('id'))
+            .exclude(track_id__in=list(per_track))
+            .values_list('track_id', 'user_id', 'percentage')
+        ], dtype=np.int64).reshape(-1, 3)
+        parts.append(stored)
+
+    selected = set(track_ids.tolist())
+    override_rows = [
+        (track_id, user_id, bps)
+        for track_id, rows in per_track.items() if track_id in selected
+        for user_id, bps in rows
+    ]
+    parts.append(np.array(override_rows, dtype=np.int64).reshape(-1, 3))
+
+    combined = np.concatenate(parts)
+    groups = load_group_members(set(combined[:, 1].tolist()))
+    if groups:
+        per_track_entries = {}
+        for track_id, user_id, bps in combined.tolist():
+            per_track_entries.setdefault(track_id, []).append((user_id, bps))
+        combined = np.array([
+            (track_id, user_id, bps)
+            for track_id, entries in per_track_entries.items()
+            for user_id, bps in flatten_basis_points(entries, groups)
+        ], dtype=np.int64).reshape(-1, 3)
+    return combined[:, 0], combined[:, 1], combined[:, 2]
@@ -0,0 +1,191 @@
+"""
+In-process cache of compiled per-track split tables.
+
+A split table is an immutable tuple of SplitEntry rows built from a track's
+Split rows. Splits held by group collaborators (SplitGroupMember) are
+flattened when the table is built, so the table lists only the leaf
+collaborators with their effective basis points and distribution never
+walks the group tree.
+
+Entries are keyed by (track id, Track.splits_version); the version is
+bumped in the database whenever a split, a group membership of any group
+in the track's tree or a collaborator's email changes, so a process that
+missed the invalidation signal still sees a miss on its next lookup.
+"""
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+
+from backend.models import Split, SplitGroupMember, UserAccount
+from backend.services.royalty_math import BASIS_POINTS_TOTAL, allocate
+
+BASIS_POINTS_PER_PERCENT = 100
+
+DEFAULT_CACHE_SIZE = 10000
+
+
+class SplitEntry(NamedTuple):
+    user_id: int
+    wallet_id: Optional[int]
+    basis_points: int
+    user_email: str
+
+
+class _LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_track(self, track_id):
+        with self._lock:
+            for key in [key for key in self._data if key[0] == track_id]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_cache = _LRUCache(getattr(settings, 'SPLIT_TABLE_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+
+
+def percentage_to_basis_points(percentage):
+    return int(round(float(percentage) * BASIS_POINTS_PER_PERCENT))
+
+
+def get_split_table(track):
+    """Return the split table for one track."""
+    return get_split_tables([track])[track.id]
+
+
+def get_split_tables(tracks):
+    """
+    Return {track_id: split table} for many tracks, building every missing
+    table with one splits query and one wallets query.
+    """
+    tables = {}
+    missing = {}
+    for track in tracks:
+        key = (track.id, track.splits_version)
+        table = _cache.get(key)
+        if table is None:
+            missing[track.id] = key
+        else:
+            tables[track.id] = table
+
+    if missing:
+        rows = list(
+            Split.objects.filter(track_id__in=missing.keys())
+            .order_by('track_id', 'id')
+            .values_list('track_id', 'user_id', 'percentage')
+        )
+        groups = load_group_members({user_id for _, user_id, _ in rows})
+        splits = {track_id: [] for track_id in missing}
+        for track_id, user_id, percentage in rows:
+            splits[track_id].append((user_id, percentage_to_basis_points(percentage)))
+        leaves = {track_id: flatten_basis_points(entries, groups) for track_id, entries in splits.items()}
+
+        users = {
+            user_id: (email, wallet_id)
+            for user_id, email, wallet_id in UserAccount.objects.filter(
+                id__in={user_id for entries in leaves.values() for user_id, _ in entries}
+            ).values_list('id', 'email', 'wallet__id')
+        }
+        for track_id, entries in leaves.items():
+            table = tuple(
+                SplitEntry(user_id, users[user_id][1], basis_points, users[user_id][0])
+                for user_id, basis_points in entries
+            )
+            _cache.set(missing[track_id], table)
+            tables[track_id] = table
+
+    return tables
+
+
+def load_group_members(user_ids):
+    """
+    {group user id: [(member user id, basis points)]} for every group
+    reachable from `user_ids`, loaded with one query per tree level.
+    """
+    groups = {}
+    seen = set(user_ids)
+    frontier = set(seen)
+    while frontier:
+        level = SplitGroupMember.objects.filter(group_id__in=frontier).order_by('group_id', 'id')
+        for group_id, member_id, percentage in level.values_list('group_id', 'member_id', 'percentage'):
+            groups.setdefault(group_id, []).append((member_id, percentage_to_basis_points(percentage)))
+        frontier = {member_id for members in groups.values() for member_id, _ in members} - seen
+        seen |= frontier
+    return groups
+
+
+def flatten_basis_points(entries, groups):
+    """
+    Resolve [(user_id, basis_points)] through `groups` (see
+    load_group_members) into leaf-level [(user_id, basis_points)]. A group's
+    basis points are allocated over its members with the largest-remainder
+    method; the part its members don't cover stays with the group. A user
+    reached through several paths gets the sum.
+    """
+    leaves = {}
+
+    def visit(user_id, basis_points, path):
+        members = groups.get(user_id)
+        if not members or user_id in path:
+            leaves[user_id] = leaves.get(user_id, 0) + basis_points
+            return
+        shares = allocate(basis_points, [member_bps for _, member_bps in members], BASIS_POINTS_TOTAL)
+        kept = basis_points - sum(shares)
+        if kept:
+            leaves[user_id] = leaves.get(user_id, 0) + kept
+        for (member_id, _), share in zip(members, shares):
+            if share:
+                visit(member_id, share, path | {user_id})
+
+    for user_id, basis_points in entries:
+        visit(user_id, basis_points, frozenset())
+    return list(leaves.items())
+
+
+def ancestor_group_ids(user_ids):
+    """`user_ids` and every group that contains one of them, directly or through other groups."""
+    found = set(user_ids)
+    frontier = set(found)
+    while frontier:
+        frontier = set(
+            SplitGroupMember.objects.filter(member_id__in=frontier).values_list('group_id', flat=True)
+        ) - found
+        found |= frontier
+    return found
+
+
+def tracks_using_users(user_ids):
+    """Ids of the tracks whose split tree contains any of `user_ids`."""
+    return set(
+        Split.objects.filter(user_id__in=ancestor_group_ids(user_ids)).values_list('track_id', flat=True)
+    )
+
+
+def invalidate_track(track_id):
+    _cache.discard_track(track_id)
+
+
+def clear_cache():
+    _cache.clear()
@@ -0,0 +1,174 @@
+"""
+Maintenance of Track.total_valid_streams, the running sum of non-fraud
+StreamData.stream_count per track.
+
+Single-row saves and deletes are tracked by the StreamData signals in
+backend/signals.py. Code that writes StreamData with bulk_create() or
+QuerySet.update() bypasses signals and must call apply_stream_deltas()
+(and the daily rollup's apply_rollup_rows(), see stream_rollups.py)
+itself; `manage.py recount_stream_totals` rebuilds every counter.
+
+With STREAM_COUNTER_SHARDS set to K > 1 the deltas are added to one of K
+TrackStreamCounterShard rows of the track, picked at random, instead of the
+Track row, so many ingest workers can count the streams of one viral track
+without waiting for each other's row lock. A track's exact total is then
+total_valid_streams plus its shards (with_exact_stream_total()).
+Distribution folds the shards of the tracks it has locked into
+total_valid_streams first (fold_locked_stream_shards()), and
+`manage.py compact_stream_counters` folds every track's shards.
+"""
+import operator
+import random
+from collections import defaultdict
+from functools import reduce
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from backend.models import StreamData, Track, TrackStreamCounterShard
+
+# Tracks folded per transaction by fold_stream_counter_shards
+FOLD_BATCH_SIZE = 1000
+
+
+def stream_counter_shard_count():
+    return getattr(settings, 'STREAM_COUNTER_SHARDS', 0)
+
+
+def valid_stream_count(stream_count, fraud_flag):
+    """How many streams a StreamData row contributes to its track's counter."""
+    return 0 if fraud_flag else int(stream_count or 0)
+
+
+def _add_to_tracks(totals):
+    Track.objects.filter(id__in=totals.keys()).update(
+        total_valid_streams=Case(
+            *[When(id=track_id, then=F('total_valid_streams') + Value(delta)) for track_id, delta in totals.items()],
+            default=F('total_valid_streams'),
+            output_field=BigIntegerField(),
+        )
+    )
+
+
+def _add_to_shards(totals, shards):
+    """Add each track's delta to one randomly chosen shard, creating shard rows on first use."""
+    picks = {track_id: random.randrange(shards) for track_id in totals}
+    TrackStreamCounterShard.objects.bulk_create(
+        [TrackStreamCounterShard(track_id=track_id, shard=shard) for track_id, shard in picks.items()],
+        ignore_conflicts=True,
+    )
+    TrackStreamCounterShard.objects.filter(
+        reduce(operator.or_, [Q(track_id=track_id, shard=shard) for track_id, shard in picks.items()])
+    ).update(
+        streams=Case(
+            *[When(track_id=track_id, then=F('streams') + Value(delta)) for track_id, delta in totals.items()],
+            default=F('streams'),
+            output_field=BigIntegerField(),
+        )
+    )
+
+
+def apply_stream_deltas(deltas):
+    """
+    Add {track_id: delta} to Track.total_valid_streams with one UPDATE, or to
+    the tracks' counter shards in sharded mode.
+    """
+    totals = defaultdict(int)
+    for track_id, delta in (deltas.items() if isinstance(deltas, dict) else deltas):
+        totals[track_id] += delta
+    totals = {track_id: delta for track_id, delta in totals.items() if delta}
+    if not totals:
+        return
+    shards = stream_counter_shard_count()
+    if shards > 1:
+        _add_to_shards(totals, shards)
+    else:
+        _add_to_tracks(totals)
+
+
+def with_exact_stream_total(tracks=None):
+    """
+    Annotate tracks with `exact_valid_streams`: total_valid_streams plus the
+    streams still held in counter shards, in one query and without locks.
+    """
+    tracks = Track.objects.all() if tracks is None else tracks
+    shards = (
+        TrackStreamCounterShard.objects.filter(track=OuterRef('pk'))
+        .order_by()
+        .values('track')
+        .annotate(total=Sum('streams'))
+        .values('total')
+    )
+    return tracks.annotate(exact_valid_streams=F('total_valid_streams') + Coalesce(Subquery(shards), Value(0)))
+
+
+def fold_locked_stream_shards(track_ids):
+    """
+    Move the counter shards of `track_ids` into Track.total_valid_streams.
+    The caller must hold the tracks' row locks (Track rows are always
+    locked before their shards). Returns {track_id: streams folded}.
+    """
+    rows = list(
+        TrackStreamCounterShard.objects.select_for_update()
+        .filter(track_id__in=list(track_ids))
+        .exclude(streams=0)
+        .order_by('id')
+        .values_list('id', 'track_id', 'streams')
+    )
+    if not rows:
+        return {}
+    totals = defaultdict(int)
+    for _, track_id, streams in rows:
+        totals[track_id] += streams
+    TrackStreamCounterShard.objects.filter(id__in=[row_id for row_id, _, _ in rows]).update(streams=0)
+    totals = {track_id: streams for track_id, streams in totals.items() if streams}
+    if totals:
+        _add_to_tracks(totals)
+    return totals
+
+
+def fold_stream_counter_shards(batch_size=FOLD_BATCH_SIZE):
+    """
+    Fold the counter shards of every track, `batch_size` tracks per
+    transaction. Tracks locked elsewhere (being distributed, which folds
+    them itself) are skipped. Returns the number of tracks folded.
+    """
+    folded = 0
+    last_track_id = 0
+    while True:
+        with transaction.atomic():
+            track_ids = list(
+                TrackStreamCounterShard.objects.filter(track_id__gt=last_track_id)
+                .exclude(streams=0)
+                .order_by('track_id')
+                .values_list('track_id', flat=True)
+                .distinct()[:batch_size]
+            )
+            if not track_ids:
+                return folded
+            last_track_id = track_ids[-1]
+            locked = list(
+                Track.objects.filter(id__in=track_ids).order_by('id')
+                .select_for_update(skip_locked=True).values_list('id', flat=True)
+            )
+            folded += len(fold_locked_stream_shards(locked))
+
+
+def recount_stream_totals(tracks=None):
+    """
+    Recompute total_valid_streams from StreamData for `tracks` (a Track
+    queryset, default all tracks) with a single correlated UPDATE, and
+    reset their counter shards. Returns the number of tracks updated.
+    """
+    valid_total = (
+        StreamData.objects.filter(track=OuterRef('pk'), fraud_flag=False)
+        .order_by()
+        .values('track')
+        .annotate(total=Sum('stream_count'))
+        .values('total')
+    )
+    tracks = Track.objects.all() if tracks is None else tracks
+    TrackStreamCounterShard.objects.filter(track__in=tracks.values('id')).exclude(streams=0).update(streams=0)
+    return tracks.update(total_valid_streams=Coalesce(Subquery(valid_total), Value(0)))
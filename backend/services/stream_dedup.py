@@ -0,0 +1,292 @@
+"""
+One StreamData row per (track, platform, date_recorded, fraud_flag, shard).
+
+The unique constraint stream_data_unique_day makes repeated increments of
+the same track, platform and day add to one row instead of inserting a
+new row each: add_streams() writes them with
+INSERT ... ON CONFLICT DO UPDATE SET stream_count = stream_count + EXCLUDED.stream_count.
+Databases without NULLS NOT DISTINCT constraints (SQLite, PostgreSQL < 15)
+don't get the constraint, so there the rows of a batch are selected, then
+updated or created. The new streams stay unpaid (processed_count is untouched), so
+distribution pays exactly the increment.
+
+Bulk ingestion adds to shard 0. Per-request increments of one viral track
+would all queue on that row's lock, so with STREAM_COUNTER_SHARDS set to
+K > 1 they are added to one of K rows of the day picked at random
+(add_streams(sharded=True)), like the track's counter shards and its
+daily rollup rows.
+
+StreamData.save() goes through merge_into_existing_row(): a row that gets
+the key of another row, e.g. by being flagged as fraud on a day that
+already has a fraud row, is merged into it instead of failing.
+
+compact_stream_data() (`manage.py compact_stream_data`) merges duplicate
+rows stored before the constraint existed, and folds the shard rows of
+past days into one: the oldest row of every group takes the other rows'
+stream_count, processed_count and paid_microcents, and they are deleted. Totals and
+counters don't change; the day's rollup shards are folded the same way.
+"""
+import random
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, Case, F, IntegerField, Q, Value, When, Window
+from django.db.models.functions import FirstValue
+from django.utils import timezone
+
+from backend.models import StreamData, Track
+from backend.services.stream_counters import apply_stream_deltas, stream_counter_shard_count, valid_stream_count
+from backend.services.stream_rollups import apply_rollup_rows, fold_rollup_shards
+
+UPSERT_BATCH_SIZE = 1000
+# Duplicate rows merged per transaction by compact_stream_data
+COMPACT_BATCH_SIZE = 5000
+
+UNIQUE_COLUMNS = ('track_id', 'platform', 'date_recorded', 'fraud_flag', 'shard')
+# StreamData.save(update_fields=...) only needs a merge check when one of these changes
+KEY_FIELDS = frozenset({'track', 'track_id', 'platform', 'date_recorded', 'fraud_flag', 'shard'})
+
+
+def _sort_key(key):
+    track_id, platform, day, fraud_flag, shard = key
+    return track_id, platform is None, platform or '', day, fraud_flag, shard
+
+
+def upsert_stream_rows(totals):
+    """
+    Add {(track_id, platform, date_recorded, fraud_flag, shard): stream_count}
+    to StreamData, one row per key. Doesn't touch counters or the rollup.
+    """
+    if not connection.features.supports_nulls_distinct_unique_constraints:
+        return _update_or_create_stream_rows(totals)
+    table = connection.ops.quote_name(StreamData._meta.db_table)
+    rows = [(*key, count) for key, count in sorted(totals.items(), key=lambda item: _sort_key(item[0]))]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                f"INSERT INTO {table} (track_id, platform, date_recorded, fraud_flag, shard, stream_count, "
+                f"processed_count, paid_microcents) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, 0, 0)'] * len(batch))} "
+                f"ON CONFLICT ({', '.join(UNIQUE_COLUMNS)}) DO UPDATE SET "
+                f"stream_count = {table}.stream_count + EXCLUDED.stream_count",
+                [value for row in batch for value in row],
+            )
+
+
+def _update_or_create_stream_rows(totals):
+    # Without the constraint ON CONFLICT has nothing to match: select the
+    # batch's existing rows, add to them and create the missing ones
+    to_date = StreamData._meta.get_field('date_recorded').to_python
+    merged = defaultdict(int)
+    for (track_id, platform, day, fraud_flag, shard), count in totals.items():
+        merged[(track_id, platform, to_date(day), fraud_flag, shard)] += count
+    keys = sorted(merged, key=_sort_key)
+    for start in range(0, len(keys), UPSERT_BATCH_SIZE):
+        batch = {key: merged[key] for key in keys[start:start + UPSERT_BATCH_SIZE]}
+        existing = {}
+        candidates = StreamData.objects.filter(
+            track_id__in={key[0] for key in batch}, date_recorded__in={key[2] for key in batch},
+        ).order_by('id').values_list('id', *UNIQUE_COLUMNS)
+        for row_id, *key in candidates:
+            if tuple(key) in batch:
+                existing.setdefault(tuple(key), row_id)
+        if existing:
+            StreamData.objects.filter(id__in=existing.values()).update(stream_count=F('stream_count') + Case(
+                *[When(id=row_id, then=Value(batch[key])) for key, row_id in existing.items()],
+                output_field=IntegerField(),
+            ))
+        StreamData.objects.bulk_create([
+            StreamData(track_id=track_id, platform=platform, date_recorded=day, fraud_flag=fraud_flag,
+                       shard=shard, stream_count=count)
+            for (track_id, platform, day, fraud_flag, shard), count in batch.items()
+            if (track_id, platform, day, fraud_flag, shard) not in existing
+        ])
+
+
+def add_streams(rows, sharded=False):
+    """
+    Record [(track_id, platform, date_recorded, stream_count, fraud_flag)]
+    with upserts, together with the stream counters and the daily rollup
+    (the upsert bypasses the StreamData signals). `sharded` adds them to
+    one of the STREAM_COUNTER_SHARDS rows of their day and rollup day,
+    picked at random (for per-request increments of hot tracks).
+
+    The counters are updated first: distribution locks the Track (and its
+    counter shards) before it writes processed_count on the StreamData rows,
+    so taking the locks in the same order can't deadlock with it.
+    """
+    shards = stream_counter_shard_count() if sharded else 0
+    shard = random.randrange(shards) if shards > 1 else 0
+    totals = defaultdict(int)
+    deltas = defaultdict(int)
+    for track_id, platform, day, count, fraud_flag in rows:
+        totals[(track_id, platform, day, fraud_flag, shard)] += count
+        deltas[track_id] += valid_stream_count(count, fraud_flag)
+    if not totals:
+        return
+    apply_stream_deltas(deltas)
+    upsert_stream_rows(totals)
+    apply_rollup_rows(added=rows, shard=shard)
+
+
+def duplicate_rows(tracks=None, today=None):
+    """
+    StreamData rows that are not the oldest of their
+    (track, platform, date_recorded, fraud_flag, shard) group, annotated
+    with keep_id, the id of that oldest row. Days before `today` form one
+    group across their shards.
+    """
+    today = today or timezone.now().date()
+    rows = StreamData.objects.all() if tracks is None else StreamData.objects.filter(track__in=tracks)
+    return rows.annotate(keep_id=Window(
+        FirstValue('id'),
+        partition_by=[
+            F('track_id'), F('platform'), F('date_recorded'), F('fraud_flag'),
+            Case(When(date_recorded__lt=today, then=Value(0)), default=F('shard'), output_field=IntegerField()),
+        ],
+        order_by=F('id').asc(),
+    )).filter(~Q(id=F('keep_id')))
+
+
+def _delete_rows(ids, days):
+    """
+    DELETE StreamData rows without the delete signals, which would subtract
+    streams that only move to another row. The date range prunes the
+    partitions of a partitioned StreamData.
+    """
+    table = connection.ops.quote_name(StreamData._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE date_recorded >= %s AND date_recorded <= %s "
+            f"AND id IN ({', '.join(['%s'] * len(ids))})",
+            [min(days), max(days), *ids],
+        )
+
+
+def _add_paid(paid):
+    # A null paid_microcents (not recorded) makes the merged amount unknown too
+    return F('paid_microcents') + Value(paid) if paid is not None else Value(None)
+
+
+def _merge(rows):
+    """
+    Fold [(id, keep_id, stream_count, processed_count, paid_microcents,
+    date_recorded)] into their keep rows.
+    """
+    streams, processed, paid = defaultdict(int), defaultdict(int), defaultdict(int)
+    for _, keep_id, count, done, microcents, _ in rows:
+        streams[keep_id] += count
+        processed[keep_id] += done
+        paid[keep_id] = None if microcents is None or paid[keep_id] is None else paid[keep_id] + microcents
+    days = [day for *_, day in rows]
+    _delete_rows([row[0] for row in rows], days)
+    StreamData.objects.filter(date_recorded__range=(min(days), max(days)), id__in=list(streams)).update(
+        stream_count=F('stream_count') + Case(
+            *[When(id=keep_id, then=Value(count)) for keep_id, count in streams.items()],
+            default=Value(0), output_field=IntegerField(),
+        ),
+        processed_count=F('processed_count') + Case(
+            *[When(id=keep_id, then=Value(count)) for keep_id, count in processed.items()],
+            default=Value(0), output_field=IntegerField(),
+        ),
+        paid_microcents=Case(
+            *[When(id=keep_id, then=_add_paid(microcents)) for keep_id, microcents in paid.items()],
+            default=F('paid_microcents'), output_field=BigIntegerField(),
+        ),
+    )
+
+
+def merge_into_existing_row(row):
+    """
+    Called by StreamData.save() in a transaction, before the row is written.
+    If another row holds the (track, platform, date_recorded, fraud_flag,
+    shard) key of the StreamData instance `row` (say, a row flagged as
+    fraud on a day that already has a fraud row) its streams are merged
+    into that row: a new row's stream_count is added to it, an edited row's
+    stream_count, processed_count and paid_microcents move to it and the edited row is
+    deleted, so paid streams stay paid (or queued for clawback). `row` then
+    stands for the merged row. Returns False when the key is free and the
+    row must be saved as usual.
+
+    The tracks are locked before any StreamData row, as distribution does.
+    """
+    row.date_recorded = StreamData._meta.get_field('date_recorded').to_python(row.date_recorded)
+    previous = None
+    if row.pk is not None:
+        previous = StreamData.objects.filter(pk=row.pk).values_list(
+            'track_id', 'platform', 'date_recorded', 'stream_count', 'fraud_flag', 'processed_count',
+            'paid_microcents',
+        ).first()
+    track_ids = {row.track_id} | ({previous[0]} if previous else set())
+    list(Track.objects.filter(id__in=track_ids).order_by('id').select_for_update().values_list('id', flat=True))
+    target = (
+        StreamData.objects.select_for_update()
+        .filter(track_id=row.track_id, platform=row.platform, date_recorded=row.date_recorded,
+                fraud_flag=row.fraud_flag, shard=row.shard)
+        .exclude(pk=row.pk)
+        .first()
+    )
+    if target is None:
+        return False
+
+    deltas = defaultdict(int)
+    deltas[row.track_id] += valid_stream_count(row.stream_count, row.fraud_flag)
+    processed, paid = 0, 0
+    if previous:
+        track_id, _, day, stream_count, fraud_flag, processed, paid = previous
+        deltas[track_id] -= valid_stream_count(stream_count, fraud_flag)
+        _delete_rows([row.pk], [day])
+    apply_stream_deltas(deltas)
+    StreamData.objects.filter(pk=target.pk, date_recorded=target.date_recorded).update(
+        stream_count=F('stream_count') + row.stream_count,
+        processed_count=F('processed_count') + processed,
+        paid_microcents=_add_paid(paid),
+    )
+    apply_rollup_rows(
+        added=[(row.track_id, row.platform, row.date_recorded, row.stream_count, row.fraud_flag)],
+        removed=[previous[:5]] if previous else [],
+    )
+    row.pk, row.stream_count, row.processed_count = StreamData.objects.filter(
+        pk=target.pk, date_recorded=target.date_recorded
+    ).values_list('pk', 'stream_count', 'processed_count').get()
+    row._state.adding = False
+    return True
+
+
+def compact_stream_data(batch_size=COMPACT_BATCH_SIZE, track_batch_size=500, today=None):
+    """
+    Merge duplicate StreamData rows and the shard rows of days before
+    `today` (see duplicate_rows), at most `batch_size` rows per
+    transaction. Tracks are locked first (as distribution does), so no
+    distribution reads rows that are being merged; tracks locked elsewhere
+    are left for the next run. Returns the number of rows merged away.
+    """
+    today = today or timezone.now().date()
+    merged = 0
+    last_track_id = 0
+    while True:
+        track_ids = list(
+            Track.objects.filter(id__gt=last_track_id).order_by('id')
+            .values_list('id', flat=True)[:track_batch_size]
+        )
+        if not track_ids:
+            return merged
+        last_track_id = track_ids[-1]
+        while True:
+            with transaction.atomic():
+                locked = list(
+                    Track.objects.filter(id__in=track_ids).order_by('id')
+                    .select_for_update(skip_locked=True).values_list('id', flat=True)
+                )
+                rows = list(
+                    duplicate_rows(locked, today).order_by('id')
+                    .values_list('id', 'keep_id', 'stream_count', 'processed_count', 'paid_microcents',
+                                 'date_recorded')[:batch_size]
+                ) if locked else []
+                if rows:
+                    _merge(rows)
+                fold_rollup_shards(locked, today)
+            merged += len(rows)
+            if len(rows) < batch_size:
+                break
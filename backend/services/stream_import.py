@@ -0,0 +1,263 @@
+"""
+Bulk import of DSP stream reports into StreamData.
+
+A report is a CSV or TSV file with a header row and one line per
+(track, platform, date, streams); the track is given by its ISRC or its id.
+The file is parsed as a stream in chunks of rows, so memory does not grow
+with the report. Track identifiers are resolved through an in-memory map
+loaded once per import, and each chunk's lines are summed per
+(track, platform, date).
+
+On PostgreSQL every chunk is loaded with COPY into a temporary staging
+table and merged into StreamData with one INSERT ... SELECT ... ON CONFLICT
+DO UPDATE; other databases (and PostgreSQL < 15) go through
+upsert_stream_rows() (see backend/services/stream_dedup.py). Both add the
+streams to the existing row of a (track, platform, date) instead of
+inserting another one: imports are additive, and importing a report twice
+counts its streams twice (uploads are refused by checksum, see
+StreamReportImport). These writes bypass the StreamData
+signals, so each chunk applies its stream totals (apply_stream_deltas())
+and daily rollup deltas (apply_rollup_deltas()) itself. Every chunk runs
+in its own transaction (a savepoint when the caller already holds one) and
+reports its bad lines. The imported streams are distributed by the regular
+pipeline (pending_tracks()).
+"""
+import csv
+import gzip
+import io
+import itertools
+import re
+from collections import defaultdict, namedtuple
+from datetime import date
+
+from django.db import connection, transaction
+
+from backend.models import StreamData, Track
+from backend.services.stream_counters import apply_stream_deltas
+from backend.services.stream_dedup import UNIQUE_COLUMNS, upsert_stream_rows
+from backend.services.stream_rollups import apply_rollup_deltas
+
+DEFAULT_CHUNK_SIZE = 50_000
+# Bad lines kept per chunk report; the rest are only counted
+MAX_ERRORS_PER_CHUNK = 100
+MAX_STREAM_COUNT = 2 ** 31 - 1
+STAGING_TABLE = 'stream_import_staging'
+
+# Accepted header names of every column, lower-cased
+COLUMN_ALIASES = {
+    'track': ('isrc', 'track_id', 'track'),
+    'platform': ('platform', 'dsp', 'store', 'service'),
+    'date': ('date', 'date_recorded', 'day', 'period', 'month'),
+    'streams': ('streams', 'stream_count', 'count', 'quantity', 'units'),
+}
+
+ChunkReport = namedtuple(
+    'ChunkReport', ['chunk', 'first_line', 'rows', 'imported', 'streams', 'error_count', 'errors']
+)
+
+
+class ReportError(ValueError):
+    """The report cannot be imported at all (empty file, missing columns)."""
+
+
+def open_report(raw, name, encoding='utf-8-sig'):
+    """Text stream over the binary file object `raw`; `name` ending in .gz means gzip-compressed."""
+    if name.endswith('.gz'):
+        raw = gzip.GzipFile(fileobj=raw)
+    return io.TextIOWrapper(raw, encoding=encoding, newline='')
+
+
+def normalize_isrc(value):
+    """ISRC without separators, upper-cased: 'us-s1z-99-00001' -> 'USS1Z9900001'."""
+    return re.sub(r'[\s-]', '', value or '').upper()
+
+
+class TrackResolver:
+    """In-memory map from report identifiers (ISRC or track id) to track ids."""
+
+    def __init__(self):
+        self.by_isrc = dict(Track.objects.filter(isrc__isnull=False).values_list('isrc', 'id'))
+        self.ids = set(Track.objects.values_list('id', flat=True))
+
+    def resolve(self, value):
+        track_id = self.by_isrc.get(normalize_isrc(value))
+        if track_id is None and value.isdigit() and int(value) in self.ids:
+            track_id = int(value)
+        return track_id
+
+
+def _parse_date(value):
+    """YYYY-MM-DD, YYYYMMDD, or YYYY-MM for monthly reports (first day of the month)."""
+    value = value.strip()
+    if len(value) == 7:
+        value += '-01'
+    elif len(value) == 8 and value.isdigit():
+        value = f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return date.fromisoformat(value)
+
+
+def _columns(header, platform):
+    names = [name.strip().lower() for name in header]
+    columns = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                columns[column] = names.index(alias)
+                break
+    missing = [column for column in COLUMN_ALIASES if column not in columns]
+    if platform and 'platform' in missing:
+        missing.remove('platform')
+    if missing:
+        raise ReportError(f"Missing column(s): {', '.join(missing)} (header: {', '.join(names)})")
+    return columns
+
+
+def _iter_chunks(lines, chunk_size):
+    """Yield [(line_number, row)] chunks of the report's data rows."""
+    rows = iter(lines)
+    line_number = 2
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield [(line_number + offset, row) for offset, row in enumerate(chunk)]
+        line_number += len(chunk)
+
+
+def _parse_chunk(rows, columns, resolver, platform):
+    """Sum the chunk's valid lines per (track_id, platform, date); collect (line, error) for the others."""
+    totals = defaultdict(int)
+    errors = []
+    platform_column = columns.get('platform')
+    for line_number, row in rows:
+        try:
+            identifier = row[columns['track']].strip()
+            track_id = resolver.resolve(identifier)
+            if track_id is None:
+                raise ValueError(f"unknown track {identifier!r}")
+            row_platform = row[platform_column].strip() if platform_column is not None else ''
+            row_platform = row_platform or platform or None
+            if row_platform and len(row_platform) > 100:
+                raise ValueError("platform longer than 100 characters")
+            day = _parse_date(row[columns['date']])
+            count = int(row[columns['streams']].strip())
+            if count < 0:
+                raise ValueError(f"negative stream count {count}")
+            key = (track_id, row_platform, day)
+            if totals[key] + count > MAX_STREAM_COUNT:
+                raise ValueError("stream count too large")
+        except IndexError:
+            errors.append((line_number, "missing columns"))
+        except ValueError as exc:
+            errors.append((line_number, str(exc)))
+        else:
+            totals[key] += count
+    return {key: count for key, count in totals.items() if count}, errors
+
+
+def _copy_text(value):
+    if value is None:
+        return '\\N'
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _copy_chunk(totals):
+    """COPY the chunk into the staging table and merge it into StreamData (PostgreSQL)."""
+    buffer = io.StringIO()
+    for (track_id, platform, day), count in totals.items():
+        buffer.write(f"{track_id}\t{_copy_text(platform)}\t{day.isoformat()}\t{count}\n")
+    copy_sql = f"COPY {STAGING_TABLE} (track_id, platform, date_recorded, stream_count) FROM STDIN"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} ("
+            "track_id bigint NOT NULL, platform varchar(100), date_recorded date NOT NULL, "
+            "stream_count integer NOT NULL)"
+        )
+        cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+        if hasattr(cursor, 'copy_expert'):  # psycopg2
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+        table = connection.ops.quote_name(StreamData._meta.db_table)
+        cursor.execute(
+            f"INSERT INTO {table} "
+            "(track_id, platform, date_recorded, stream_count, fraud_flag, shard, processed_count, paid_microcents) "
+            f"SELECT track_id, platform, date_recorded, stream_count, false, 0, 0, 0 FROM {STAGING_TABLE} "
+            "ORDER BY track_id, platform, date_recorded "
+            f"ON CONFLICT ({', '.join(UNIQUE_COLUMNS)}) DO UPDATE SET "
+            f"stream_count = {table}.stream_count + EXCLUDED.stream_count"
+        )
+
+
+def _insert_chunk(totals):
+    upsert_stream_rows({(track_id, platform, day, False, 0): count
+                        for (track_id, platform, day), count in totals.items()})
+
+
+def iter_stream_report_import(fileobj, platform=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Import a report from the text file object `fileobj` chunk by chunk,
+    yielding a ChunkReport after each chunk is written. `platform` is used
+    for lines without one (or reports without a platform column). Raises
+    ReportError before anything is written if the header is unusable.
+    """
+    first_line = fileobj.readline()
+    if not first_line.strip():
+        raise ReportError("The report is empty")
+    delimiter = '\t' if '\t' in first_line else (';' if first_line.count(';') > first_line.count(',') else ',')
+    reader = csv.reader(itertools.chain([first_line], fileobj), delimiter=delimiter)
+    columns = _columns(next(reader), platform)
+    resolver = TrackResolver()
+    copy = connection.vendor == 'postgresql' and connection.features.supports_nulls_distinct_unique_constraints
+    load = _copy_chunk if copy else _insert_chunk
+
+    for number, rows in enumerate(_iter_chunks(reader, chunk_size), start=1):
+        totals, errors = _parse_chunk(rows, columns, resolver, platform)
+        if totals:
+            with transaction.atomic():
+                stream_totals = defaultdict(int)
+                for (track_id, _, _), count in totals.items():
+                    stream_totals[track_id] += count
+                # Counters before rows: the lock order of distribution (see stream_dedup.add_streams)
+                apply_stream_deltas(stream_totals)
+                load(totals)
+                apply_rollup_deltas({(track_id, row_platform or '', day): (count, 0)
+                                     for (track_id, row_platform, day), count in totals.items()})
+        yield ChunkReport(
+            chunk=number,
+            first_line=rows[0][0],
+            rows=len(rows),
+            imported=len(rows) - len(errors),
+            streams=sum(totals.values()),
+            error_count=len(errors),
+            errors=errors[:MAX_ERRORS_PER_CHUNK],
+        )
+
+
+def import_stream_report(fileobj, platform=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Import a whole report. Returns a summary with the totals and the
+    reports of the chunks that had bad lines.
+    """
+    summary = {
+        "rows_read": 0,
+        "rows_imported": 0,
+        "streams_imported": 0,
+        "error_count": 0,
+        "chunk_errors": [],
+    }
+    for report in iter_stream_report_import(fileobj, platform, chunk_size):
+        summary["rows_read"] += report.rows
+        summary["rows_imported"] += report.imported
+        summary["streams_imported"] += report.streams
+        summary["error_count"] += report.error_count
+        if report.errors:
+            summary["chunk_errors"].append({
+                "chunk": report.chunk,
+                "first_line": report.first_line,
+                "rows": report.rows,
+                "errors": report.errors,
+            })
+    return summary
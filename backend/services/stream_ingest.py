@@ -0,0 +1,160 @@
+"""
+Bulk ingestion of stream events sent as JSON Lines (NDJSON).
+
+Every line is one StreamData row:
+
+    {"track": 12, "platform": "spotify", "stream_count": 300, "date_recorded": "2026-10-01"}
+
+with "isrc" accepted instead of "track" and an optional "fraud_flag". The
+body is read line by line from the request stream, so it is never held in
+memory as a whole. Lines are checked by a plain validator (no serializer
+per row), their tracks are resolved with one query per batch, and every
+batch is added with add_streams() in one transaction: one upserted row
+per (track, platform, date, fraud flag), together with the stream totals
+and daily rollup deltas. Bad lines are rejected with their line number; the
+rest of the body is still ingested.
+
+The streams are distributed by the regular pipeline (pending_tracks()).
+"""
+import json
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Q
+
+from backend.models import Track
+from backend.services.stream_dedup import add_streams
+from backend.services.stream_import import MAX_STREAM_COUNT, normalize_isrc
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_LINE_LENGTH = 4096
+# Rejected lines listed in the summary; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+def iter_lines(stream, max_length=MAX_LINE_LENGTH):
+    """
+    Lines of the binary file object `stream`, read incrementally. A line
+    longer than `max_length` bytes is skipped and yielded as None.
+    """
+    while True:
+        line = stream.readline(max_length + 1)
+        if not line:
+            return
+        if len(line) > max_length and not line.endswith(b'\n'):
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_length + 1)
+            yield None
+        else:
+            yield line
+
+
+def _validate_event(line):
+    """(track_ref, platform, date_recorded, stream_count, fraud_flag) of one line; raises ValueError."""
+    if line is None:
+        raise ValueError(f"line longer than {MAX_LINE_LENGTH} bytes")
+    try:
+        event = json.loads(line)
+    except ValueError:
+        raise ValueError("invalid JSON")
+    if not isinstance(event, dict):
+        raise ValueError("expected a JSON object")
+
+    track, isrc = event.get('track', event.get('track_id')), event.get('isrc')
+    if isinstance(track, int) and not isinstance(track, bool):
+        track_ref = track
+    elif isinstance(isrc, str) and isrc.strip():
+        track_ref = normalize_isrc(isrc)
+    else:
+        raise ValueError("track (id) or isrc is required")
+
+    platform = event.get('platform')
+    if platform is not None and not isinstance(platform, str):
+        raise ValueError("platform must be a string")
+    if platform and len(platform) > 100:
+        raise ValueError("platform longer than 100 characters")
+
+    count = event.get('stream_count')
+    if not isinstance(count, int) or isinstance(count, bool) or not 0 <= count <= MAX_STREAM_COUNT:
+        raise ValueError("stream_count must be a non-negative integer")
+
+    day = event.get('date_recorded')
+    try:
+        day = date.fromisoformat(day)
+    except (TypeError, ValueError):
+        raise ValueError("date_recorded must be a YYYY-MM-DD date")
+
+    fraud_flag = event.get('fraud_flag', False)
+    if not isinstance(fraud_flag, bool):
+        raise ValueError("fraud_flag must be a boolean")
+    return track_ref, platform or None, day, count, fraud_flag
+
+
+def _resolve_tracks(refs, tracks):
+    """{track_ref: track_id} for the refs (ids or ISRCs) found in the `tracks` queryset."""
+    ids = {ref for ref in refs if isinstance(ref, int)}
+    isrcs = refs - ids
+    resolved = {}
+    for track_id, isrc in tracks.filter(Q(id__in=ids) | Q(isrc__in=isrcs)).values_list('id', 'isrc'):
+        if track_id in ids:
+            resolved[track_id] = track_id
+        if isrc in isrcs:
+            resolved[isrc] = track_id
+    return resolved
+
+
+def _ingest_batch(batch, tracks, summary):
+    events, errors = [], []
+    for line_number, line in batch:
+        try:
+            events.append((line_number, _validate_event(line)))
+        except ValueError as exc:
+            errors.append((line_number, str(exc)))
+
+    resolved = _resolve_tracks({event[0] for _, event in events}, tracks)
+    rows = []
+    for line_number, (track_ref, platform, day, count, fraud_flag) in events:
+        track_id = resolved.get(track_ref)
+        if track_id is None:
+            errors.append((line_number, f"unknown track {track_ref!r}"))
+            continue
+        rows.append((track_id, platform, day, count, fraud_flag))
+
+    if rows:
+        with transaction.atomic():
+            add_streams(rows)
+
+    summary['accepted'] += len(rows)
+    summary['rejected'] += len(errors)
+    summary['streams'] += sum(row[3] for row in rows)
+    room = MAX_REPORTED_ERRORS - len(summary['rejected_lines'])
+    summary['rejected_lines'].extend(
+        {'line': line_number, 'error': message} for line_number, message in sorted(errors)[:max(room, 0)]
+    )
+
+
+def ingest_stream_events(lines, tracks=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Ingest NDJSON stream events from the iterable `lines` (see iter_lines),
+    `batch_size` lines per transaction. Only tracks in the `tracks` queryset
+    (default: all tracks) are accepted. Blank lines are ignored.
+
+    Returns {'lines', 'accepted', 'rejected', 'streams', 'rejected_lines',
+    'rejected_lines_truncated'}; rejected_lines lists {'line', 'error'}.
+    """
+    tracks = Track.objects.all() if tracks is None else tracks
+    summary = {'lines': 0, 'accepted': 0, 'rejected': 0, 'streams': 0, 'rejected_lines': []}
+    batch = []
+    for line_number, line in enumerate(lines, start=1):
+        if line is not None and not line.strip():
+            continue
+        batch.append((line_number, line))
+        if len(batch) >= batch_size:
+            _ingest_batch(batch, tracks, summary)
+            summary['lines'] += len(batch)
+            batch = []
+    if batch:
+        _ingest_batch(batch, tracks, summary)
+        summary['lines'] += len(batch)
+    summary['rejected_lines_truncated'] = summary['rejected'] > len(summary['rejected_lines'])
+    return summary
@@ -0,0 +1,198 @@
+"""
+Monthly range partitions of StreamData on PostgreSQL.
+
+Migration 0025 partitions backend_streamdata by date_recorded: the
+pre-existing rows form one "legacy" partition, each later month gets its
+own partition (backend_streamdata_pYYYYMM), and a DEFAULT partition takes
+dates no partition covers. Queries that filter on date_recorded only scan
+the partitions of those dates, and every partition has its own, small
+indexes and vacuum.
+
+`manage.py maintain_stream_partitions` keeps the layout going:
+
+- create_future_partitions() adds the partitions of the coming months
+  (rows of those months already in the DEFAULT partition are moved in);
+- detach_old_partitions() detaches partitions older than the retention
+  period into an archive schema, or drops them. A partition that still
+  holds unpaid streams or unprocessed fraud clawbacks is kept.
+
+Detached streams stay counted in Track.total_valid_streams and in the
+daily rollup; recount_stream_totals and backfill_stream_rollups only see
+the attached rows, so don't run them over detached months.
+"""
+import re
+from collections import namedtuple
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from backend.models import StreamData
+
+DEFAULT_MONTHS_AHEAD = 3
+DEFAULT_ARCHIVE_SCHEMA = 'archive'
+
+# start is None for a partition open to the past (MINVALUE); both are None for the DEFAULT partition
+Partition = namedtuple('Partition', ['name', 'start', 'end', 'is_default'])
+
+_BOUND = re.compile(r"FROM \((MINVALUE|'[\d-]+')\) TO \((MAXVALUE|'[\d-]+')\)")
+
+
+def months_ahead():
+    return getattr(settings, 'STREAM_PARTITION_MONTHS_AHEAD', DEFAULT_MONTHS_AHEAD)
+
+
+def retain_months():
+    """Months of partitions kept attached (None keeps every partition)."""
+    return getattr(settings, 'STREAM_PARTITION_RETAIN_MONTHS', None)
+
+
+def month_start(day, months=0):
+    """First day of the month `months` after (or before) the month of `day`."""
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{StreamData._meta.db_table}_p{month:%Y%m}"
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+                       [StreamData._meta.db_table])
+        return cursor.fetchone() is not None
+
+
+def _parse_bound(value):
+    return None if value in ('MINVALUE', 'MAXVALUE') else date.fromisoformat(value.strip("'"))
+
+
+def list_partitions():
+    """The attached partitions of StreamData, ordered by start date (DEFAULT last)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass",
+            [StreamData._meta.db_table],
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        if bound == 'DEFAULT':
+            partitions.append(Partition(name, None, None, True))
+            continue
+        start, end = _BOUND.search(bound).groups()
+        partitions.append(Partition(name, _parse_bound(start), _parse_bound(end), False))
+    return sorted(partitions, key=lambda p: (p.is_default, p.start or date.min))
+
+
+def _overlaps(partition, start, end):
+    return (not partition.is_default
+            and (partition.start is None or partition.start < end)
+            and (partition.end is None or partition.end > start))
+
+
+def create_month_partition(month, partitions=None):
+    """
+    Create the partition of `month` (a first day of month), moving that
+    month's rows out of the DEFAULT partition. Returns the number of rows moved.
+    """
+    table = StreamData._meta.db_table
+    start, end = month, month_start(month, 1)
+    partitions = list_partitions() if partitions is None else partitions
+    default = next((p.name for p in partitions if p.is_default), None)
+    moved = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        if default:
+            # A new partition may not overlap rows already in the DEFAULT partition
+            cursor.execute(
+                "CREATE TEMPORARY TABLE stream_partition_moved ON COMMIT DROP AS "
+                f"WITH moved AS (DELETE FROM {default} WHERE date_recorded >= %s AND date_recorded < %s "
+                "RETURNING *) SELECT * FROM moved",
+                [start, end],
+            )
+        cursor.execute(f"CREATE TABLE {partition_name(month)} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+                       [start, end])
+        if default:
+            cursor.execute(f"INSERT INTO {table} SELECT * FROM stream_partition_moved")
+            moved = cursor.rowcount
+            # ON COMMIT DROP waits for the outermost transaction; the next month reuses the name
+            cursor.execute("DROP TABLE stream_partition_moved")
+    return moved
+
+
+def create_future_partitions(ahead=None, today=None, dry_run=False):
+    """
+    Make sure the current month and the `ahead` next months have a
+    partition. Returns [(partition name, rows moved from DEFAULT)].
+    """
+    ahead = months_ahead() if ahead is None else ahead
+    today = today or date.today()
+    partitions = list_partitions()
+    created = []
+    for offset in range(ahead + 1):
+        month = month_start(today, offset)
+        if any(_overlaps(p, month, month_start(month, 1)) for p in partitions):
+            continue
+        moved = 0 if dry_run else create_month_partition(month, partitions)
+        created.append((partition_name(month), moved))
+        partitions.append(Partition(partition_name(month), month, month_start(month, 1), False))
+    return created
+
+
+def _pending_work(name):
+    """Why partition `name` can't be detached yet, or None."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {name} WHERE NOT fraud_flag AND stream_count > processed_count), "
+            f"EXISTS (SELECT 1 FROM {name} WHERE fraud_flag AND processed_count > 0)"
+        )
+        unpaid, clawback = cursor.fetchone()
+    if unpaid:
+        return "has undistributed streams"
+    if clawback:
+        return "has fraud streams waiting for clawback"
+    return None
+
+
+def detach_old_partitions(retain=None, today=None, archive_schema=DEFAULT_ARCHIVE_SCHEMA, drop=False,
+                          dry_run=False):
+    """
+    Detach every partition whose dates all lie before the last `retain`
+    months (the current month included), then move it into
+    `archive_schema` (without its foreign keys) or drop it. Returns (detached names, [(name, reason)]
+    of partitions kept).
+    """
+    retain = retain_months() if retain is None else retain
+    if retain is None:
+        return [], []
+    cutoff = month_start(today or date.today(), 1 - retain)
+    table = StreamData._meta.db_table
+    detached, kept = [], []
+    for partition in list_partitions():
+        if partition.is_default or partition.end is None or partition.end > cutoff:
+            continue
+        reason = _pending_work(partition.name)
+        if reason:
+            kept.append((partition.name, reason))
+            continue
+        detached.append(partition.name)
+        if dry_run:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {partition.name}")
+            # Archived rows must not keep tracks from being deleted
+            cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                           [partition.name])
+            for (constraint,) in cursor.fetchall():
+                cursor.execute(f"ALTER TABLE {partition.name} DROP CONSTRAINT {constraint}")
+            if drop:
+                cursor.execute(f"DROP TABLE {partition.name}")
+            else:
+                schema = connection.ops.quote_name(archive_schema)
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+                cursor.execute(f"ALTER TABLE {partition.name} SET SCHEMA {schema}")
+    return detached, kept
@@ -0,0 +1,165 @@
+"""
+Incremental daily rollup of StreamData (StreamDailyRollup).
+
+Every StreamData write is turned into (valid, fraud) stream deltas per
+(track, platform, day) and added to the rollup with one
+INSERT ... ON CONFLICT DO UPDATE, in the writer's transaction:
+
+- single-row saves and deletes (including fraud re-flagging) by the
+  StreamData signals in backend/signals.py;
+- bulk writes (stream report imports, NDJSON ingestion) by their callers,
+  next to apply_stream_deltas().
+
+Keys are upserted in sorted order, so concurrent writers lock rollup rows
+in the same order. Sharded increments (stream_dedup.add_streams) write to
+one of several `shard` rows of their day instead of queuing on one;
+fold_rollup_shards() sums past days back into shard 0. rebuild_rollups()
+recomputes a date range from StreamData (`manage.py
+backfill_stream_rollups`). Stream totals and charts read the rollup, so
+their cost grows with the number of days, not rows.
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.db import connection, transaction
+from django.db.models import Min, Max, Sum
+from django.db.models.functions import TruncMonth
+
+from backend.models import StreamData, StreamDailyRollup
+
+UPSERT_BATCH_SIZE = 500
+
+GROUP_BY_DAY = 'day'
+GROUP_BY_MONTH = 'month'
+GROUP_BY_PLATFORM = 'platform'
+GROUP_BY_CHOICES = (GROUP_BY_DAY, GROUP_BY_MONTH, GROUP_BY_PLATFORM)
+
+
+def rollup_deltas(added=(), removed=()):
+    """
+    {(track_id, platform, date): (valid, fraud)} of StreamData rows given
+    as (track_id, platform, date_recorded, stream_count, fraud_flag) tuples.
+    Keys whose deltas cancel out are dropped.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for rows, sign in ((added, 1), (removed, -1)):
+        for track_id, platform, day, stream_count, fraud_flag in rows:
+            totals[(track_id, platform or '', day)][1 if fraud_flag else 0] += sign * int(stream_count or 0)
+    return {key: tuple(values) for key, values in totals.items() if any(values)}
+
+
+def apply_rollup_deltas(deltas, shard=0):
+    """
+    Add {(track_id, platform, date): (valid, fraud)} to the rollup rows of
+    `shard`, creating missing rows.
+    """
+    if not deltas:
+        return
+    table = connection.ops.quote_name(StreamDailyRollup._meta.db_table)
+    rows = [(*key, shard, valid, fraud) for key, (valid, fraud) in sorted(deltas.items())]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            params = [value for row in batch for value in row]
+            cursor.execute(
+                f"INSERT INTO {table} (track_id, platform, date, shard, valid_streams, fraud_streams) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(batch))} "
+                "ON CONFLICT (track_id, platform, date, shard) DO UPDATE SET "
+                f"valid_streams = {table}.valid_streams + EXCLUDED.valid_streams, "
+                f"fraud_streams = {table}.fraud_streams + EXCLUDED.fraud_streams",
+                params,
+            )
+
+
+def apply_rollup_rows(added=(), removed=(), shard=0):
+    """Add the StreamData rows `added` to the rollup and subtract `removed` (see rollup_deltas)."""
+    apply_rollup_deltas(rollup_deltas(added, removed), shard)
+
+
+def fold_rollup_shards(track_ids, before):
+    """
+    Sum the shard rows of `track_ids`' days before `before` into shard 0.
+    The caller holds the tracks' locks. Returns the number of rows folded away.
+    """
+    track_ids = list(track_ids)
+    stale = StreamDailyRollup.objects.filter(track_id__in=track_ids, date__lt=before, shard__gt=0)
+    if not track_ids or not stale.exists():
+        return 0
+    table = connection.ops.quote_name(StreamDailyRollup._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (track_id, platform, date, shard, valid_streams, fraud_streams) "
+            "SELECT track_id, platform, date, 0, SUM(valid_streams), SUM(fraud_streams) "
+            f"FROM {table} WHERE shard > 0 AND date < %s AND track_id IN ({', '.join(['%s'] * len(track_ids))}) "
+            "GROUP BY track_id, platform, date ORDER BY track_id, platform, date "
+            "ON CONFLICT (track_id, platform, date, shard) DO UPDATE SET "
+            f"valid_streams = {table}.valid_streams + EXCLUDED.valid_streams, "
+            f"fraud_streams = {table}.fraud_streams + EXCLUDED.fraud_streams",
+            [before, *track_ids],
+        )
+    return stale.delete()[0]
+
+
+def rebuild_rollups(date_from, date_to):
+    """
+    Recompute the rollup of days date_from..date_to (inclusive) from
+    StreamData in one transaction. Returns the number of rollup rows written.
+    Exact for days that no StreamData write touches while they are rebuilt;
+    rebuilding a range again repairs it.
+    """
+    table = connection.ops.quote_name(StreamDailyRollup._meta.db_table)
+    source = connection.ops.quote_name(StreamData._meta.db_table)
+    with transaction.atomic():
+        StreamDailyRollup.objects.filter(date__gte=date_from, date__lte=date_to).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (track_id, platform, date, shard, valid_streams, fraud_streams) "
+                "SELECT track_id, COALESCE(platform, ''), date_recorded, 0, "
+                "SUM(CASE WHEN fraud_flag THEN 0 ELSE stream_count END), "
+                "SUM(CASE WHEN fraud_flag THEN stream_count ELSE 0 END) "
+                f"FROM {source} WHERE date_recorded >= %s AND date_recorded <= %s "
+                "GROUP BY track_id, COALESCE(platform, ''), date_recorded "
+                "ON CONFLICT (track_id, platform, date, shard) DO UPDATE SET "
+                f"valid_streams = {table}.valid_streams + EXCLUDED.valid_streams, "
+                f"fraud_streams = {table}.fraud_streams + EXCLUDED.fraud_streams",
+                [date_from, date_to],
+            )
+            return cursor.rowcount
+
+
+def stream_date_bounds():
+    """(first, last) date_recorded in StreamData, or (None, None) when empty."""
+    bounds = StreamData.objects.aggregate(first=Min('date_recorded'), last=Max('date_recorded'))
+    return bounds['first'], bounds['last']
+
+
+def stream_series(track_ids, date_from=None, date_to=None, group_by=GROUP_BY_DAY):
+    """
+    Valid and fraud streams of `track_ids` (ids or an id queryset) from the
+    rollup, per day, month or platform. Returns {'valid_streams',
+    'fraud_streams', 'series'}; the series is ordered by its key and skips
+    keys without streams.
+    """
+    rollups = StreamDailyRollup.objects.filter(track_id__in=track_ids)
+    if date_from:
+        rollups = rollups.filter(date__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(date__lte=date_to)
+    if group_by == GROUP_BY_MONTH:
+        rollups = rollups.annotate(month=TruncMonth('date'))
+    key = {GROUP_BY_DAY: 'date', GROUP_BY_MONTH: 'month', GROUP_BY_PLATFORM: 'platform'}[group_by]
+    series = list(
+        rollups.order_by().values(key)
+        .annotate(valid_streams=Sum('valid_streams'), fraud_streams=Sum('fraud_streams'))
+        # Rows emptied by deletes stay in the rollup until it is rebuilt
+        .exclude(valid_streams=0, fraud_streams=0)
+        .order_by(key)
+    )
+    for point in series:
+        if isinstance(point[key], date):
+            point[key] = point[key].isoformat()
+    return {
+        'valid_streams': sum(point['valid_streams'] for point in series),
+        'fraud_streams': sum(point['fraud_streams'] for point in series),
+        'series': series,
+    }
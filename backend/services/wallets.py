@@ -0,0 +1,165 @@
+"""
+Wallet balance updates.
+
+Wallet.balance is changed with set-based UPDATEs. With WALLET_BALANCE_SHARDS
+set to K > 1, credits are instead added to one of K WalletBalanceShard rows
+of the wallet, picked at random, so concurrent distributions to the same
+hot wallet lock different rows. Debits still go to the Wallet row, which
+withdrawals lock anyway. A wallet's balance is then Wallet.balance plus its
+shards (Wallet.effective_balance, with_shard_balance());
+compact_balance_shards() folds the shards back into Wallet.balance.
+"""
+import operator
+import random
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from backend.models import Wallet, WalletBalanceShard
+
+# Wallets folded per transaction by compact_balance_shards
+COMPACT_BATCH_SIZE = 500
+
+_ZERO = Value(Decimal('0.00'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def balance_shard_count():
+    return getattr(settings, 'WALLET_BALANCE_SHARDS', 0)
+
+
+def wallet_ids_for_users(user_ids):
+    """
+    Map user id -> wallet id for every user, creating missing wallets in one INSERT.
+    """
+    user_ids = set(user_ids)
+    wallet_ids = dict(Wallet.objects.filter(user_id__in=user_ids).values_list('user_id', 'id'))
+    missing = user_ids - set(wallet_ids)
+    if missing:
+        Wallet.objects.bulk_create([Wallet(user_id=user_id) for user_id in missing], ignore_conflicts=True)
+        wallet_ids.update(Wallet.objects.filter(user_id__in=missing).values_list('user_id', 'id'))
+    return wallet_ids
+
+
+def with_shard_balance(wallets=None):
+    """Annotate wallets with `shard_balance`, the sum of their balance shards, in one query."""
+    wallets = Wallet.objects.all() if wallets is None else wallets
+    shards = (
+        WalletBalanceShard.objects.filter(wallet=OuterRef('pk'))
+        .order_by()
+        .values('wallet')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return wallets.annotate(shard_balance=Coalesce(Subquery(shards), _ZERO))
+
+
+def _add_to_balances(totals):
+    Wallet.objects.filter(id__in=totals.keys()).update(
+        balance=Case(
+            *[When(id=wallet_id, then=F('balance') + Value(delta)) for wallet_id, delta in totals.items()],
+            default=F('balance'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        last_updated=timezone.now(),
+    )
+
+
+def _add_to_shards(totals, shards):
+    """Add each wallet's credit to one randomly chosen shard, creating shard rows on first use."""
+    picks = {wallet_id: random.randrange(shards) for wallet_id in totals}
+    WalletBalanceShard.objects.bulk_create(
+        [WalletBalanceShard(wallet_id=wallet_id, shard=shard) for wallet_id, shard in picks.items()],
+        ignore_conflicts=True,
+    )
+    WalletBalanceShard.objects.filter(
+        reduce(operator.or_, [Q(wallet_id=wallet_id, shard=shard) for wallet_id, shard in picks.items()])
+    ).update(
+        amount=Case(
+            *[When(wallet_id=wallet_id, then=F('amount') + Value(delta)) for wallet_id, delta in totals.items()],
+            default=F('amount'),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def credit_wallets(deltas):
+    """
+    Apply many (wallet_id, delta) pairs to wallet balances in one statement:
+
+        UPDATE wallet SET balance = balance + CASE id WHEN ... END, last_updated = now
+        WHERE id IN (...)
+
+    `deltas` is a dict {wallet_id: Decimal} or an iterable of (wallet_id, Decimal)
+    pairs; repeated wallet ids are summed and negative deltas debit the wallet.
+    The increment happens inside the database, so concurrent credits to the same
+    wallet never overwrite each other. In sharded mode (WALLET_BALANCE_SHARDS)
+    positive deltas go to a balance shard instead.
+
+    Returns {wallet_id: new_balance} (including balance shards).
+    """
+    if isinstance(deltas, dict):
+        deltas = deltas.items()
+    totals = defaultdict(Decimal)
+    for wallet_id, delta in deltas:
+        totals[wallet_id] += Decimal(delta)
+    if not totals:
+        return {}
+
+    shards = balance_shard_count()
+    credits = {wallet_id: delta for wallet_id, delta in totals.items() if delta > 0} if shards > 1 else {}
+    debits = {wallet_id: delta for wallet_id, delta in totals.items() if wallet_id not in credits}
+    with transaction.atomic():
+        # Shards before wallet rows: the same lock order as compact_balance_shards
+        if credits:
+            _add_to_shards(credits, shards)
+        if debits:
+            _add_to_balances(debits)
+        # The UPDATEs hold the row locks, so this reads our own writes
+        return {
+            wallet.id: wallet.effective_balance
+            for wallet in with_shard_balance(Wallet.objects.filter(id__in=totals.keys()).only('id', 'balance'))
+        }
+
+
+def compact_balance_shards(batch_size=COMPACT_BATCH_SIZE):
+    """
+    Fold every non-zero balance shard into its Wallet.balance, one batch of
+    wallets per transaction. Returns the number of wallets compacted.
+    """
+    compacted = 0
+    last_wallet_id = 0
+    while True:
+        with transaction.atomic():
+            wallet_ids = list(
+                WalletBalanceShard.objects.filter(wallet_id__gt=last_wallet_id)
+                .exclude(amount=0)
+                .order_by('wallet_id')
+                .values_list('wallet_id', flat=True)
+                .distinct()[:batch_size]
+            )
+            if not wallet_ids:
+                return compacted
+            last_wallet_id = wallet_ids[-1]
+
+            rows = list(
+                WalletBalanceShard.objects.select_for_update()
+                .filter(wallet_id__in=wallet_ids)
+                .exclude(amount=0)
+                .order_by('id')
+                .values_list('id', 'wallet_id', 'amount')
+            )
+            totals = defaultdict(Decimal)
+            for _, wallet_id, amount in rows:
+                totals[wallet_id] += amount
+            WalletBalanceShard.objects.filter(id__in=[row_id for row_id, _, _ in rows]).update(
+                amount=Decimal('0.00'), updated_at=timezone.now()
+            )
+            _add_to_balances(totals)
+            compacted += len(totals)
@@ -1,8 +1,15 @@
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 
-from .models import UserAccount, Wallet, Track
-from .royalty_service import distribute_royalty_for_track
+from .models import UserAccount, Wallet, Track, StreamData, RateCard, SplitGroupMember
+from .services import split_table
+from .services.jobs import enqueue
+from .services.rate_cards import invalidate_rate_index
+from .services.stream_counters import apply_stream_deltas, valid_stream_count
+from .services.stream_rollups import apply_rollup_rows
+from .tasks import DISTRIBUTE_TRACK, SPLIT_SETTLE_DELAY
 
 
 @receiver(post_save, sender=UserAccount)
@@ -19,42 +26,119 @@ def create_user_wallet(sender, instance, created, **kwargs):
 def auto_distribute_royalties(sender, instance, created, **kwargs):
     """
     Track yaradıldıqdan sonra və splits tapılmışsa,
-    avtomatik olaraq royalty-ni bölüb payouts yaradır.
+    royalty bölgüsü üçün background job növbəyə qoyur (backend/tasks.py).
     """
     if created:
         # Track-in splits-ləri var-mı yoxla
         if instance.splits.exists():
-            try:
-                distribute_royalty_for_track(instance)
-            except Exception as e:
-                # Log error but don't break track creation
-                print(f"Error distributing royalties for track {instance.id}: {e}")
+            _enqueue_track_distribution(instance.id)
 
 
 # If splits are added after the track is created (frontend often creates track first,
 # then posts splits), listen for Split creation and distribute royalties if not done yet.
-from .models import Split, Royalty
+from .models import Split
+
+
+def _enqueue_track_distribution(track_id):
+    """
+    Queue the initial distribution; one queued job per track at a time. The
+    short delay lets the remaining splits of the same upload arrive first.
+    """
+    enqueue(DISTRIBUTE_TRACK, {'track_id': track_id}, dedupe_key=f'{DISTRIBUTE_TRACK}:{track_id}',
+            run_at=timezone.now() + SPLIT_SETTLE_DELAY)
+
+
+def _bump_splits_version(track_ids):
+    track_ids = list(track_ids)
+    Track.objects.filter(id__in=track_ids).update(splits_version=F('splits_version') + 1)
+    for track_id in track_ids:
+        split_table.invalidate_track(track_id)
+
+
+# Registered before distribute_on_split_creation so that distribution sees the new split.
+@receiver(post_save, sender=Split)
+@receiver(post_delete, sender=Split)
+def invalidate_split_table(sender, instance, **kwargs):
+    """
+    Drop the compiled split table of the split's track. The version bump
+    also invalidates the cached table in other processes.
+    """
+    _bump_splits_version([instance.track_id])
+
+
+@receiver(post_save, sender=UserAccount)
+def invalidate_split_tables_for_user(sender, instance, created, update_fields=None, **kwargs):
+    """Split tables carry the collaborator's email; refresh them when it may have changed."""
+    if created or (update_fields is not None and 'email' not in update_fields):
+        return
+    _bump_splits_version(split_table.tracks_using_users([instance.id]))
+
+
+@receiver(post_save, sender=SplitGroupMember)
+@receiver(post_delete, sender=SplitGroupMember)
+def invalidate_split_tables_for_group(sender, instance, **kwargs):
+    """Every track whose split tree contains the group has to be flattened again."""
+    _bump_splits_version(split_table.tracks_using_users([instance.group_id]))
+
+
+@receiver(post_delete, sender=Wallet)
+def invalidate_split_tables_for_wallet(sender, instance, **kwargs):
+    # Split tables carry wallet ids; wallet deletion is rare, so drop everything
+    split_table.clear_cache()
+
+
+@receiver(post_save, sender=RateCard)
+@receiver(post_delete, sender=RateCard)
+def invalidate_rate_cards(sender, instance, **kwargs):
+    """Rebuild the in-memory rate card index on next use."""
+    invalidate_rate_index()
 
 
 @receiver(post_save, sender=Split)
 def distribute_on_split_creation(sender, instance, created, **kwargs):
-    try:
-        if not created:
-            return
-
-        track = instance.track
-        if not track:
-            return
-
-        # If royalties already exist for this track, don't distribute again
-        if Royalty.objects.filter(track=track).exists():
-            return
-
-        # Only distribute when track has at least one split (it does now)
-        if track.splits.exists():
-            try:
-                distribute_royalty_for_track(track)
-            except Exception as e:
-                print(f"Error distributing royalties on split create for track {track.id}: {e}")
-    except Exception as e:
-        print(f"Error in distribute_on_split_creation signal: {e}")
+    # The job skips tracks that already have royalties or nothing to distribute
+    if created:
+        _enqueue_track_distribution(instance.track_id)
+
+
+# =====================================================
+# Track.total_valid_streams counter and daily rollup
+# =====================================================
+def _stream_row(instance):
+    """(track_id, platform, date_recorded, stream_count, fraud_flag) of a StreamData instance."""
+    day = StreamData._meta.get_field('date_recorded').to_python(instance.date_recorded)
+    return instance.track_id, instance.platform, day, instance.stream_count, instance.fraud_flag
+
+
+@receiver(pre_save, sender=StreamData)
+def remember_previous_stream_count(sender, instance, raw=False, **kwargs):
+    """Keep the row's previous values so post_save can apply the difference."""
+    instance._previous_stream_row = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._previous_stream_row = StreamData.objects.filter(pk=instance.pk).values_list(
+        'track_id', 'platform', 'date_recorded', 'stream_count', 'fraud_flag'
+    ).first()
+
+
+@receiver(post_save, sender=StreamData)
+def update_stream_total_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    row = _stream_row(instance)
+    deltas = {instance.track_id: valid_stream_count(instance.stream_count, instance.fraud_flag)}
+    previous = getattr(instance, '_previous_stream_row', None)
+    if previous:
+        track_id, _, _, stream_count, fraud_flag = previous
+        deltas[track_id] = deltas.get(track_id, 0) - valid_stream_count(stream_count, fraud_flag)
+    apply_stream_deltas(deltas)
+    apply_rollup_rows(added=[row], removed=[previous] if previous else [])
+
+
+@receiver(post_delete, sender=StreamData)
+def update_stream_total_on_delete(sender, instance, origin=None, **kwargs):
+    # Rows deleted together with their track take the counter and rollup with them
+    if isinstance(origin, Track) or getattr(origin, 'model', None) is Track:
+        return
+    apply_stream_deltas({instance.track_id: -valid_stream_count(instance.stream_count, instance.fraud_flag)})
+    apply_rollup_rows(removed=[_stream_row(instance)])
@@ -0,0 +1,59 @@
+"""
+Background job handlers, run by `manage.py run_workers`
+(see backend/services/jobs.py).
+"""
+import csv
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from backend.models import Royalty, StreamReportImport, Track
+from backend.royalty_service import distribute_royalty_for_track
+from backend.services.jobs import job_handler
+from backend.services.stream_import import ReportError, import_stream_report, open_report
+
+DISTRIBUTE_TRACK = 'distribute_track'
+# Initial distribution waits this long after the first split of a track
+SPLIT_SETTLE_DELAY = timedelta(seconds=10)
+IMPORT_STREAM_REPORT = 'import_stream_report'
+
+
+@job_handler(DISTRIBUTE_TRACK)
+def distribute_track(payload):
+    """
+    Initial distribution of a track's uploader-defined payout_amount, once
+    the track has splits. Skipped if the track is gone, has no payout
+    amount or splits yet, or was already distributed.
+    """
+    track = Track.objects.filter(pk=payload['track_id']).first()
+    if track is None or not track.payout_amount or track.payout_amount <= 0:
+        return
+    if not track.splits.exists() or Royalty.objects.filter(track=track).exists():
+        return
+    distribute_royalty_for_track(track)
+
+
+@job_handler(IMPORT_STREAM_REPORT)
+def import_uploaded_stream_report(payload):
+    """
+    Import a report uploaded through /api/stream-reports/. The import runs
+    inside the job's transaction, so an interrupted attempt leaves no rows
+    behind and the retry starts over. A malformed report is marked failed.
+    """
+    report = StreamReportImport.objects.filter(pk=payload['import_id'], status=StreamReportImport.QUEUED).first()
+    if report is None:
+        return
+    try:
+        with transaction.atomic(), open_report(report.file.open('rb'), report.file.name) as text:
+            summary = import_stream_report(text, report.platform or None)
+    except (ReportError, UnicodeDecodeError, csv.Error) as exc:
+        report.status = StreamReportImport.FAILED
+        report.error_count += 1
+        report.chunk_errors = [{"chunk": None, "first_line": None, "rows": 0, "errors": [[None, str(exc)]]}]
+    else:
+        report.status = StreamReportImport.DONE
+        for field, value in summary.items():
+            setattr(report, field, value)
+    report.finished_at = timezone.now()
+    report.save()
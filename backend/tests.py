@@ -1,3 +1,594 @@
-from django.test import TestCase
+import io
+import os
+import random
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from backend.models import (
+    Job, LedgerEntry, Payout, PayoutStatus, RateCard, Royalty, Split, SplitGroupMember, StreamDailyRollup,
+    StreamData, Track, TrackStreamCounterShard, UserAccount, Wallet, WalletAccrual,
+)
+from backend.royalty_service import (
+    claw_back_fraud_streams, clawback_queue, distribute_pending_tracks, distribute_royalty_for_track,
+    distribute_royalty_from_streams, pending_tracks,
+)
+from backend.services.accruals import accrue_payouts
+from backend.services.coalescing import due_tracks, record_increment
+from backend.services.jobs import enqueue, job_handler, run_pending_jobs
+from backend.services.ledger import ledger_balance, post_ledger_entries, take_snapshots, unreconciled_wallets
+from backend.services.royalty_math import allocate, allocate_batch, split_amount, split_amount_batch
+from backend.services.royalty_preview import preview_distribution
+from backend.services.split_table import clear_cache, get_split_table
+from backend.services.stream_counters import with_exact_stream_total
+from backend.services.stream_dedup import add_streams, compact_stream_data
+from backend.services.stream_import import import_stream_report
+from backend.services.stream_partitions import detach_old_partitions, month_start, partition_name
+from backend.services.stream_rollups import rebuild_rollups, stream_series
+from backend.tasks import DISTRIBUTE_TRACK
+
+
+def _create_users(count):
+    return [UserAccount.objects.create_user(email=f'user{i}@example.com', name=f'user{i}', password='pw')
+            for i in range(count)]
+
+
+def _create_track(owner, splits, **fields):
+    track = Track.objects.create(title='Track', owner=owner, **fields)
+    for user, percentage in splits:
+        Split.objects.create(track=track, user=user, percentage=percentage)
+    return track
+
+
+def _wallet_balances():
+    # Collaborators are credited their net shares (2% platform fee)
+    return sum(Wallet.objects.values_list('balance', flat=True))
+
+
+class DistributionTests(TestCase):
+    def setUp(self):
+        self.users = _create_users(3)
+
+    def test_bulk_distribution_pays_each_track_once(self):
+        for streams in (10_000, 5000):
+            track = _create_track(self.users[0], [(self.users[1], 60), (self.users[2], 40)])
+            StreamData.objects.create(track=track, platform='a', stream_count=streams, date_recorded=date(2026, 7, 1))
+
+        first = distribute_pending_tracks(batch_size=1)
+        self.assertEqual((first['tracks_processed'], first['total_earning']), (2, Decimal('45.00')))
+        self.assertEqual(distribute_pending_tracks()['tracks_processed'], 0)
+        self.assertEqual(_wallet_balances(), Decimal('44.10'))
+        self.assertFalse(unreconciled_wallets().exists())
+
+    def test_failed_payout_amount_distribution_writes_nothing(self):
+        track = _create_track(self.users[0], [(self.users[1], 100)], payout_amount=Decimal('10.00'))
+        with mock.patch('backend.royalty_service._post_shares', side_effect=RuntimeError('ledger down')):
+            with self.assertRaises(RuntimeError):
+                distribute_royalty_for_track(track)
+        self.assertFalse(Royalty.objects.exists())
+
+
+class SplitTableCacheTests(TestCase):
+    def setUp(self):
+        # Test databases reuse track ids: start from an empty cache
+        clear_cache()
+        self.users = _create_users(3)
+        self.track = _create_track(self.users[0], [(self.users[1], 60), (self.users[2], 40)])
+
+    def _table(self):
+        return [(entry.user_id, entry.basis_points) for entry in get_split_table(Track.objects.get(pk=self.track.pk))]
+
+    def test_table_is_cached_until_a_split_changes(self):
+        self.assertEqual(self._table(), [(self.users[1].id, 6000), (self.users[2].id, 4000)])
+        track = Track.objects.get(pk=self.track.pk)
+        with self.assertNumQueries(0):
+            get_split_table(track)
+
+        split = Split.objects.get(user=self.users[2])
+        split.percentage = 30
+        split.save()
+        self.assertEqual(self._table(), [(self.users[1].id, 6000), (self.users[2].id, 3000)])
+
+        Split.objects.get(user=self.users[1]).delete()
+        self.assertEqual(self._table(), [(self.users[2].id, 3000)])
+
+    def test_email_change_refreshes_the_table(self):
+        self._table()
+        self.users[1].email = 'renamed@example.com'
+        self.users[1].save()
+        emails = [entry.user_email for entry in get_split_table(Track.objects.get(pk=self.track.pk))]
+        self.assertEqual(emails, ['renamed@example.com', 'user2@example.com'])
+
+    def test_version_bump_from_another_process_misses_the_cache(self):
+        self._table()
+        # Writes that skip the signals, as another process's would for this cache
+        Split.objects.filter(user=self.users[2]).update(percentage=10)
+        Track.objects.filter(pk=self.track.pk).update(splits_version=F('splits_version') + 1)
+        self.assertEqual(self._table(), [(self.users[1].id, 6000), (self.users[2].id, 1000)])
+
+
+class RoyaltyMathTests(SimpleTestCase):
+    """The largest-remainder kernel never creates or loses a cent."""
+
+    def test_allocate_sums_to_total(self):
+        self.assertEqual(allocate(100, [1, 1, 1]), [34, 33, 33])
+        self.assertEqual(allocate(-100, [1, 1, 1]), [-34, -33, -33])
+        self.assertEqual(allocate(0, [1, 2]), [0, 0])
+        rng = random.Random(5)
+        for _ in range(200):
+            weights = [rng.randint(0, 10_000) for _ in range(rng.randint(1, 12))]
+            total = rng.randint(-10**9, 10**9)
+            shares = allocate(total, weights)
+            self.assertEqual(sum(shares), total if sum(weights) else 0)
+
+    def test_allocate_with_denominator_floors_the_allocated_part(self):
+        # 60% of 101 cents: 60.6 is floored, the rest stays unallocated
+        self.assertEqual(allocate(101, [4000, 2000], 10_000), [40, 20])
+
+    def test_split_amount_conserves_cents(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            basis_points = allocate(10_000, [rng.randint(1, 100) for _ in range(rng.randint(1, 8))])
+            total = rng.randint(-10**7, 10**7)
+            gross, fee, net = split_amount(total, basis_points, 200)
+            self.assertEqual(sum(gross), total)
+            self.assertEqual([g - f for g, f in zip(gross, fee)], net)
+            self.assertEqual(sum(fee) + sum(net), total)
+
+    def test_batch_kernel_matches_scalar_kernel(self):
+        rng = np.random.default_rng(11)
+        sizes = rng.integers(1, 6, size=50)
+        groups = np.repeat(np.arange(len(sizes)), sizes)
+        totals = rng.integers(-10**6, 10**6, size=len(sizes))
+        weights = rng.integers(1, 5000, size=len(groups))
+
+        shares = allocate_batch(totals, groups, weights)
+        gross, fee, net = split_amount_batch(totals, groups, weights, 200)
+        for group, total in enumerate(totals.tolist()):
+            entries = groups == group
+            self.assertEqual(shares[entries].tolist(), allocate(total, weights[entries].tolist()))
+            self.assertEqual(
+                (gross[entries].tolist(), fee[entries].tolist(), net[entries].tolist()),
+                split_amount(total, weights[entries].tolist(), 200),
+            )
+        self.assertEqual(int(shares.sum()), int(totals.sum()))
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.wallet = Wallet.objects.get(user=_create_users(1)[0])
+
+    def _post(self, *amounts):
+        post_ledger_entries([LedgerEntry(wallet=self.wallet, entry_type=LedgerEntry.CREDIT, amount=Decimal(amount))
+                             for amount in amounts])
+
+    def test_balance_follows_the_ledger_across_snapshots(self):
+        self._post('10.25', '-0.25')
+        LedgerEntry.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(take_snapshots(), 1)
+        self._post('5.00')
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('15.00'))
+        self.assertEqual(ledger_balance(self.wallet), Decimal('15.00'))
+        self.assertFalse(unreconciled_wallets().exists())
+
+    def test_balance_change_outside_the_ledger_is_unreconciled(self):
+        self._post('3.00')
+        Wallet.objects.filter(pk=self.wallet.pk).update(balance=Decimal('4.00'))
+        self.assertEqual(list(unreconciled_wallets().values_list('id', flat=True)), [self.wallet.id])
+
+    def test_entries_are_append_only(self):
+        self._post('1.00')
+        with self.assertRaises(ValueError):
+            LedgerEntry.objects.get().save()
+
+
+class AccrualTests(TestCase):
+    def setUp(self):
+        self.wallet = Wallet.objects.get(user=_create_users(1)[0])
+        self.status = PayoutStatus.objects.create(status_name='Pending')
+
+    def test_small_shares_accrue_until_the_payout_minimum(self):
+        for _ in range(3):
+            self.assertEqual(accrue_payouts([(self.wallet.id, Decimal('0.30'))], self.status), {})
+        self.assertEqual(WalletAccrual.objects.get(wallet=self.wallet).amount, Decimal('0.90'))
+
+        payouts = accrue_payouts([(self.wallet.id, Decimal('0.15')), (self.wallet.id, Decimal('0.10'))], self.status)
+        self.assertEqual(payouts[self.wallet.id].amount, Decimal('1.15'))
+        self.assertEqual(WalletAccrual.objects.get(wallet=self.wallet).amount, Decimal('0.00'))
+        self.assertEqual(Payout.objects.count(), 1)
+
+
+class StreamDistributionTests(TestCase):
+    def setUp(self):
+        users = _create_users(3)
+        self.track = _create_track(users[0], [(users[1], 60), (users[2], 40)])
+        self.day = date(2026, 7, 1)
+
+    def test_distribution_pays_each_stream_once(self):
+        StreamData.objects.create(track=self.track, platform='spotify', stream_count=10_000, date_recorded=self.day)
+        first = distribute_royalty_from_streams(self.track)
+        # A stale instance must not pay again: the locked row decides
+        second = distribute_royalty_from_streams(self.track)
+
+        self.assertEqual(first['total_earning'], Decimal('30.00'))
+        self.assertIsNone(second['royalty_id'])
+        self.assertEqual(Track.objects.get(pk=self.track.pk).processed_streams, 10_000)
+        self.assertEqual(_wallet_balances(), Decimal('29.40'))
+        self.assertFalse(unreconciled_wallets().exists())
+
+
+class RateCardPricingTests(TestCase):
+    def setUp(self):
+        users = _create_users(3)
+        self.track = _create_track(users[0], [(users[1], 60), (users[2], 40)])
+        self.day = date(2026, 7, 1)
+
+    def test_card_of_the_rows_period_applies(self):
+        RateCard.objects.create(platform='spotify', rate_per_stream=Decimal('0.004'), effective_from=date(2026, 1, 1))
+        RateCard.objects.create(platform='spotify', rate_per_stream=Decimal('0.005'), effective_from=date(2026, 7, 1),
+                                effective_to=date(2026, 7, 31))
+        for day in (date(2026, 6, 30), self.day, date(2026, 8, 1)):
+            StreamData.objects.create(track=self.track, platform='spotify', stream_count=1000, date_recorded=day)
+        self.assertEqual(distribute_royalty_from_streams(self.track)['total_earning'], Decimal('13.00'))
+
+    def test_sub_cent_streams_are_processed_and_carried(self):
+        paid = []
+        for offset in range(5):
+            StreamData.objects.create(track=self.track, platform='a', stream_count=1,
+                                      date_recorded=self.day + timedelta(days=offset))
+            paid.append(distribute_pending_tracks()['total_earning'])
+            self.assertFalse(pending_tracks().exists())
+        # 5 streams at 0.3 cents: one cent paid, half a cent carried
+        self.assertEqual(sum(paid), Decimal('0.01'))
+        self.track.refresh_from_db()
+        self.assertEqual((self.track.processed_streams, self.track.earning_remainder_microcents), (5, 500_000))
+
+    def test_preview_prices_like_distribution(self):
+        RateCard.objects.create(platform='spotify', rate_per_stream=Decimal('0.005'), effective_from=date(2020, 1, 1))
+        StreamData.objects.create(track=self.track, platform='spotify', stream_count=3000, date_recorded=self.day)
+        StreamData.objects.create(track=self.track, platform='other', stream_count=1000, date_recorded=self.day)
+        tracks = Track.objects.filter(pk=self.track.pk)
+
+        preview = preview_distribution(tracks)
+        self.assertEqual(preview['totals']['total_earning'], Decimal('18.00'))
+        self.assertEqual(distribute_royalty_from_streams(self.track)['total_earning'], Decimal('18.00'))
+        self.assertEqual(preview_distribution(tracks)['totals']['total_earning'], Decimal('0.00'))
+        self.assertEqual(preview_distribution(tracks, streams='total')['totals']['total_earning'], Decimal('18.00'))
+
+
+class CoalescingTests(TestCase):
+    def setUp(self):
+        users = _create_users(2)
+        self.track = _create_track(users[0], [(users[1], 100)])
+
+    @override_settings(STREAM_COUNTER_SHARDS=4)
+    def test_threshold_counts_sharded_increments(self):
+        window = timedelta(hours=1)
+        self.assertEqual(record_increment(self.track, 600, 'a')[0], 600)
+        self.assertFalse(due_tracks(window, min_streams=1000).exists())
+
+        self.assertEqual(record_increment(self.track, 600, 'a')[0], 1200)
+        # The increments sit in the counter shards, not in total_valid_streams
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.total_valid_streams, 0)
+        self.assertTrue(due_tracks(window, min_streams=1000).filter(pk=self.track.pk).exists())
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        job_handler('test_record')(lambda payload: self.calls.append(payload['value']))
+
+        @job_handler('test_fail')
+        def fail(payload):
+            raise RuntimeError('failed')
+
+    def test_job_runs_once_and_is_deleted(self):
+        enqueue('test_record', {'value': 1})
+        self.assertEqual(run_pending_jobs(kinds=['test_record']), (1, 1))
+        self.assertEqual(run_pending_jobs(kinds=['test_record']), (0, 0))
+        self.assertEqual(self.calls, [1])
+        self.assertFalse(Job.objects.filter(kind='test_record').exists())
+
+    def test_dedupe_key_queues_one_job(self):
+        enqueue('test_record', {'value': 1}, dedupe_key='same')
+        enqueue('test_record', {'value': 2}, dedupe_key='same')
+        self.assertEqual(Job.objects.filter(kind='test_record').count(), 1)
+
+    def test_failing_job_is_retried_then_failed(self):
+        enqueue('test_fail', max_attempts=2)
+        with self.assertLogs('backend.services.jobs', 'ERROR'):
+            run_pending_jobs(kinds=['test_fail'])
+            Job.objects.update(run_at=timezone.now())
+            run_pending_jobs(kinds=['test_fail'])
+        job = Job.objects.get(kind='test_fail')
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('RuntimeError: failed', job.last_error)
+
+    def test_new_splits_queue_one_distribution(self):
+        users = _create_users(3)
+        track = _create_track(users[0], [(users[1], 60), (users[2], 40)], payout_amount=Decimal('10.00'))
+        self.assertEqual(Job.objects.filter(kind=DISTRIBUTE_TRACK).count(), 1)
+        self.assertFalse(Royalty.objects.exists())
+
+        Job.objects.update(run_at=timezone.now())
+        run_pending_jobs(kinds=[DISTRIBUTE_TRACK])
+        self.assertEqual(list(Royalty.objects.filter(track=track).values_list('total_earning', flat=True)),
+                         [Decimal('10.00')])
+
+
+class FraudClawbackTests(TestCase):
+    def setUp(self):
+        users = _create_users(3)
+        self.track = _create_track(users[0], [(users[1], 60), (users[2], 40)])
+        self.day = date(2026, 7, 1)
+        self.rows = [StreamData.objects.create(track=self.track, platform=platform, stream_count=10_000,
+                                               date_recorded=self.day) for platform in ('a', 'b')]
+        distribute_royalty_from_streams(self.track)
+        for row in self.rows:
+            row.refresh_from_db()
+
+    def _flag(self, row):
+        row.fraud_flag = True
+        row.save()
+
+    def test_clawback_is_incremental_on_rerun(self):
+        self._flag(self.rows[0])
+        self.assertEqual(claw_back_fraud_streams()['total_clawed_back'], Decimal('30.00'))
+        self.assertEqual(claw_back_fraud_streams()['rows_clawed_back'], 0)
+
+        self._flag(self.rows[1])
+        result = claw_back_fraud_streams()
+        self.assertEqual((result['rows_clawed_back'], result['total_clawed_back']), (1, Decimal('30.00')))
+        self.assertEqual(_wallet_balances(), Decimal('0.00'))
+        self.assertEqual(Royalty.objects.count(), 3)
+        self.assertFalse(unreconciled_wallets().exists())
+
+    def test_new_streams_are_paid_before_the_clawback_runs(self):
+        # The flag drops total_valid_streams below processed_streams until the clawback
+        self._flag(self.rows[0])
+        StreamData.objects.create(track=self.track, platform='c', stream_count=5000, date_recorded=self.day)
+
+        self.assertTrue(pending_tracks().filter(pk=self.track.pk).exists())
+        result = distribute_royalty_from_streams(Track.objects.get(pk=self.track.pk))
+        self.assertEqual(result['total_earning'], Decimal('15.00'))
+        self.assertEqual(claw_back_fraud_streams()['total_clawed_back'], Decimal('30.00'))
+        self.assertFalse(pending_tracks().exists())
+
+    def test_clawback_reverses_the_amount_paid(self):
+        # The rate card of the streams' day changes after they were paid
+        RateCard.objects.create(platform='a', effective_from=date(2026, 1, 1), rate_per_stream=Decimal('0.01'))
+        self._flag(self.rows[0])
+        self.assertEqual(claw_back_fraud_streams()['total_clawed_back'], Decimal('30.00'))
+        self.assertEqual(_wallet_balances(), Decimal('29.40'))
+
+        # Rows paid before amounts were recorded are priced with today's cards
+        self._flag(self.rows[1])
+        StreamData.objects.filter(pk=self.rows[1].pk).update(paid_microcents=None)
+        RateCard.objects.create(platform='b', effective_from=date(2026, 1, 1), rate_per_stream=Decimal('0.002'))
+        self.assertEqual(claw_back_fraud_streams()['total_clawed_back'], Decimal('20.00'))
+        self.assertFalse(clawback_queue().exists())
+
+
+class NestedSplitTests(TestCase):
+    def setUp(self):
+        clear_cache()
+        self.owner, self.band, self.singer, self.label, self.publisher = _create_users(5)
+        SplitGroupMember.objects.create(group=self.band, member=self.singer, percentage=60)
+        SplitGroupMember.objects.create(group=self.band, member=self.label, percentage=40)
+        self.label_member = SplitGroupMember.objects.create(group=self.label, member=self.publisher, percentage=50)
+        self.track = _create_track(self.owner, [(self.owner, 50), (self.band, 50)])
+
+    def _table(self):
+        return {entry.user_id: entry.basis_points for entry in get_split_table(Track.objects.get(pk=self.track.pk))}
+
+    def test_groups_are_flattened_into_their_members(self):
+        # The label keeps the half of its share its member doesn't cover
+        self.assertEqual(self._table(), {
+            self.owner.id: 5000, self.singer.id: 3000, self.label.id: 1000, self.publisher.id: 1000,
+        })
+
+    def test_membership_change_deeper_in_the_tree_refreshes_the_table(self):
+        self._table()
+        self.label_member.percentage = 100
+        self.label_member.save()
+        self.assertEqual(self._table(), {self.owner.id: 5000, self.singer.id: 3000, self.publisher.id: 2000})
+
+
+@override_settings(STREAM_COUNTER_SHARDS=4)
+class StreamCounterShardTests(TestCase):
+    def setUp(self):
+        owner = _create_users(1)[0]
+        self.track = _create_track(owner, [(owner, 100)])
+        for _ in range(20):
+            add_streams([(self.track.id, 'a', date(2026, 7, 1), 10, False)], sharded=True)
+
+    def _totals(self):
+        return with_exact_stream_total(Track.objects.filter(pk=self.track.pk)).values_list(
+            'total_valid_streams', 'exact_valid_streams').get()
+
+    def test_folding_keeps_the_exact_total(self):
+        self.assertEqual(self._totals(), (0, 200))
+        row = StreamData.objects.filter(track=self.track).first()
+        row.fraud_flag = True
+        row.save()
+        exact = self._totals()[1]
+        self.assertEqual(exact, 200 - row.stream_count)
+
+        call_command('compact_stream_counters', stdout=io.StringIO())
+        self.assertEqual(self._totals(), (exact, exact))
+        self.assertFalse(TrackStreamCounterShard.objects.exclude(streams=0).exists())
+
+    def test_distribution_folds_the_shards_it_pays(self):
+        self.assertEqual(distribute_royalty_from_streams(self.track)['total_earning'], Decimal('0.60'))
+        self.assertEqual(Track.objects.filter(pk=self.track.pk).values_list(
+            'total_valid_streams', 'processed_streams').get(), (200, 200))
+
+
+class StreamReportCommandTests(TestCase):
+    def _report(self, text):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        with handle:
+            handle.write(text)
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+    def test_imports_are_additive(self):
+        owner = _create_users(1)[0]
+        track = _create_track(owner, [(owner, 100)], isrc='USS1Z9900001')
+        report = self._report('isrc,platform,date,streams\nUSS1Z9900001,spotify,2026-09-01,100\n')
+        for _ in range(2):
+            call_command('import_stream_report', report, stdout=io.StringIO())
+
+        self.assertEqual(list(StreamData.objects.filter(track=track).values_list('stream_count', flat=True)), [200])
+        self.assertEqual(Track.objects.get(pk=track.pk).total_valid_streams, 200)
+
+    def test_bad_lines_are_reported_per_chunk(self):
+        owner = _create_users(1)[0]
+        track = _create_track(owner, [(owner, 100)])
+        report = io.StringIO(f'track_id,platform,date,streams\n{track.id},a,2026-09-01,10\n'
+                             f'{track.id},a,not-a-date,5\n{track.id},b,2026-09-02,-1\n{track.id},b,2026-09-02,7\n')
+        summary = import_stream_report(report, chunk_size=2)
+
+        self.assertEqual((summary['rows_read'], summary['rows_imported'], summary['streams_imported']), (4, 2, 17))
+        self.assertEqual(summary['error_count'], 2)
+        self.assertEqual([line for chunk in summary['chunk_errors'] for line, _ in chunk['errors']], [3, 4])
+        self.assertEqual(Track.objects.get(pk=track.pk).total_valid_streams, 17)
+
+
+class DailyRollupTests(TestCase):
+    def setUp(self):
+        owner = _create_users(1)[0]
+        self.track = _create_track(owner, [(owner, 100)])
+        for platform, day, count in (('a', date(2026, 6, 30), 10), ('b', date(2026, 6, 30), 5),
+                                     ('a', date(2026, 7, 1), 20), ('b', date(2026, 7, 2), 40)):
+            StreamData.objects.create(track=self.track, platform=platform, stream_count=count, date_recorded=day)
+        # Edits and deletes move the rollup with them
+        row = StreamData.objects.get(platform='a', date_recorded=date(2026, 7, 1))
+        row.fraud_flag = True
+        row.save()
+        StreamData.objects.get(platform='b', date_recorded=date(2026, 7, 2)).delete()
+
+    def _series(self, group_by, **dates):
+        result = stream_series([self.track.id], group_by=group_by, **dates)
+        return result['valid_streams'], result['fraud_streams'], [
+            tuple(point.values()) for point in result['series']
+        ]
+
+    def test_series_per_day_month_and_platform(self):
+        self.assertEqual(self._series('day'), (15, 20, [('2026-06-30', 15, 0), ('2026-07-01', 0, 20)]))
+        self.assertEqual(self._series('month'), (15, 20, [('2026-06-01', 15, 0), ('2026-07-01', 0, 20)]))
+        self.assertEqual(self._series('platform'), (15, 20, [('a', 10, 20), ('b', 5, 0)]))
+        self.assertEqual(self._series('day', date_from=date(2026, 7, 1)), (0, 20, [('2026-07-01', 0, 20)]))
+
+    def test_rebuild_matches_the_incremental_rollup(self):
+        incremental = self._series('day')
+        rebuild_rollups(date(2026, 6, 1), date(2026, 7, 31))
+        self.assertEqual(self._series('day'), incremental)
+
+
+@skipUnless(connection.vendor == 'postgresql', "StreamData is only partitioned on PostgreSQL")
+class StreamPartitionTests(TestCase):
+    def setUp(self):
+        owner = _create_users(1)[0]
+        self.track = _create_track(owner, [(owner, 100)])
+
+    def _check_constraints(self):
+        # ALTER TABLE refuses tables with deferred FK checks pending in the test's transaction
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+    def _partition_of(self, row):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT tableoid::regclass::text FROM {StreamData._meta.db_table} WHERE id = %s", [row.id])
+            return cursor.fetchone()[0]
+
+    def test_maintenance_moves_rows_out_of_the_default_partition(self):
+        month = month_start(date.today(), 8)
+        row = StreamData.objects.create(track=self.track, platform='a', stream_count=5, date_recorded=month)
+        self.assertNotEqual(self._partition_of(row), partition_name(month))
+
+        self._check_constraints()
+        out = io.StringIO()
+        call_command('maintain_stream_partitions', '--ahead', '10', stdout=out)
+        self.assertIn(f"Created {partition_name(month)} (1 rows moved from DEFAULT)", out.getvalue())
+        self.assertEqual(self._partition_of(row), partition_name(month))
+        self.assertEqual(StreamData.objects.get(pk=row.pk).stream_count, 5)
+
+    def test_partitions_with_unpaid_streams_are_kept(self):
+        StreamData.objects.create(track=self.track, platform='a', stream_count=5, date_recorded=date(2020, 1, 1))
+        later = month_start(date.today(), 24)
+        detached, kept = detach_old_partitions(1, today=later, drop=True, dry_run=True)
+        self.assertEqual([reason for _, reason in kept], ["has undistributed streams"])
+
+        StreamData.objects.update(processed_count=F('stream_count'))
+        self._check_constraints()
+        detached, kept = detach_old_partitions(1, today=later, drop=True)
+        self.assertEqual(kept, [])
+        self.assertTrue(detached)
+        self.assertFalse(StreamData.objects.exists())
+
+
+class StreamDedupTests(TestCase):
+    def setUp(self):
+        owner = _create_users(1)[0]
+        self.track = _create_track(owner, [(owner, 100)])
+        self.day = date(2026, 7, 1)
+
+    def _rollup(self):
+        return list(StreamDailyRollup.objects.filter(track=self.track).order_by('platform')
+                    .values_list('platform', 'valid_streams', 'fraud_streams'))
+
+    def test_increments_add_to_one_row_per_key(self):
+        add_streams([(self.track.id, 'a', self.day, 5, False)])
+        add_streams([(self.track.id, 'a', self.day, 7, False), (self.track.id, None, self.day, 1, False)])
+        StreamData.objects.create(track=self.track, platform='a', stream_count=3, date_recorded=self.day)
+
+        self.assertEqual(sorted(StreamData.objects.values_list('platform', 'stream_count'), key=str),
+                         [('a', 15), (None, 1)])
+        self.assertEqual(Track.objects.get(pk=self.track.pk).total_valid_streams, 16)
+        self.assertEqual(self._rollup(), [('', 1, 0), ('a', 15, 0)])
+
+    def test_flagged_row_merges_into_the_days_fraud_row(self):
+        valid = StreamData.objects.create(track=self.track, platform='a', stream_count=100, date_recorded=self.day)
+        fraud = StreamData.objects.create(track=self.track, platform='a', stream_count=5, date_recorded=self.day,
+                                          fraud_flag=True)
+        valid.fraud_flag = True
+        valid.save()
+
+        self.assertEqual(valid.pk, fraud.pk)
+        self.assertEqual(list(StreamData.objects.values_list('fraud_flag', 'stream_count')), [(True, 105)])
+        self.assertEqual(Track.objects.get(pk=self.track.pk).total_valid_streams, 0)
+        self.assertEqual(self._rollup(), [('a', 0, 105)])
+
+    def test_merged_paid_row_is_clawed_back_at_what_it_was_paid(self):
+        valid = StreamData.objects.create(track=self.track, platform='a', stream_count=10_000, date_recorded=self.day)
+        distribute_royalty_from_streams(self.track)
+        StreamData.objects.create(track=self.track, platform='a', stream_count=5, date_recorded=self.day,
+                                  fraud_flag=True)
+        valid.refresh_from_db()
+        valid.fraud_flag = True
+        valid.save()
+
+        self.assertEqual(list(StreamData.objects.values_list('stream_count', 'processed_count')), [(10_005, 10_000)])
+        self.assertEqual(claw_back_fraud_streams()['total_clawed_back'], Decimal('30.00'))
+
+    @override_settings(STREAM_COUNTER_SHARDS=4)
+    def test_compaction_folds_the_shard_rows_of_past_days(self):
+        yesterday = timezone.now().date() - timedelta(days=1)
+        for _ in range(20):
+            add_streams([(self.track.id, 'a', yesterday, 10, False)], sharded=True)
+        compact_stream_data()
+
+        self.assertEqual(list(StreamData.objects.values_list('stream_count', flat=True)), [200])
+        self.assertEqual(list(StreamDailyRollup.objects.values_list('shard', 'valid_streams')), [(0, 200)])
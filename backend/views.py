@@ -2,11 +2,12 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from decimal import Decimal
+from django.db import transaction
 from django.utils import timezone
 
 from .models import (
     UserAccount, Role, Track, StreamData, Royalty, Split,
-    Wallet, Payout, PayoutStatus, SIEM_Event, SeverityLevel
+    Wallet, Payout, PayoutStatus, SIEM_Event, SeverityLevel, LedgerEntry
 )
 
 from .serializers import (
@@ -16,8 +17,9 @@ from .serializers import (
     SIEMEventSerializer, SeverityLevelSerializer
 )
 
-from .royalty_service import distribute_royalty_for_track
 from .services.blockchain import send_payout
+from .services.ledger import post_ledger_entries
+from .services.wallets import with_shard_balance
 
 
 # ==================================================
@@ -33,7 +35,7 @@ class UserAccountViewSet(viewsets.ModelViewSet):
 # Royalty ViewSet (read-only)
 # ==================================================
 class RoyaltyViewSet(viewsets.ModelViewSet):
-    queryset = Royalty.objects.all()
+    queryset = Royalty.objects.all().select_related('track').with_shares()
     serializer_class = RoyaltySerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -85,10 +87,10 @@ class WalletViewSet(viewsets.ModelViewSet):
         if user.is_staff or (
             user.role and user.role.role_name.lower() == "admin"
         ):
-            return Wallet.objects.all()
+            return with_shard_balance(Wallet.objects.all())
 
         # Normal user yalnız öz walletini görür
-        return Wallet.objects.filter(user=user)
+        return with_shard_balance(Wallet.objects.filter(user=user))
 
     def retrieve(self, request, *args, **kwargs):
         wallet = self.get_object()
@@ -126,55 +128,62 @@ class WalletViewSet(viewsets.ModelViewSet):
         if amount <= 0:
             return Response({"error": "amount must be > 0"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if amount > wallet.balance:
-            return Response({"error": "amount exceeds wallet balance"}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            # Lock the wallet so concurrent withdrawals can't both pass the balance check
+            wallet = Wallet.objects.select_for_update().get(pk=wallet.pk)
 
-        # Pending payouts
-        pending_payouts = Payout.objects.filter(wallet=wallet, status__status_name="Pending")
-        total_pending = sum(p.amount for p in pending_payouts)
+            if amount > wallet.effective_balance:
+                return Response({"error": "amount exceeds wallet balance"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if amount > total_pending:
-            return Response(
-                {"error": "amount exceeds total pending payouts"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            # Pending payouts
+            pending_payouts = Payout.objects.filter(wallet=wallet, status__status_name="Pending")
+            total_pending = sum(p.amount for p in pending_payouts)
 
-        completed_status, _ = PayoutStatus.objects.get_or_create(status_name="Completed")
-
-        remaining = amount
-
-        # Payout processing
-        for payout in pending_payouts:
-            if remaining <= 0:
-                break
-
-            if payout.amount <= remaining:
-                remaining -= payout.amount
-                payout.status = completed_status
-                payout.save()
-            else:
-                # Partial payout
-                Payout.objects.create(
-                    wallet=wallet,
-                    amount=remaining,
-                    status=completed_status,
-                    txn_date=timezone.now()
+            if amount > total_pending:
+                return Response(
+                    {"error": "amount exceeds total pending payouts"},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
-                payout.amount -= remaining
-                payout.save()
-                remaining = Decimal("0")
 
-        # Wallet balance update
-        wallet.balance -= amount
-        wallet.last_updated = timezone.now()
-        wallet.save()
+            completed_status, _ = PayoutStatus.objects.get_or_create(status_name="Completed")
+
+            remaining = amount
+            ledger_entries = []
+
+            # Payout processing
+            for payout in pending_payouts:
+                if remaining <= 0:
+                    break
+
+                if payout.amount <= remaining:
+                    remaining -= payout.amount
+                    payout.status = completed_status
+                    payout.save()
+                    ledger_entries.append(LedgerEntry(wallet=wallet, entry_type=LedgerEntry.WITHDRAWAL,
+                                                      amount=-payout.amount, payout=payout))
+                else:
+                    # Partial payout
+                    completed = Payout.objects.create(
+                        wallet=wallet,
+                        amount=remaining,
+                        status=completed_status,
+                        txn_date=timezone.now()
+                    )
+                    ledger_entries.append(LedgerEntry(wallet=wallet, entry_type=LedgerEntry.WITHDRAWAL,
+                                                      amount=-remaining, payout=completed))
+                    payout.amount -= remaining
+                    payout.save()
+                    remaining = Decimal("0")
+
+            # Wallet balance update
+            new_balance = post_ledger_entries(ledger_entries)[wallet.id]
 
         # Blockchain transfer
         blockchain_result = send_payout(wallet.blockchain_address, float(amount))
 
         return Response({
             "message": f"Withdrawn {amount} successfully",
-            "new_balance": wallet.balance,
+            "new_balance": new_balance,
             "blockchain": blockchain_result
         }, status=status.HTTP_200_OK)
 
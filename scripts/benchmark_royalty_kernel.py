@@ -0,0 +1,101 @@
+"""
+Benchmark the legacy Decimal share math against the integer royalty kernel.
+
+Usage (from the project root, no database needed):
+    python scripts/benchmark_royalty_kernel.py --tracks 40000 --splits 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.royalty_math import (  # noqa: E402
+    cents_to_dollars, dollars_to_microcents, split_amount, split_amount_batch, stream_earnings_cents,
+    stream_earnings_cents_batch,
+)
+
+RATE_PER_STREAM = Decimal("0.003")
+PLATFORM_FEE_PERCENT = Decimal("2.0")
+PLATFORM_FEE_BPS = 200
+
+
+def make_catalog(tracks, splits_per_track, seed=42):
+    rng = random.Random(seed)
+    catalog = []
+    for _ in range(tracks):
+        cuts = sorted(rng.sample(range(1, 10000), splits_per_track - 1))
+        basis_points = [b - a for a, b in zip([0] + cuts, cuts + [10000])]
+        catalog.append((rng.randint(1, 5_000_000), basis_points))
+    return catalog
+
+
+def legacy_decimal(catalog):
+    """The pre-kernel path: Decimal(str(percentage)) and per-share quantize."""
+    credited = Decimal("0")
+    for delta_streams, basis_points in catalog:
+        total_earning = (Decimal(delta_streams) * Decimal(str(RATE_PER_STREAM))).quantize(Decimal('0.01'))
+        for bp in basis_points:
+            percentage = bp / 100.0
+            gross_share = (total_earning * Decimal(str(percentage))) / Decimal("100")
+            net_share = (gross_share * (Decimal("100") - PLATFORM_FEE_PERCENT) / Decimal("100")).quantize(Decimal('0.01'))
+            credited += net_share
+    return credited
+
+
+def kernel_per_track(catalog):
+    rate = dollars_to_microcents(RATE_PER_STREAM)
+    credited = 0
+    for delta_streams, basis_points in catalog:
+        _, _, net = split_amount(stream_earnings_cents(delta_streams, rate), basis_points, PLATFORM_FEE_BPS)
+        credited += sum(net)
+    return cents_to_dollars(credited)
+
+
+def kernel_batch(catalog):
+    rate = dollars_to_microcents(RATE_PER_STREAM)
+    earnings = stream_earnings_cents_batch([delta for delta, _ in catalog], rate)
+    groups = [index for index, (_, bps) in enumerate(catalog) for _ in bps]
+    basis_points = [bp for _, bps in catalog for bp in bps]
+    _, _, net = split_amount_batch(earnings, np.asarray(groups), np.asarray(basis_points), PLATFORM_FEE_BPS)
+    return cents_to_dollars(int(net.sum()))
+
+
+def timed(fn, catalog, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(catalog)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tracks', type=int, default=40000)
+    parser.add_argument('--splits', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.tracks, args.splits)
+    shares = args.tracks * args.splits
+    print(f"{args.tracks} tracks x {args.splits} splits = {shares} shares (best of {args.repeat})\n")
+
+    baseline = None
+    for name, fn in [("decimal (legacy)", legacy_decimal),
+                     ("kernel per track", kernel_per_track),
+                     ("kernel batch", kernel_batch)]:
+        credited, elapsed = timed(fn, catalog, args.repeat)
+        baseline = baseline or elapsed
+        print(f"{name:<18} {elapsed * 1000:9.1f} ms  {shares / elapsed:12.0f} shares/s  "
+              f"x{baseline / elapsed:5.1f}  credited={credited}")
+
+
+if __name__ == '__main__':
+    main()
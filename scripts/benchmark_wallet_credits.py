@@ -0,0 +1,105 @@
+"""
+Benchmark: concurrent credits to one hot wallet, with and without balance shards.
+
+Every thread repeatedly opens a transaction, credits the same wallet through
+credit_wallets() and keeps the transaction open for --hold-ms (standing in
+for the rest of a distribution batch). Unsharded, every credit waits for the
+Wallet row lock held by the previous one; with WALLET_BALANCE_SHARDS=K the
+credits spread over K shard rows. After each run the shards are compacted
+and the wallet must hold exactly the credited amount.
+
+Usage (from the project root, against the configured database; SQLite
+serializes all writers, so run it on PostgreSQL):
+    python scripts/benchmark_wallet_credits.py --threads 32 --seconds 10 --shards 16
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'royalty_splitter.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from backend.models import UserAccount, Wallet  # noqa: E402
+from backend.services.wallets import compact_balance_shards, credit_wallets  # noqa: E402
+
+CREDIT = Decimal('0.01')
+
+
+def worker(wallet_id, deadline, hold, counts, errors):
+    credited = 0
+    try:
+        while time.monotonic() < deadline:
+            with transaction.atomic():
+                credit_wallets({wallet_id: CREDIT})
+                if hold:
+                    time.sleep(hold)
+            credited += 1
+    except Exception as exc:  # report, keep the other threads running
+        errors.append(repr(exc))
+    finally:
+        counts.append(credited)
+        connection.close()
+
+
+def run(wallet, shards, threads, seconds, hold):
+    settings.WALLET_BALANCE_SHARDS = shards
+    wallet.refresh_from_db()
+    before = wallet.effective_balance
+    counts, errors = [], []
+    deadline = time.monotonic() + seconds
+    workers = [
+        threading.Thread(target=worker, args=(wallet.id, deadline, hold, counts, errors))
+        for _ in range(threads)
+    ]
+    started = time.monotonic()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    compact_balance_shards()
+    wallet.refresh_from_db()
+    credits = sum(counts)
+    ok = not errors and wallet.balance - before == credits * CREDIT and wallet.effective_balance == wallet.balance
+    label = f"{shards} shards" if shards > 1 else "unsharded"
+    print(f"{label:>12}: {credits} credits in {elapsed:.2f}s = {credits / elapsed:8.1f} credits/sec "
+          f"({'balance OK' if ok else 'BALANCE MISMATCH'})")
+    for error in errors[:5]:
+        print("  error:", error)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10.0, help="Duration of each run")
+    parser.add_argument('--shards', type=int, default=16, help="Balance shards for the sharded run")
+    parser.add_argument('--hold-ms', type=float, default=5.0,
+                        help="Time each transaction stays open after its credit")
+    parser.add_argument('--keep', action='store_true', help="Keep the benchmark wallet afterwards")
+    args = parser.parse_args()
+
+    user, _ = UserAccount.objects.get_or_create(email='bench-hot-wallet@example.com',
+                                                defaults={'name': 'Hot wallet benchmark'})
+    wallet, _ = Wallet.objects.get_or_create(user=user)
+    hold = args.hold_ms / 1000
+    ok = run(wallet, 0, args.threads, args.seconds, hold)
+    ok = run(wallet, args.shards, args.threads, args.seconds, hold) and ok
+    if not args.keep:
+        user.delete()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
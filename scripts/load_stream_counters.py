@@ -0,0 +1,117 @@
+"""
+Load test: 64 concurrent ingest writers add streams to one viral track.
+
+Every writer repeatedly adds streams to the same track, platform and day
+the way a request does (add_streams(sharded=True)) and keeps its
+transaction open for --hold-ms, standing in for the rest of an ingest
+batch. Unsharded, every increment waits for the Track row and the day's
+StreamData row held by the previous writer; with STREAM_COUNTER_SHARDS=K
+the counts and the day's rows spread over K shard rows. After each run
+the exact total must equal the inserted streams, and one distribution must
+pay all of them.
+
+Usage (from the project root, against the configured database; SQLite
+serializes all writers, so run it on PostgreSQL):
+    python scripts/load_stream_counters.py --writers 64 --seconds 10 --shards 16
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'royalty_splitter.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from backend.models import Split, Track, UserAccount  # noqa: E402
+from backend.royalty_service import RATE_PER_STREAM, distribute_royalty_from_streams  # noqa: E402
+from backend.services.stream_counters import with_exact_stream_total  # noqa: E402
+from backend.services.stream_dedup import add_streams  # noqa: E402
+
+
+def make_track(owner):
+    track = Track.objects.create(title='Viral track load test', owner=owner)
+    Split.objects.create(track=track, user=owner, percentage=100)
+    return track
+
+
+def writer(track_id, deadline, streams, hold, counts, errors):
+    written = 0
+    try:
+        while time.monotonic() < deadline:
+            with transaction.atomic():
+                add_streams([(track_id, 'load', timezone.now().date(), streams, False)], sharded=True)
+                if hold:
+                    time.sleep(hold)
+            written += 1
+    except Exception as exc:  # report, keep the other writers running
+        errors.append(repr(exc))
+    finally:
+        counts.append(written)
+        connection.close()
+
+
+def run(owner, shards, writers, seconds, streams, hold):
+    settings.STREAM_COUNTER_SHARDS = shards
+    track = make_track(owner)
+    counts, errors = [], []
+    deadline = time.monotonic() + seconds
+    threads = [
+        threading.Thread(target=writer, args=(track.id, deadline, streams, hold, counts, errors))
+        for _ in range(writers)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    inserts = sum(counts)
+    expected = inserts * streams
+    exact = with_exact_stream_total(Track.objects.filter(pk=track.pk)).values_list(
+        'exact_valid_streams', flat=True).get()
+    distribute_royalty_from_streams(track, rate_per_stream=RATE_PER_STREAM)
+    track.refresh_from_db()
+    ok = not errors and exact == expected and track.total_valid_streams == track.processed_streams == expected
+
+    label = f"{shards} shards" if shards > 1 else "unsharded"
+    print(f"{label:>12}: {inserts} increments from {writers} writers in {elapsed:.2f}s = "
+          f"{inserts / elapsed:8.1f} increments/sec; exact total {exact}, paid {track.processed_streams}, "
+          f"expected {expected} ({'OK' if ok else 'MISMATCH'})")
+    for error in errors[:5]:
+        print("  error:", error)
+    return track, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writers', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=10.0, help="Duration of each run")
+    parser.add_argument('--streams', type=int, default=100, help="Streams per increment")
+    parser.add_argument('--shards', type=int, default=16, help="Counter shards for the sharded run")
+    parser.add_argument('--hold-ms', type=float, default=5.0,
+                        help="Time each ingest transaction stays open after its insert")
+    parser.add_argument('--keep', action='store_true', help="Keep the load-test tracks afterwards")
+    args = parser.parse_args()
+
+    owner, _ = UserAccount.objects.get_or_create(email='load-viral-track@example.com',
+                                                 defaults={'name': 'Viral track load test'})
+    hold = args.hold_ms / 1000
+    results = [run(owner, shards, args.writers, args.seconds, args.streams, hold) for shards in (0, args.shards)]
+    if not args.keep:
+        for track, _ in results:
+            track.delete()
+    sys.exit(0 if all(ok for _, ok in results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Stress test: many threads add streams to and distribute one hot track.
+
+Every thread repeatedly adds streams to the track's StreamData row of the
+day and distributes the new streams, either per track (`distribute_royalty_from_streams`, row lock) or
+through the SKIP LOCKED batch drain (`distribute_pending_tracks`). At the
+end the track's royalties must add up to exactly its streams x rate:
+anything more means a stream was paid twice.
+
+Usage (from the project root, against the configured database):
+    python scripts/stress_hot_track.py --threads 32 --rounds 20
+    python scripts/stress_hot_track.py --mode pending
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'royalty_splitter.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import Sum  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from backend.models import LedgerEntry, Royalty, Split, Track, UserAccount  # noqa: E402
+from backend.royalty_service import (  # noqa: E402
+    RATE_PER_STREAM, distribute_pending_tracks, distribute_royalty_from_streams,
+)
+from backend.services.stream_dedup import add_streams  # noqa: E402
+
+
+def make_track():
+    users = [
+        UserAccount.objects.get_or_create(email=f'stress-hot-{i}@example.com', defaults={'name': f'Stress {i}'})[0]
+        for i in range(2)
+    ]
+    track = Track.objects.create(title='Stress hot track', owner=users[0])
+    Split.objects.create(track=track, user=users[0], percentage=60)
+    Split.objects.create(track=track, user=users[1], percentage=40)
+    return track
+
+
+def worker(track_id, rounds, streams, mode, errors):
+    try:
+        for _ in range(rounds):
+            with transaction.atomic():
+                add_streams([(track_id, 'stress', timezone.now().date(), streams, False)], sharded=True)
+            if mode == 'pending':
+                distribute_pending_tracks(rate_per_stream=RATE_PER_STREAM)
+            else:
+                distribute_royalty_from_streams(Track.objects.get(pk=track_id), rate_per_stream=RATE_PER_STREAM)
+    except Exception as exc:  # report, keep the other threads running
+        errors.append(repr(exc))
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--streams', type=int, default=1000, help="Streams added per round")
+    parser.add_argument('--mode', choices=['single', 'pending'], default='single')
+    parser.add_argument('--keep', action='store_true', help="Keep the stress track afterwards")
+    args = parser.parse_args()
+
+    track = make_track()
+    errors = []
+    threads = [
+        threading.Thread(target=worker, args=(track.id, args.rounds, args.streams, args.mode, errors))
+        for _ in range(args.threads)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    # Pay whatever the last committers left behind
+    distribute_royalty_from_streams(Track.objects.get(pk=track.id), rate_per_stream=RATE_PER_STREAM)
+
+    track.refresh_from_db()
+    expected_streams = args.threads * args.rounds * args.streams
+    expected = (Decimal(expected_streams) * RATE_PER_STREAM).quantize(Decimal('0.01'))
+    royalties = Royalty.objects.filter(track=track)
+    paid = royalties.aggregate(total=Sum('total_earning'))['total'] or Decimal('0')
+    credited = LedgerEntry.objects.filter(
+        royalty__in=royalties, entry_type=LedgerEntry.CREDIT
+    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+
+    print(f"{args.threads} threads x {args.rounds} rounds ({args.mode}) in {elapsed:.2f}s, "
+          f"{royalties.count()} royalties")
+    print(f"streams  total={track.total_valid_streams} processed={track.processed_streams} expected={expected_streams}")
+    print(f"earnings paid={paid} credited={credited} expected={expected}")
+    for error in errors[:10]:
+        print("error:", error)
+
+    ok = (not errors and track.total_valid_streams == track.processed_streams == expected_streams
+          and paid == expected and credited == expected)
+    if not args.keep:
+        track.delete()
+    print("OK" if ok else "FAILED: streams were lost or paid twice")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()